@@ -10,6 +10,9 @@ import logging
 
 from agentx.agent import Agent
 from agentx.dataset import DataSet
+from agentx.metrics import Timings
+from agentx.table import Table
+from agentx.shm import SnapshotAgent, SnapshotWriter
 
 
 def setup_logging(debug=False):
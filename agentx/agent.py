@@ -8,9 +8,14 @@ from __future__ import (
 
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 import agentx
-from agentx.dataset import DataSet
+from agentx.dataset import DataSet, merged
+from agentx.metrics import PDU_TYPES, STAGES, Timings, TimingsLog
 from agentx.network import Network
+from agentx.notify import SNMP_TRAP_OID, TokenBucket
+from agentx.oid import oid_str
+from agentx.pdu import oid_cache_info, size_oid_cache
 
 
 class NullHandler(logging.Handler):
@@ -18,55 +23,555 @@ class NullHandler(logging.Handler):
         pass
 
 
+# Private subtree with the agent's own health, .1 holds scalars about the
+# serving dataset, .2 request metrics:
+#
+#   .2.1.1.<column>.<PDU type>           requests by PDU type (GET 5,
+#                                        GETNEXT 6, others 0)
+#       1 requests, 2 varbinds                          Counter64
+#   .2.2.1.<column>.<PDU type>.<stage>   latency by PDU type and stage
+#                                        (1 decode, 2 lookup, 3 encode, 4 send)
+#       1-8 requests that took under 4 ** column us     Counter64
+#       9 median, 10 99th percentile, in us             Gauge32
+#   .2.3.1.0                             OIDs served    Gauge32
+#   .2.3.2.0                             seconds since the served dataset
+#                                        was replaced   Gauge32
+#   .2.3.3.0, .2.3.4.0                   encoded OID cache hits and misses,
+#                                        see pdu.oid_cache_info()
+#                                                       Counter64
+#   .2.3.5.0                             OIDs in that cache
+#                                                       Gauge32
+#
+# and .3 refresh timings, over the refreshes in Agent.refreshes:
+#
+#   .3.1.1.<column>.<stage>              stages, in the order first seen
+#       1 name                                          OctetString
+#       2 last, 3 mean, 4 max duration, in ms           Gauge32
+#   .3.2.1.<column>.<count>              counts, like OIDs and retries
+#       1 name                                          OctetString
+#       2 last, 3 max                                   Gauge32
+AGENT_OID = "1.3.6.1.4.1.8072.9999.9999.1"
+
+
 class Agent(object):
-    def __init__(self, server_address="/var/agentx/master", period=30.0, args=None):
+    def __init__(
+        self,
+        server_address="/var/agentx/master",
+        period=30.0,
+        args=None,
+        static_period=300.0,
+        deadline=None,
+        agent_oid=AGENT_OID,
+        state_file=None,
+        save_period=60.0,
+        arena=False,
+    ):
         self.logger = logging.getLogger("agentx.agent")
         self.logger.addHandler(NullHandler())
 
         self._servingset = DataSet()
         self._workingset = DataSet()
+        self._staticset = None
         self._lastupdate = 0
+        self._laststatic = 0
+        self._static_dirty = True
         self._update_period = period  # Seconds
+        self._static_period = static_period  # Seconds
+        self._deadline = deadline  # Seconds, None refreshes inline
+        self._executor = None
+        self._refresh = None  # Refresh still running past its deadline
+        self._refresh_started = 0
+        self._refresh_duration = 0.0
+        self._retry_at = 0
+        self._deadline_misses = 0
+        self._timings = Timings()  # Of the refresh running, see timings
+        self.refreshes = TimingsLog()
+        self._summary_period = 600.0  # Seconds between refresh summaries
+        self._lastsummary = time.time()
+        self._agent_oid = agent_oid
+        self._timing_rows = None  # Timing stages and counts in _agentset
+        self._agentset = None
+        self._stale_after = 2 * period  # Seconds
+        self._writer = None  # SnapshotWriter, see publish()
+        self._state_file = state_file
+        self._save_period = save_period  # Seconds
+        self._lastsave = 0
+        self._warm = None  # Snapshot served until the first update
+        self._started = time.monotonic()
+        self._notify_limit = None  # TokenBucket, see limit_notifications()
+        self._notifications_sent = 0
+        self._notifications_dropped = 0
 
         try:
             debug = args.debug_agent
         except:
             debug = False
-        self._net = Network(server_address=server_address, debug=debug)
+        self._arena = arena
+        self._net = Network(server_address=server_address, debug=debug, arena=arena)
+        self._net.request_hook = self._request_received
 
         self._oid_list = []
         self._args = args
 
+    def _update_static(self):
+        if (
+            not self._static_dirty
+            and time.time() - self._laststatic <= self._static_period
+        ):
+            return True
+
+        ds = self.update_static()
+        if ds is False:
+            return False
+        if ds is True:
+            # Static columns were written into registered tables
+            ds = None
+        self._staticset = ds
+        self._laststatic = time.time()
+        self._static_dirty = False
+        return True
+
+    @property
+    def timings(self):
+        """
+        Timings of the refresh running, for update() to record its own
+        stages and counts in, or add those of a collector
+        """
+        return self._timings
+
+    def _stage(self, name, start):
+        return self._timings.stage(name, start)
+
+    def _collect(self):
+        """Run update_static() and update(), safe to call off the serving thread"""
+        self._timings = Timings()
+        for attempt in range(2):
+            t = time.time()
+            ok = self._update_static()
+            t = self._stage("static", t)
+            if not ok:
+                return False
+
+            ds = self.update()
+            self._stage("update", t)
+            if not ds:
+                return False
+            if not self._static_dirty:
+                break
+            # update() found the static layer out of date, rebuild it first
+        return ds
+
+    def _publish(self, ds):
+        t = time.time()
+        timing_rows = (len(self.refreshes.stages), len(self.refreshes.counts))
+        if self._agentset is not None and timing_rows != self._timing_rows:
+            # New refresh timing rows to serve
+            self._agentset = self._agent_dataset()
+        if self._writer is not None:
+            self._write(ds)
+        elif ds is True:
+            # Values were written into registered tables, which are served
+            # as they are, next to the agent's own OIDs
+            if self._agentset is not None and self._agentset._changed:
+                data, keys = merged([self._agentset])
+                self._agentset._changed = False
+                self._net.update(data, keys, True, self._timings)
+        else:
+            static = self._staticset
+            changed = not (
+                ds is self._servingset
+                and not ds._changed
+                and not (static and static._changed)
+                and not (self._agentset and self._agentset._changed)
+            )
+            replaced = ds._replaced or bool(static and static._replaced)
+            if changed or replaced or self._arena:
+                # An arena holds encoded values, so it is rebuilt every time;
+                # with the same OIDs as before only the values are encoded.
+                # Entries replaced for pinned walks are served the same way.
+                data, keys = merged([self._agentset, static, ds])
+                t = self._stage("merge", t)
+                if static is not None:
+                    static._changed = False
+                if self._agentset is not None:
+                    self._agentset._changed = False
+                self._net.update(data, keys, changed, self._timings)
+                t = time.time()
+                ds._changed = False
+                self._servingset = ds
+            # Otherwise the same OIDs as before with values overwritten in
+            # place, which the network already serves: no copy, no re-sort
+
+            # Have the next update() give what it overwrites while walks go
+            # on new entries, so that they read one poll
+            for layer in (static, ds):
+                if layer is not None:
+                    layer.pin(self._net.pinned)
+        if self._writer is None:
+            # Walks encode the OIDs that aren't in an arena or snapshot
+            # again, through the encoded OID cache
+            size_oid_cache(
+                len(self._net.data) + sum(len(table) for table in self._net.tables)
+            )
+        self._stage("publish", t)
+
+        if self._warm is not None and self._writer is None:
+            self._replace_warm()
+        if self._state_file and time.time() - self._lastsave > self._save_period:
+            self._save()
+
+        self._lastupdate = time.time()
+        self._refresh_duration = self._lastupdate - self._refresh_started
+        if self._writer is None:
+            self._timings.count("oids", self._net.size())
+        self.refreshes.append(self._timings)
+        self.logger.debug(
+            "Refresh took %.3fs (%s)" % (self._refresh_duration, self._timings)
+        )
+        if self._lastupdate - self._lastsummary > self._summary_period:
+            self._lastsummary = self._lastupdate
+            self.logger.info("Refresh timings: %s" % self.refreshes.summary())
+            self._log_oid_cache()
+        return True
+
+    def _log_oid_cache(self):
+        info = oid_cache_info()
+        self.logger.info(
+            "Encoded OID cache: %d hits, %d misses, %d of %d OIDs"
+            % (info.hits, info.misses, info.currsize, info.maxsize)
+        )
+
+    def dump_timings(self):
+        """Log the timings of every refresh kept, e.g. on SIGUSR1"""
+        self.logger.info("Refresh timings: %s" % self.refreshes.summary())
+        for line in self.refreshes.dump():
+            self.logger.info("Refresh at %s" % line)
+        self._log_oid_cache()
+
+    def _merged(self, ds):
+        """The static layer, ds and registered tables as one dict by OID tuple"""
+        static = self._staticset
+        data = dict(static._data) if static else {}
+        if ds is not True:
+            data.update(ds._data)
+        for table in self._net.tables:
+            for entry in table.items():
+                data[entry["name"]] = entry
+        return data
+
+    def _write(self, ds):
+        """Hand the layered dataset, including tables, to the SnapshotWriter"""
+        static = self._staticset
+        changed = (
+            ds is not self._servingset
+            or ds is True
+            or ds._changed
+            or bool(static and static._changed)
+        )
+        data = self._merged(ds)
+        if ds is not True:
+            ds._changed = False
+        if static:
+            static._changed = False
+        self._writer.publish(data, changed=changed)
+        self._servingset = ds
+
+    def _replace_warm(self):
+        """Stop serving the warm start dataset once live data is published"""
+        self.logger.info("Replacing the warm start dataset with live data")
+        self._net.set_snapshot(None)
+        self._warm = None
+
+    def _state(self):
+        """The served data for _save(), None if there is nothing to save yet"""
+        return self._merged(self._servingset)
+
+    def _save(self):
+        """Persist the served dataset for warm_start() after a restart"""
+        from agentx.shm import save
+
+        t = time.time()
+        data = self._state()
+        if data is None:
+            return
+        try:
+            save(self._state_file, data)
+        except (IOError, OSError) as e:
+            self.logger.warning("Could not save %s: %s" % (self._state_file, e))
+        self._lastsave = time.time()
+        self.logger.debug(
+            "Saved dataset to %s in %.3fs" % (self._state_file, self._lastsave - t)
+        )
+
+    def warm_start(self):
+        """
+        Load the dataset saved in state_file, to serve (marked stale) from
+        when run() registers until the first update succeeds. Returns True if
+        there was one.
+        """
+        from agentx.shm import load
+
+        if not self._state_file:
+            return False
+        self._warm = load(self._state_file)
+        if self._warm is None:
+            return False
+        self.logger.info(
+            "Loaded %d OIDs from %s, saved %.0fs ago"
+            % (len(self._warm), self._state_file, time.time() - self._warm.timestamp)
+        )
+        return True
+
     def _update(self):
-        ds = self.update()
+        if self._refresh is not None:
+            # A background refresh owns update() until it finishes
+            return False
+
+        self._refresh_started = time.time()
+        ds = self._collect()
         if not ds:
             return False
+        return self._publish(ds)
 
-        self._net.update(ds._data)
-        self._lastupdate = time.time()
+    def _start_refresh(self):
+        """Refresh, giving up waiting after the deadline
+
+        Returns None while a refresh that missed its deadline continues in
+        the background, the previous dataset is served meanwhile.
+        """
+        if self._deadline is None:
+            return self._update()
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        self._refresh_started = time.time()
+        future = self._executor.submit(self._collect)
+        try:
+            ds = future.result(timeout=self._deadline)
+        except TimeoutError:
+            self._refresh = future
+            self._deadline_misses += 1
+            self.logger.warning(
+                "Refresh missed its %.1fs deadline, serving data from %.1fs ago"
+                % (self._deadline, time.time() - self._lastupdate)
+            )
+            return None
+        except Exception as e:
+            self.logger.error("Refresh failed: %s" % e)
+            return False
+
+        if not ds:
+            return False
+        return self._publish(ds)
+
+    def _finish_refresh(self):
+        """Publish a refresh that missed its deadline once it completes"""
+        if not self._refresh.done():
+            return None
+
+        future = self._refresh
+        self._refresh = None
+        try:
+            ds = future.result()
+        except Exception as e:
+            self.logger.error("Refresh failed: %s" % e)
+            return False
+
+        if not ds:
+            return False
+        self._publish(ds)
+        self.logger.info(
+            "Late refresh finished after %.3fs (%s)"
+            % (self._refresh_duration, self._timings)
+        )
         return True
 
+    def data_time(self):
+        """When the served data was collected"""
+        if self._warm is not None:
+            return self._warm.timestamp
+        return self._lastupdate
+
+    def sysuptime(self):
+        """
+        sysUpTime in ticks for TimeTicks columns like ifLastChange: the
+        master agent's, or time since the agent started until it is known
+        """
+        ticks = self._net.sysuptime()
+        if ticks is None:
+            ticks = int((time.monotonic() - self._started) * 100)
+        return ticks
+
+    def is_stale(self):
+        """True while the served data is older than a refresh should leave it"""
+        if (
+            not self.data_time()
+            or self._refresh is not None
+            or self._warm is not None
+        ):
+            return True
+        return time.time() - self.data_time() > self._stale_after
+
+    def _agent_dataset(self):
+        ds = DataSet()
+        scalars = self._agent_oid + ".1"
+        ds.set(
+            scalars + ".1.0",
+            "gauge32",
+            lambda: int(time.time() - self.data_time()) if self.data_time() else 0,
+        )
+        # TruthValue
+        ds.set(scalars + ".2.0", "int", lambda: 1 if self.is_stale() else 2)
+        ds.set(scalars + ".3.0", "counter32", lambda: self._deadline_misses)
+        ds.set(
+            scalars + ".4.0",
+            "gauge32",
+            lambda: int(self._refresh_duration * 1000),
+        )
+
+        metrics = self._net.metrics
+        requests = self._agent_oid + ".2.1.1"
+        for pdu_type in sorted(PDU_TYPES):
+            ds.set(
+                "%s.1.%d" % (requests, pdu_type),
+                "u64",
+                lambda t=pdu_type: metrics.requests(t),
+            )
+        for pdu_type in sorted(PDU_TYPES):
+            ds.set(
+                "%s.2.%d" % (requests, pdu_type),
+                "u64",
+                lambda t=pdu_type: metrics.varbinds(t),
+            )
+        latency = self._agent_oid + ".2.2.1"
+        for column in range(1, 11):
+            for pdu_type in sorted(PDU_TYPES):
+                for i, stage in enumerate(STAGES):
+                    oid = "%s.%d.%d.%d" % (latency, column, pdu_type, i + 1)
+                    if column <= 8:
+                        # Under 4 ** column us, about 2 ** (2 * column + 10) ns
+                        value = lambda t=pdu_type, s=stage, b=2 * column + 10: (
+                            metrics.below(t, s, b)
+                        )
+                        ds.set(oid, "u64", value)
+                    else:
+                        p = 50 if column == 9 else 99
+                        value = lambda t=pdu_type, s=stage, p=p: (
+                            (metrics.percentile(t, s, p) or 0) // 1000
+                        )
+                        ds.set(oid, "gauge32", value)
+        ds.set(self._agent_oid + ".2.3.1.0", "gauge32", self._net.size)
+        ds.set(self._agent_oid + ".2.3.2.0", "gauge32", lambda: int(self._net.age()))
+        ds.set(self._agent_oid + ".2.3.3.0", "u64", lambda: oid_cache_info().hits)
+        ds.set(self._agent_oid + ".2.3.4.0", "u64", lambda: oid_cache_info().misses)
+        ds.set(self._agent_oid + ".2.3.5.0", "gauge32", lambda: oid_cache_info().currsize)
+
+        refreshes = self.refreshes
+        stages = list(refreshes.stages)
+        counts = list(refreshes.counts)
+        self._timing_rows = (len(stages), len(counts))
+
+        def ms(f):
+            return lambda name: int(f(refreshes.durations(name) or [0]) * 1000)
+
+        stage_columns = [
+            ms(lambda durations: durations[-1]),
+            ms(lambda durations: sum(durations) / len(durations)),
+            ms(max),
+        ]
+        count_columns = [
+            lambda name: (refreshes.values(name) or [0])[-1],
+            lambda name: max(refreshes.values(name) or [0]),
+        ]
+        for table, names, columns in (
+            (".3.1.1", stages, stage_columns),
+            (".3.2.1", counts, count_columns),
+        ):
+            for i, name in enumerate(names):
+                ds.set("%s%s.1.%d" % (self._agent_oid, table, i + 1), "str", name)
+            for column, value in enumerate(columns):
+                for i, name in enumerate(names):
+                    ds.set(
+                        "%s%s.%d.%d" % (self._agent_oid, table, column + 2, i + 1),
+                        "gauge32",
+                        lambda value=value, name=name: value(name),
+                    )
+        return ds
+
+    def limit_notifications(self, rate, burst):
+        """Send at most rate notifications per second, in bursts of up to burst"""
+        self._notify_limit = TokenBucket(rate, burst)
+
+    def notify(self, trap_oid, values=()):
+        """
+        Send a notification over the AgentX session: trap_oid is the
+        snmpTrapOID.0 value, values a list of {"name", "type", "value"}
+        varbinds. Safe to call from any thread. Returns False if it was
+        dropped, by the rate limit or for lack of a session.
+        """
+        if self._notify_limit is not None and not self._notify_limit.take():
+            self._notifications_dropped += 1
+            self.logger.warning("Notification rate limit reached, dropping %s" % trap_oid)
+            return False
+        varbinds = [
+            {
+                "name": SNMP_TRAP_OID,
+                "type": agentx.TYPE_OBJECTIDENTIFIER,
+                "value": trap_oid,
+            }
+        ]
+        varbinds.extend(values)
+        if not self._net.notify(varbinds):
+            self._notifications_dropped += 1
+            self.logger.debug("Not connected, dropping notification %s" % trap_oid)
+            return False
+        self._notifications_sent += 1
+        return True
+
+    def _request_received(self, request):
+        self.request_received()
+
+    def invalidate_static(self):
+        """Rebuild the static layer before the next update"""
+        self._static_dirty = True
+
     def run(self):
         self.logger.info("Calling setup")
         if not self.setup():
             self.logger.error("Setup failed - exiting")
             return
 
+        if self._agent_oid:
+            self._agentset = self._agent_dataset()
+            self.register(self._agent_oid)
+            self._net.update(self._agentset._data)
+
+        if self._warm is not None:
+            self.logger.info("Serving the warm start dataset until the first update")
+            self._net.set_snapshot(self._warm)
+
         self.logger.info("Initial update")
-        self._update()
+        self._start_refresh()
 
         while True:
             if not self._net.is_connected():
                 self.logger.info("Opening AgentX connection")
                 self._net.start(self._oid_list)
 
-            if time.time() - self._lastupdate > self._update_period:
-                if not self._update():
-                    self.logger.warning(
-                        "Update failed, last successful update was %s"
-                        % self._lastupdate
-                    )
-                    time.sleep(1)
+            result = None
+            if self._refresh is not None:
+                result = self._finish_refresh()
+            elif (
+                time.time() - self._lastupdate > self._update_period
+                and time.time() >= self._retry_at
+            ):
+                result = self._start_refresh()
+            if result is False:
+                self.logger.warning(
+                    "Update failed, last successful update was %s"
+                    % self._lastupdate
+                )
+                self._retry_at = time.time() + 1
 
             try:
                 self._net.run()
@@ -75,8 +580,35 @@ class Agent(object):
                 self._net.disconnect()
                 time.sleep(1)
 
+    def publish(self, writer):
+        """
+        Run setup() and refresh every period like run(), but write each
+        dataset to a SnapshotWriter for a SnapshotAgent in another process
+        to serve, instead of connecting to the master agent.
+        """
+        self.logger.info("Calling setup")
+        if not self.setup():
+            self.logger.error("Setup failed - exiting")
+            return
+        self._writer = writer
+
+        while True:
+            if time.time() >= self._retry_at and not self._update():
+                self.logger.warning(
+                    "Update failed, last successful update was %s"
+                    % self._lastupdate
+                )
+                self._retry_at = time.time() + 1
+            time.sleep(
+                max(0.1, self._lastupdate + self._update_period - time.time())
+            )
+
     def stop(self):
         self.logger.debug("Stopping")
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        if self._state_file and self._lastupdate and self._writer is None:
+            self._save()
         self._net.disconnect()
         pass
 
@@ -84,10 +616,27 @@ class Agent(object):
         # Override this
         pass
 
+    def request_received(self):
+        # Override this to act on demand, it runs before each request is served
+        pass
+
+    def update_static(self):
+        # Override this to return a DataSet of slow-changing columns, which is
+        # rebuilt every static_period or after invalidate_static(). Return
+        # False on failure; None means there is no static layer, True that
+        # the values were written into registered tables.
+        return None
+
     def update(self):
-        # Override this
+        # Override this to return a DataSet, or True after writing values
+        # into registered tables
         pass
 
+    def register_table(self, table):
+        """Register a Table's subtree and serve it from its columns"""
+        self.register(oid_str(table.oid))
+        self._net.register_table(table)
+
     def register(self, oid_list):
         if not isinstance(oid_list, list):
             oid_list = [oid_list]
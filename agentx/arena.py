@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (
+    absolute_import,
+    division,
+    print_function,
+)
+
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from agentx.pdu import PDU
+
+# Varbind type and reserved field
+HEADER = struct.Struct("!HH")
+
+
+class PackedKeys(object):
+    """
+    Sorted OID tuples, packed as runs of OIDs that only differ in their last
+    sub-id (a table column): the run's prefix once, and the last sub-ids in
+    one array('I'). Keeps 4 bytes per OID and finds one with two bisects.
+    """
+
+    __slots__ = ("_firsts", "_prefixes", "_starts", "_subids")
+
+    def __init__(self, keys):
+        self._firsts = []  # First OID of every run
+        self._prefixes = []  # OID without its last sub-id, of every run
+        self._starts = array("I")  # Position of every run, and the count
+        self._subids = array("I")  # Last sub-id of every OID
+        prefix = None
+        for key in keys:
+            if key[:-1] != prefix:
+                prefix = key[:-1]
+                self._firsts.append(key)
+                self._prefixes.append(prefix)
+                self._starts.append(len(self._subids))
+            self._subids.append(key[-1])
+        self._starts.append(len(self._subids))
+
+    def __len__(self):
+        return len(self._subids)
+
+    def nbytes(self):
+        """Bytes taken by the arrays, not counting the run prefixes"""
+        return self._subids.itemsize * (len(self._subids) + len(self._starts))
+
+    def oid(self, pos):
+        """The OID tuple at a position"""
+        run = bisect_right(self._starts, pos) - 1
+        return self._prefixes[run] + (self._subids[pos],)
+
+    def find(self, oid, next=False, include=False):
+        """
+        Position of an OID tuple, or with next=True of the first OID after
+        it (or at it, with include). None if there is none.
+        """
+        run = bisect_right(self._firsts, oid) - 1
+        if run < 0:
+            # Before the first OID
+            return 0 if next and len(self._subids) else None
+        prefix = self._prefixes[run]
+        n = len(prefix)
+        start = self._starts[run]
+        end = self._starts[run + 1]
+        if oid[:n] != prefix:
+            # Past all OIDs of the run
+            if next and end < len(self._subids):
+                return end
+            return None
+
+        # The run's first OID is at or before oid, so oid is longer than
+        # its prefix
+        subid = oid[n]
+        if not next:
+            pos = bisect_left(self._subids, subid, start, end)
+            if len(oid) == n + 1 and pos < end and self._subids[pos] == subid:
+                return pos
+            return None
+        if include and len(oid) == n + 1:
+            pos = bisect_left(self._subids, subid, start, end)
+        else:
+            pos = bisect_right(self._subids, subid, start, end)
+        if pos < len(self._subids):
+            return pos
+        return None
+
+
+class Arena(object):
+    """
+    A serving dataset as one buffer of AgentX-encoded varbinds in OID order,
+    their offsets in an array('I'), and the OIDs as PackedKeys.
+
+    GET and GETNEXT look up the packed OIDs and return memoryview slices of
+    the buffer, which a response PDU sends as they are; no Python object is
+    kept per OID. Values are encoded when the arena is built, so a value
+    overwritten in place is served from the next build on.
+    """
+
+    def __init__(self, data, keys, previous=None):
+        """
+        Encode the entries of data, a dict of OID tuple => entry, in the order
+        of keys. Pass the previous Arena when it was built for the same keys,
+        to reuse its packed and encoded OIDs, encoding values only.
+        """
+        pdu = PDU()
+        chunks = []
+        offsets = array("I", [0])
+        pos = 0
+        if previous is not None:
+            self.keys = previous.keys
+            buf = previous._buf
+            starts = previous._offsets
+            encode_data = pdu.encode_data
+            for i, key in enumerate(keys):
+                entry = data[key]
+                t = entry["type"]
+                start = starts[i] + 4
+                # Type, reserved, the OID as encoded last time, the new data
+                oid = buf[start : start + 4 + 4 * buf[start]]
+                value = encode_data(t, entry["value"])
+                chunks.append(HEADER.pack(t, 0))
+                chunks.append(oid)
+                chunks.append(value)
+                pos += 4 + len(oid) + len(value)
+                offsets.append(pos)
+        else:
+            self.keys = PackedKeys(keys)
+            for key in keys:
+                entry = data[key]
+                varbind = pdu.encode_value(
+                    entry["type"], key, entry["value"], cached=False
+                )
+                chunks.append(varbind)
+                pos += len(varbind)
+                offsets.append(pos)
+        self._buf = b"".join(chunks)
+        self._offsets = offsets
+        self._view = memoryview(self._buf)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def nbytes(self):
+        """Bytes taken by the buffer and arrays"""
+        return (
+            len(self._buf)
+            + self._offsets.itemsize * len(self._offsets)
+            + self.keys.nbytes()
+        )
+
+    def varbind(self, pos):
+        """The encoded varbind at a position, as a memoryview"""
+        return self._view[self._offsets[pos] : self._offsets[pos + 1]]
+
+    def oid(self, pos):
+        """The OID tuple at a position"""
+        return self.keys.oid(pos)
+
+    def find(self, oid):
+        """Position of an OID tuple, or None"""
+        return self.keys.find(oid)
+
+    def find_next(self, oid, include=False):
+        """Position of the first OID after (or at, with include) an OID tuple, or None"""
+        return self.keys.find(oid, next=True, include=include)
@@ -6,39 +6,271 @@ from __future__ import (
     print_function,
 )
 
-import time
+from bisect import bisect_left
 import agentx
+from agentx.oid import oid_tuple
 
 
 class DataSetError(Exception):
     pass
 
 
-class DataSet:
+# Type codes by type name, resolved once per name
+_type_codes = {}
+
+# Interned OID tuples by dotted string, shared by all datasets so that
+# rebuilding the same OIDs neither parses them again nor keeps a tuple per
+# dataset
+_oids = {}
+OID_CACHE_SIZE = 1 << 20
+
+
+def type_code(oid_type):
+    """Resolve a type name like "int", "str", "u32" or "ticks" to a TYPE_* code"""
+    t = _type_codes.get(oid_type)
+    if t is not None:
+        return t
+    if isinstance(oid_type, int):
+        # Already a code
+        t = oid_type
+    elif oid_type.startswith("int"):
+        t = agentx.TYPE_INTEGER
+    elif oid_type.startswith("str"):
+        t = agentx.TYPE_OCTETSTRING
+    elif oid_type.startswith("oid"):
+        t = agentx.TYPE_OBJECTIDENTIFIER
+    elif oid_type.startswith("ip"):
+        t = agentx.TYPE_IPADDRESS
+    elif oid_type == "counter32" or oid_type == "uint32" or oid_type == "u32":
+        t = agentx.TYPE_COUNTER32
+    elif oid_type == "gauge32":
+        t = agentx.TYPE_GAUGE32
+    elif oid_type.startswith("time") or oid_type.startswith("tick"):
+        t = agentx.TYPE_TIMETICKS
+    elif oid_type.startswith("opaque"):
+        t = agentx.TYPE_OPAQUE
+    elif oid_type == "counter64" or oid_type == "uint64" or oid_type == "u64":
+        t = agentx.TYPE_COUNTER64
+    else:
+        raise DataSetError("Invalid oid_type: %s" % (oid_type))
+    _type_codes[oid_type] = t
+    return t
+
+
+def intern_oid(oid):
+    """Return the shared tuple for a dotted OID string, tuples are kept as they are"""
+    if isinstance(oid, tuple):
+        return oid
+    t = _oids.get(oid)
+    if t is None:
+        if len(_oids) >= OID_CACHE_SIZE:
+            # OIDs of interfaces long gone, start over
+            _oids.clear()
+        t = _oids[oid] = oid_tuple(oid)
+    return t
+
+
+def merged(datasets):
+    """
+    Merge DataSets (None is skipped) into one dict of OID tuple => Entry,
+    later ones winning. Returns (data, keys): keys are data's OIDs in OID
+    order when every dataset is ordered, else None.
+
+    The keys of ordered datasets are merged block by block, the OIDs of one
+    up to the next OID of any other copied together, so that tables whose
+    columns are split between layers (like ifXTable's metadata and
+    counters) cost a bisect per column rather than a sort.
+    """
+    datasets = [ds for ds in datasets if ds is not None and ds._data]
+    data = {}
+    for ds in datasets:
+        data.update(ds._data)
+    if not all(ds._ordered for ds in datasets):
+        return data, None
+
+    keys = [list(ds._data) for ds in datasets]
+    if len(keys) == 1:
+        return data, keys[0]
+    order = []
+    pos = [0] * len(keys)
+    live = list(range(len(keys)))  # Datasets with OIDs left
+    while live:
+        firsts = [keys[i][pos[i]] for i in live]
+        first = min(firsts)
+        owners = [i for i, key in zip(live, firsts) if key == first]
+        i = owners[0]
+        if len(owners) > 1:
+            # In several datasets, once
+            end = pos[i] + 1
+            for j in owners[1:]:
+                pos[j] += 1
+        elif len(live) > 1:
+            end = bisect_left(keys[i], min(key for key in firsts if key != first), pos[i])
+        else:
+            end = len(keys[i])
+        order.extend(keys[i][pos[i] : end])
+        pos[i] = end
+        live = [i for i in live if pos[i] < len(keys[i])]
+    return data, order
+
+
+class Entry(object):
+    """
+    One OID and its value. Reads and writes like the {"name", "type",
+    "value"} dict it replaces, entry["value"] is entry.value.
+    """
+
+    __slots__ = ("name", "type", "value")
+
+    def __init__(self, name, type, value):
+        self.name = name
+        self.type = type
+        self.value = value
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def __repr__(self):
+        return "Entry(%r, %r, %r)" % (self.name, self.type, self.value)
+
+
+class DataSet(object):
+    """OIDs and their values, keyed by interned OID tuple"""
+
+    __slots__ = ("_data", "_changed", "_ordered", "_last", "_walking", "_pin", "_replaced")
+
     def __init__(self):
         self._data = {}
+        # True when the set of OIDs changed since the network last took it
+        self._changed = True
+        # True while every OID was added after the previous one, so that
+        # _data is in OID order and serving it needs no sort
+        self._ordered = True
+        self._last = None
+        # While walking() is true, the entries served are left to the walks
+        # reading them: ColumnSlots give a column new entries the first time
+        # they set it in every pin() period, and set _replaced
+        self._walking = None
+        self._pin = 0
+        self._replaced = False
+
+    def __len__(self):
+        return len(self._data)
 
     def set(self, oid, oid_type, value):
-        if oid_type.startswith("int"):
-            t = agentx.TYPE_INTEGER
-        elif oid_type.startswith("str"):
-            t = agentx.TYPE_OCTETSTRING
-        elif oid_type.startswith("oid"):
-            t = agentx.TYPE_OBJECTIDENTIFIER
-        elif oid_type.startswith("ip"):
-            t = agentx.TYPE_IPADDRESS
-        elif oid_type == "counter32" or oid_type == "uint32" or oid_type == "u32":
-            t = agentx.TYPE_COUNTER32
-        elif oid_type == "gauge32":
-            t = agentx.TYPE_GAUGE32
-        elif oid_type.startswith("time") or oid_type.startswith("tick"):
-            t = agentx.TYPE_TIMETICKS
-        elif oid_type.startswith("opaque"):
-            t = agentx.TYPE_OPAQUE
-        elif oid_type == "counter64" or oid_type == "uint64" or oid_type == "u64":
-            t = agentx.TYPE_COUNTER64
+        """
+        Set an OID, given as a dotted string or tuple. oid_type is a type
+        name or TYPE_* code; value may be a callable, which is called when
+        queried.
+        """
+        name = intern_oid(oid)
+        t = _type_codes.get(oid_type) or type_code(oid_type)
+        entry = self._data.get(name)
+        if entry is None:
+            self._data[name] = Entry(name, t, value)
+            self._changed = True
+            if self._last is not None and name < self._last:
+                self._ordered = False
+            self._last = name
         else:
-            raise DataSetErrror("Invalid oid_type: %s" % (oid_type))
-            return
+            # Update in place, so ColumnSlots and the serving dataset keep
+            # referring to the same entry
+            entry.type = t
+            entry.value = value
+
+    def pin(self, walking):
+        """
+        Once the entries are served: until the next call, ColumnSlots ask
+        walking(), e.g. Network.pinned, before overwriting a column, and
+        while it is true leave its entries to the walks that may read them.
+        Columns that aren't set meanwhile keep sharing their entries.
+        """
+        self._walking = walking
+        self._pin += 1
+        self._replaced = False
+
+    def extend(self, entries):
+        """
+        Set every (oid, oid_type, value) an iterable yields. Builders yield
+        them in OID order, column by column, to keep the dataset ordered.
+        """
+        set = self.set
+        for oid, oid_type, value in entries:
+            set(oid, oid_type, value)
+
+    def get(self, oid):
+        """Return the Entry of an OID, or None"""
+        return self._data.get(intern_oid(oid))
+
+    def columns(self, columns, rows):
+        """
+        Lay out a table of (oid_prefix, oid_type) columns by row indexes,
+        a None row leaves that position out.
+
+        Returns a ColumnSlots whose values can be overwritten without
+        formatting OIDs or touching the set of OIDs.
+        """
+        return ColumnSlots(self, columns, rows)
+
+
+class ColumnSlots:
+    def __init__(self, ds, columns, rows):
+        self.rows = list(rows)
+        self.slots = [None] * len(columns)
+        self._ds = ds
+        self._copied = [0] * len(columns)  # ds._pin a column was copied in
+        # Positions stay in the order given, OIDs are added to ds in OID
+        # order: column by column, rows ascending
+        order = sorted(
+            (row, pos) for pos, row in enumerate(self.rows) if row is not None
+        )
+        for prefix, i, oid_type in sorted(
+            (oid_tuple(prefix), i, oid_type)
+            for i, (prefix, oid_type) in enumerate(columns)
+        ):
+            t = type_code(oid_type)
+            # Positions left out (None rows) keep a None slot, their values
+            # are skipped
+            column = [None] * len(self.rows)
+            for row, pos in order:
+                oid = prefix + (row,)
+                ds.set(oid, t, 0)
+                column[pos] = ds._data[oid]
+            self.slots[i] = column
+
+    def set_column(self, column, values):
+        ds = self._ds
+        if (
+            self._copied[column] != ds._pin
+            and ds._walking is not None
+            and ds._walking()
+        ):
+            self._copy(column)
+        for slot, value in zip(self.slots[column], values):
+            if slot is not None:
+                slot.value = value
+
+    def _copy(self, column):
+        """Give a column new entries, leaving the served ones as they are"""
+        ds = self._ds
+        data = ds._data
+        slots = []
+        for slot in self.slots[column]:
+            if slot is not None:
+                slot = data[slot.name] = Entry(slot.name, slot.type, slot.value)
+            slots.append(slot)
+        self.slots[column] = slots
+        self._copied[column] = ds._pin
+        ds._replaced = True
 
-        self._data[oid] = {"name": oid, "type": t, "value": value}
+    def set_value(self, column, pos, value):
+        """
+        Overwrite the value at one position of a column, in place even while
+        walks read it: events are served as soon as they arrive
+        """
+        slot = self.slots[column][pos]
+        if slot is not None:
+            slot.value = value
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (
+    absolute_import,
+    division,
+    print_function,
+)
+
+import time
+from collections import deque
+
+# Stages of serving a request, timed separately
+STAGES = ("decode", "lookup", "encode", "send")
+
+# Latency buckets: a duration of d nanoseconds is counted in bucket
+# d.bit_length(), i.e. bucket b holds durations under 2 ** b ns
+BUCKETS = 64
+
+# PDU types with their own counters: AGENTX_GET_PDU and AGENTX_GETNEXT_PDU
+# (agentx imports this module before defining them), everything else is
+# counted as 0
+PDU_TYPES = (5, 6, 0)
+
+
+class RequestMetrics(object):
+    """
+    Request and varbind counters, and a latency histogram per PDU type and
+    stage, recorded by Network.run() for every request it serves.
+
+    Recording is a handful of list increments, cheap enough to stay on;
+    the histograms are only summed up when read.
+    """
+
+    def __init__(self):
+        # Counts of every stage, stage after stage, then the varbinds, by
+        # PDU type. The type is a byte: all types without their own counters
+        # share those of 0, so recording needs no lookup.
+        other = [0] * (BUCKETS * len(STAGES) + 1)
+        self.histograms = [other] * 256
+        for pdu_type in PDU_TYPES:
+            if pdu_type:
+                self.histograms[pdu_type] = [0] * len(other)
+
+    def record(self, pdu_type, varbinds, decode, lookup, encode, send):
+        """Count a request, with the nanoseconds each stage took"""
+        h = self.histograms[pdu_type]
+        # Offsets of the stages, BUCKETS apart
+        h[decode.bit_length()] += 1
+        h[64 + lookup.bit_length()] += 1
+        h[128 + encode.bit_length()] += 1
+        h[192 + send.bit_length()] += 1
+        h[256] += varbinds
+
+    def requests(self, pdu_type):
+        """Requests served of a PDU type"""
+        return sum(self.histograms[pdu_type][:BUCKETS])
+
+    def varbinds(self, pdu_type):
+        """Varbinds answered in requests of a PDU type"""
+        return self.histograms[pdu_type][BUCKETS * len(STAGES)]
+
+    def below(self, pdu_type, stage, bucket):
+        """Requests of a PDU type whose stage took under 2 ** bucket ns"""
+        start = STAGES.index(stage) * BUCKETS
+        return sum(self.histograms[pdu_type][start : start + bucket + 1])
+
+    def percentile(self, pdu_type, stage, p):
+        """
+        Upper bound in nanoseconds of the p-th percentile of a stage's
+        durations, None without requests
+        """
+        start = STAGES.index(stage) * BUCKETS
+        counts = self.histograms[pdu_type][start : start + BUCKETS]
+        total = sum(counts)
+        if not total:
+            return None
+        seen = 0
+        for bucket, count in enumerate(counts):
+            seen += count
+            if seen * 100 >= total * p:
+                return 2 ** bucket
+        return 2 ** (BUCKETS - 1)
+
+
+class Timings(object):
+    """
+    Durations of the stages of one refresh, in the order they ran, and
+    counts taken along, like OIDs served or retries
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = []  # (name, seconds)
+        self.counts = {}  # name => count
+
+    def stage(self, name, start):
+        """Record a stage that began at start (time.time()), return the time now"""
+        now = time.time()
+        self.stages.append((name, now - start))
+        return now
+
+    def record(self, name, seconds):
+        """Record a stage timed elsewhere, e.g. in another thread"""
+        self.stages.append((name, seconds))
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def add(self, other):
+        """Add another Timings' stages and counts, e.g. those of a collector"""
+        if other is None:
+            return
+        self.stages.extend(other.stages)
+        for name, n in other.counts.items():
+            self.count(name, n)
+
+    def __str__(self):
+        return ", ".join(
+            ["%s %.3fs" % stage for stage in self.stages]
+            + ["%s %d" % count for count in sorted(self.counts.items())]
+        )
+
+
+class TimingsLog(object):
+    """The Timings of the last refreshes, in a ring buffer"""
+
+    def __init__(self, size=100):
+        self.runs = deque(maxlen=size)
+        self.stages = []  # Stage names, in the order first seen
+        self.counts = []  # Count names, likewise
+
+    def __len__(self):
+        return len(self.runs)
+
+    def append(self, timings):
+        self.runs.append(timings)
+        for name, _ in timings.stages:
+            if name not in self.stages:
+                self.stages.append(name)
+        for name in timings.counts:
+            if name not in self.counts:
+                self.counts.append(name)
+
+    def durations(self, stage):
+        """Seconds a stage took in every refresh it ran in, oldest first"""
+        durations = []
+        for run in self.runs:
+            total = None
+            for name, seconds in run.stages:
+                if name == stage:
+                    total = (total or 0) + seconds
+            if total is not None:
+                durations.append(total)
+        return durations
+
+    def values(self, count):
+        """A count of every refresh that took it, oldest first"""
+        return [run.counts[count] for run in self.runs if count in run.counts]
+
+    def summary(self):
+        """One line with the last, mean and max duration of every stage"""
+        parts = []
+        for stage in self.stages:
+            durations = self.durations(stage)
+            if durations:
+                parts.append(
+                    "%s %.3f/%.3f/%.3fs"
+                    % (
+                        stage,
+                        durations[-1],
+                        sum(durations) / len(durations),
+                        max(durations),
+                    )
+                )
+        for count in self.counts:
+            values = self.values(count)
+            if values:
+                parts.append("%s %d/max %d" % (count, values[-1], max(values)))
+        return "%d refreshes, last/mean/max: %s" % (len(self.runs), ", ".join(parts))
+
+    def dump(self):
+        """One line per refresh, oldest first"""
+        return [
+            "%s %s"
+            % (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run.started)), run)
+            for run in self.runs
+        ]
@@ -7,9 +7,16 @@ from __future__ import (
 )
 
 import socket
+import struct
 import time
 import logging
+from time import perf_counter_ns
+from collections import OrderedDict, deque
+from bisect import bisect_left, bisect_right
 import agentx
+from agentx.arena import Arena
+from agentx.metrics import RequestMetrics
+from agentx.oid import oid_str, oid_tuple
 from agentx.pdu import PDU
 
 
@@ -22,20 +29,119 @@ logger = logging.getLogger("agentx.network")
 logger.addHandler(NullHandler())
 
 
+# Walks in progress whose position GETNEXT remembers, and the varbinds it
+# encodes ahead for each of them
+WALKS = 64
+PREFETCH = 16
+
+# A walk keeps reading the dataset, tables and snapshot it started on after
+# they were replaced, for at most PIN_AGE seconds after it started, as long
+# as it goes on (a GETNEXT every WALK_IDLE seconds at most). At most PINNED
+# replaced datasets are kept for walks.
+PIN_AGE = 30.0
+WALK_IDLE = 5.0
+PINNED = 2
+
+
+# AgentX header: 20 bytes ending with the payload length
+HEADER_SIZE = 20
+_PAYLOAD_LENGTH = struct.Struct("!L")
+
+
 class NetworkError(Exception):
     pass
 
 
+def _name(entry):
+    """The OID of a served entry or encoded varbind, for logging"""
+    if entry is None:
+        return None
+    if isinstance(entry, (bytes, memoryview)):
+        pdu = PDU()
+        pdu.decode_buf = bytes(entry[4:])
+        return pdu.decode_oid()[0]
+    return entry["name"]
+
+
+class _Cursor(object):
+    """
+    Where a walk stands after the OID GETNEXT last returned to it: what it
+    reads (data, data_keys, arena and views of the sources, the generation
+    of update() that served them), when it started and last went on, the
+    position of the next OID in data_keys
+    and in the arena, and the varbinds encoded ahead from data_keys
+    """
+
+    __slots__ = (
+        "data",
+        "keys",
+        "arena",
+        "sources",
+        "generation",
+        "since",
+        "used",
+        "pos",
+        "apos",
+        "ahead",
+        "ahead_pos",
+    )
+
+    def __init__(self):
+        self.ahead = None
+        self.ahead_pos = 0
+
+    def prefetched(self, data, keys, pos, entry):
+        """
+        The encoded varbind of entry, keys[pos], encoding the next few if
+        needed. None for a query-time value, which is read when asked for.
+        """
+        ahead = self.ahead
+        i = pos - self.ahead_pos
+        if ahead is None or not 0 <= i < len(ahead) or ahead[i][0] is not entry.value:
+            # Not encoded yet, or overwritten since
+            pdu = PDU()
+            ahead = self.ahead = []
+            self.ahead_pos = pos
+            i = 0
+            for key in keys[pos : pos + PREFETCH]:
+                e = data[key]
+                value = e.value
+                if callable(value):
+                    ahead.append((value, None))
+                else:
+                    ahead.append((value, pdu.encode_value(e.type, e.name, value)))
+        return ahead[i][1]
+
+
 class Network:
-    def __init__(self, server_address="/var/agentx/master", debug=False, timeout=1.0):
+    def __init__(
+        self, server_address="/var/agentx/master", debug=False, timeout=1.0, arena=False
+    ):
 
         self.session_id = 0
         self.transaction_id = 0
         self.debug = debug
         # Data Related Variables
-        self.data = {}
-        self.data_idx = []
+        self.data = {}  # OID tuple => Entry
+        self.data_keys = []  # Sorted OID tuples, for bisect
+        # With arena=True, update() encodes all but query-time values into an
+        # Arena, data only keeps those
+        self.arena = None
+        self._arena_mode = arena
+        self._arena_keys = None  # OID tuples in the order of the arena
+        self.tables = []
+        self.snapshot = None  # Shared memory Snapshot, see set_snapshot()
+        self.sources = []  # Tables and snapshot, searched after data
+        self.request_hook = None  # Called with every request before it's served
+        self.metrics = RequestMetrics()  # Timing of every request served
+        self._uptime = None  # Master agent (sysUpTime, time.monotonic()) at open
+        self.notifications = deque(maxlen=1000)  # VarBindLists to send, see notify()
+        self._walks = OrderedDict()  # Last OID returned by GETNEXT => _Cursor
+        self._generation = 0  # Counts update() calls, see _Cursor
+        self._served = time.monotonic()  # When update() was last called
+        self._walked = 0  # When GETNEXT was last asked, see pinned()
         self._connected = False
+        self._received = b""  # Start of a PDU the next recv() completes
         self._server_address = server_address
         self._timeout = timeout  # Seconds (increased from 0.1 to 1.0 for better reliability)
 
@@ -86,20 +192,122 @@ class Network:
         self.socket.close()
         self.socket = None
         self._connected = False
+        self._received = b""
         return
 
-    def update(self, newdata):
-        if len(self.data) == 0:
+    def update(self, newdata, ordered=False, changed=True, timings=None):
+        """
+        Serve a dict of OID tuple => Entry, like DataSet._data. Pass
+        ordered=True when its keys are already in OID order, or them as a
+        list in OID order, to skip sorting them, and changed=False when they are the same as last time, to only
+        encode the values again in arena mode, or else reuse the sorted keys.
+        A metrics.Timings is given the "sort", "encode" and "swap" stages.
+
+        Walks in progress keep reading the dataset replaced, see _get_next().
+        """
+        t = time.time()
+        self._retire()
+        if not changed and self.arena is not None:
+            self.arena = Arena(newdata, self._arena_keys, self.arena)
+            if timings is not None:
+                timings.stage("encode", t)
+            return
+        if not changed and not self._arena_mode and len(newdata) == len(self.data_keys):
+            # New entries for some of the same OIDs, see DataSet.pin()
+            self.data = newdata.copy()
+            if timings is not None:
+                timings.stage("swap", t)
+            return
+
+        if len(self.data) == 0 and self.arena is None:
             logger.info("Setting initial serving dataset (%d OIDs)" % len(newdata))
         else:
             logger.info("Replacing serving dataset (%d OIDs)" % len(newdata))
+        if isinstance(ordered, list):
+            keys = ordered
+        else:
+            keys = list(newdata)
+        if not ordered:
+            # Builders add OIDs in order, so this is one pass finding them
+            # ordered, or a merge of the ordered runs of a few datasets,
+            # rather than a full sort
+            keys.sort()
+        if timings is not None:
+            t = timings.stage("sort", t)
+
+        if self._arena_mode:
+            dynamic = [key for key in keys if callable(newdata[key]["value"])]
+            if dynamic:
+                keys = [key for key in keys if not callable(newdata[key]["value"])]
+            self.data = {key: newdata[key] for key in dynamic}
+            self.data_keys = dynamic
+            self._arena_keys = keys
+            self.arena = Arena(newdata, keys)
+            if timings is not None:
+                timings.stage("encode", t)
+            return
+
         del self.data
         self.data = newdata.copy()
-
-        del self.data_idx
-        self.data_idx = sorted(
-            self.data.keys(), key=lambda k: tuple(int(part) for part in k.split("."))
+        self.data_keys = keys
+        if timings is not None:
+            timings.stage("swap", t)
+
+    def _retire(self):
+        """
+        Before update() replaces the dataset: keep the walks reading the
+        newest PINNED datasets, and forget the others, which then carry on
+        with the new one. Datasets are released with their last walk.
+        """
+        now = time.monotonic()
+        walks = self._walks
+        live = set(
+            cursor.generation
+            for cursor in walks.values()
+            if now - cursor.used < WALK_IDLE and now - cursor.since < PIN_AGE
         )
+        kept = sorted(live)[-PINNED:]
+        for key in [key for key, cursor in walks.items() if cursor.generation not in kept]:
+            del walks[key]
+        self._generation += 1
+        self._served = now
+
+    def pinned(self):
+        """
+        True while walks may be reading the entries served now, or some of
+        them in a dataset replaced before. Safe to call from any thread.
+        """
+        return time.monotonic() - self._walked < WALK_IDLE
+
+    def size(self):
+        """OIDs served from the dataset and the shared memory snapshot"""
+        size = len(self.data)
+        if self.arena is not None:
+            size += len(self.arena)
+        if self.snapshot is not None:
+            size += len(self.snapshot)
+        return size
+
+    def age(self):
+        """Seconds since update() was last called"""
+        return time.monotonic() - self._served
+
+    def register_table(self, table):
+        """Serve a Table alongside the flat dataset"""
+        if table not in self.tables:
+            self.tables.append(table)
+            self.tables.sort(key=lambda t: t.oid)
+            self._set_sources()
+
+    def set_snapshot(self, snapshot):
+        """Serve a Snapshot published by another process alongside the rest"""
+        self.snapshot = snapshot
+        self._set_sources()
+
+    def _set_sources(self):
+        self.sources = list(self.tables)
+        if self.snapshot is not None:
+            self.sources.append(self.snapshot)
 
     def new_pdu(self, type):
         pdu = PDU(type)
@@ -115,6 +323,16 @@ class Network:
         pdu.packet_id = org_pdu.packet_id
         return pdu
 
+    def notify(self, values):
+        """
+        Queue a Notify PDU with a VarBindList, for run() to send from the
+        serving thread. Returns False when there is no session to send it on.
+        """
+        if not self._connected:
+            return False
+        self.notifications.append(values)
+        return True
+
     def send_pdu(self, pdu):
         if self.debug:
             pdu.dump()
@@ -124,6 +342,9 @@ class Network:
         buf = self.socket.recv(100000)
         if not buf:
             return None
+        return self.decode_pdu(buf)
+
+    def decode_pdu(self, buf):
         pdu = PDU()
         pdu.decode(buf)
         if self.debug:
@@ -132,44 +353,186 @@ class Network:
 
     # =========================================
 
-    def _get_next_oid(self, oid, endoid):
-        if oid in self.data:
-            # Exact match found
-            # logger.debug('get_next_oid, exact match of %s' % oid)
-            idx = self.data_idx.index(oid)
-            if idx == (len(self.data_idx) - 1):
-                # Last Item in MIB, No match!
-                return None
-            return self.data_idx[idx + 1]
+    def _resolve(self, entry):
+        if isinstance(entry, (bytes, memoryview)):
+            # Encoded varbind, from the arena or encoded ahead
+            return entry
+        if callable(entry["value"]):
+            # Query-time value
+            return {
+                "name": entry["name"],
+                "type": entry["type"],
+                "value": entry["value"](),
+            }
+        return entry
+
+    def _get(self, oid):
+        oid = oid_tuple(oid)
+        entry = self.data.get(oid)
+        if entry is not None:
+            return self._resolve(entry)
+        if self.arena is not None:
+            pos = self.arena.find(oid)
+            if pos is not None:
+                return self.arena.varbind(pos)
+        if self.sources:
+            for source in self.sources:
+                entry = source.get(oid)
+                if entry:
+                    return entry
+        return None
+
+    def _get_many(self, oids):
+        """
+        Look up all OIDs of a GET together, returning an entry or None for
+        each: the dataset, then the arena, then every source for what is
+        left, tables reading each column once
+        """
+        oids = [oid_tuple(oid) for oid in oids]
+        data = self.data
+        entries = [data.get(oid) for oid in oids]
+        missing = []
+        for i, entry in enumerate(entries):
+            if entry is None:
+                missing.append(i)
+            elif callable(entry["value"]):
+                entries[i] = self._resolve(entry)
+
+        if missing and self.arena is not None:
+            arena = self.arena
+            left = []
+            for i in missing:
+                pos = arena.find(oids[i])
+                if pos is None:
+                    left.append(i)
+                else:
+                    entries[i] = arena.varbind(pos)
+            missing = left
+
+        for source in self.sources:
+            if not missing:
+                break
+            get_many = getattr(source, "get_many", None)
+            if get_many is not None:
+                found = get_many([oids[i] for i in missing])
+            else:
+                found = [source.get(oids[i]) for i in missing]
+            left = []
+            for i, entry in zip(missing, found):
+                if entry:
+                    entries[i] = entry
+                else:
+                    left.append(i)
+            missing = left
+        return entries
+
+    def _get_next(self, oid, endoid, include=False):
+        """
+        Return the first entry after oid (or at it, with include) before endoid.
+
+        A walk asks for the OID after the one it was given last, so the
+        positions that one was found at are kept, and the next request
+        carries on from them instead of searching again. Once a walk is seen
+        going on, the next few varbinds of the dataset are encoded together,
+        and served as long as their entries keep the values encoded.
+
+        A walk also keeps reading the dataset it started on when update()
+        replaces it meanwhile, and views of the tables and the snapshot as
+        they were then, within PIN_AGE, so that all of its values come from
+        the same poll. Query-time values are read as they are now.
+        """
+        oid = oid_tuple(oid)
+        now = time.monotonic()
+        self._walked = now
+        cursor = None if include else self._walks.pop(oid, None)
+        if (
+            cursor is not None
+            and now - cursor.used < WALK_IDLE
+            and now - cursor.since < PIN_AGE
+        ):
+            data = cursor.data
+            keys = cursor.keys
+            arena = cursor.arena
+            sources = cursor.sources
+            pos = cursor.pos
+            apos = cursor.apos
         else:
-            # No exact match, find prefix
-            # logger.debug('get_next_oid, no exact match of %s' % oid)
-            slist = oid.split(".")
-            elist = endoid.split(".")
-            for tmp_oid in self.data_idx:
-                tlist = tmp_oid.split(".")
-                for i in range(len(tlist)):
-                    try:
-                        sok = int(slist[i]) <= int(tlist[i])
-                        eok = int(elist[i]) >= int(tlist[i])
-                        if not (sok and eok):
-                            break
-                    except IndexError:
-                        pass
-                if sok and eok:
-                    return tmp_oid
+            cursor = None
+            data = self.data
+            keys = self.data_keys
+            arena = self.arena
+            sources = [source.view() for source in self.sources]
+            if include:
+                pos = bisect_left(keys, oid)
+            else:
+                pos = bisect_right(keys, oid)
+            apos = arena.find_next(oid, include) if arena is not None else None
+
+        entry = None
+        found = None  # Where entry came from: "data", "arena" or a source
+        if pos < len(keys):
+            key = keys[pos]
+            entry = data[key]
+            found = "data"
+
+        if apos is not None:
+            name = arena.oid(apos)
+            if entry is None or name < key:
+                entry = arena.varbind(apos)
+                key = name
+                found = "arena"
+
+        for source in sources:
+            candidate = source.get_next(oid, include)
+            if candidate and (entry is None or candidate["name"] < key):
+                entry = candidate
+                key = candidate["name"]
+                found = source
+
+        if entry is None:
             return None  # No match!
+        endoid = oid_tuple(endoid)
+        if endoid and key >= endoid:
+            return None
+
+        # Whatever wasn't returned is still the next candidate after key
+        if found == "data":
+            if cursor is not None:
+                encoded = cursor.prefetched(data, keys, pos, entry)
+                if encoded is not None:
+                    entry = encoded
+            pos += 1
+        elif found == "arena":
+            apos = apos + 1 if apos + 1 < len(arena) else None
+        if cursor is None:
+            cursor = _Cursor()
+            cursor.data = data
+            cursor.keys = keys
+            cursor.arena = arena
+            cursor.sources = sources
+            cursor.generation = self._generation
+            cursor.since = now
+        cursor.used = now
+        cursor.pos = pos
+        cursor.apos = apos
+        self._walks[key] = cursor
+        if len(self._walks) > WALKS:
+            self._walks.popitem(last=False)
+        return self._resolve(entry)
 
     def start(self, oid_list):
         self.connect()
         if not self._connected:
             return
+        self._walks.clear()
 
         logger.debug("==== Open PDU ====")
         pdu = self.new_pdu(agentx.AGENTX_OPEN_PDU)
         self.send_pdu(pdu)
         pdu = self.recv_pdu()
         self.session_id = pdu.session_id
+        if pdu.type == agentx.AGENTX_RESPONSE_PDU:
+            self._uptime = (pdu.response["sysUpTime"], time.monotonic())
 
         logger.debug("==== Ping PDU ====")
         pdu = self.new_pdu(agentx.AGENTX_PING_PDU)
@@ -189,6 +552,16 @@ class Network:
     def stop(self):
         self.disconnect()
 
+    def sysuptime(self):
+        """
+        The master agent's sysUpTime in ticks, extrapolated from its response
+        to our Open PDU; None before the session was opened
+        """
+        if self._uptime is None:
+            return None
+        ticks, t = self._uptime
+        return int(ticks + (time.monotonic() - t) * 100) % 2 ** 32
+
     def is_connected(self):
         return self._connected
 
@@ -200,42 +573,97 @@ class Network:
             self.socket.settimeout(timeout)
             self._timeout = timeout
 
+        while self.notifications:
+            pdu = self.new_pdu(agentx.AGENTX_NOTIFY_PDU)
+            pdu.values = self.notifications.popleft()
+            self.send_pdu(pdu)
+
         try:
-            request = self.recv_pdu()
+            buf = self.socket.recv(100000)
         except socket.timeout:
             return
 
-        if not request:
+        if not buf:
             logger.error("Empty PDU, connection closed!")
             self.disconnect()
             raise NetworkError("Empty PDU, disconnecting")
 
+        # One read may hold several PDUs, e.g. acks of the Notify PDUs just
+        # sent followed by a request, and end with part of the next one
+        buf = self._received + buf
+        start = 0
+        while len(buf) - start >= HEADER_SIZE:
+            end = (
+                start
+                + HEADER_SIZE
+                + _PAYLOAD_LENGTH.unpack_from(buf, start + HEADER_SIZE - 4)[0]
+            )
+            if end > len(buf):
+                break
+            self._handle(buf[start:end])
+            start = end
+        self._received = buf[start:]
+
+    def _handle(self, buf):
+        """Handle one PDU"""
+        t0 = perf_counter_ns()
+        request = self.decode_pdu(buf)
+        if request.type == agentx.AGENTX_RESPONSE_PDU:
+            # The master agent acknowledging a Notify PDU
+            if request.response["error"]:
+                logger.warning(
+                    "Notification rejected: %s" % request.response["error_name"]
+                )
+            return
+        t1 = perf_counter_ns()
+
+        if self.request_hook:
+            self.request_hook(request)
+
+        # The hook may refresh on demand, that isn't counted as lookup
+        t2 = perf_counter_ns()
+        response = self.respond(request)
+        t3 = perf_counter_ns()
+        if self.debug:
+            response.dump()
+        buf = response.encode()
+        t4 = perf_counter_ns()
+        self.socket.send(buf)
+        t5 = perf_counter_ns()
+        self.metrics.record(
+            request.type, len(response.values), t1 - t0, t3 - t2, t4 - t3, t5 - t4
+        )
+
+    def respond(self, request):
+        """Return the response PDU to a GET or GETNEXT request"""
+        # Per-OID logging only when tracing, it costs more than the lookups
+        trace = logger.isEnabledFor(logging.DEBUG)
         response = self.response_pdu(request)
-        if request.type == agentx.AGENTX_GET_PDU:
-            logger.debug("Received GET PDU")
-            for rvalue in request.range_list:
-                oid = rvalue[0]
-                logger.debug("OID: %s" % (oid))
-                if oid in self.data:
-                    logger.debug("OID Found")
-                    response.values.append(self.data[oid])
-                else:
-                    logger.debug("OID Not Found!")
-                    response.values.append(
-                        {
-                            "type": agentx.TYPE_NOSUCHOBJECT,
-                            "name": rvalue[0],
-                            "value": 0,
-                        }
-                    )
+        if request.error:
+            # Malformed, see PDU.decode_search_range_list()
+            logger.warning("Could not decode PDU %d" % request.packet_id)
+            response.error = request.error
+        elif request.type == agentx.AGENTX_GET_PDU:
+            oids = [rvalue[0] for rvalue in request.range_list]
+            entries = self._get_many(oids)
+            if trace:
+                logger.debug("Received GET PDU")
+                for oid, entry in zip(oids, entries):
+                    logger.debug("GET: %s => %s" % (oid_str(oid), _name(entry)))
+            for oid, entry in zip(oids, entries):
+                if entry is None:
+                    entry = {"type": agentx.TYPE_NOSUCHOBJECT, "name": oid, "value": 0}
+                response.values.append(entry)
 
         elif request.type == agentx.AGENTX_GETNEXT_PDU:
-            logger.debug("Received GET_NEXT PDU")
+            if trace:
+                logger.debug("Received GET_NEXT PDU")
             for rvalue in request.range_list:
-                oid = self._get_next_oid(rvalue[0], rvalue[1])
-                logger.debug("GET_NEXT: %s => %s" % (rvalue[0], oid))
-                if oid:
-                    response.values.append(self.data[oid])
+                entry = self._get_next(rvalue[0], rvalue[1], rvalue[2])
+                if trace:
+                    logger.debug("GET_NEXT: %s => %s" % (rvalue[0], _name(entry)))
+                if entry:
+                    response.values.append(entry)
                 else:
                     response.values.append(
                         {
@@ -248,4 +676,4 @@ class Network:
         else:
             logger.warn("Received unsupported PDU %d" % request.type)
 
-        self.send_pdu(response)
+        return response
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (
+    absolute_import,
+    division,
+    print_function,
+)
+
+import time
+import threading
+
+# SNMPv2-MIB snmpTrapOID.0, the first varbind of every notification
+SNMP_TRAP_OID = "1.3.6.1.6.3.1.1.4.1.0"
+
+
+class TokenBucket:
+    """
+    Allow rate events per second on average, and bursts of up to burst
+    events. Safe to share between threads.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = self.burst
+        self._time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Return True and use up a token if one is available"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._time) * self.rate
+            )
+            self._time = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
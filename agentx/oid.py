@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (
+    absolute_import,
+    division,
+    print_function,
+)
+
+
+def oid_tuple(oid):
+    """Convert a dotted OID string (or any sequence of sub-ids) to a tuple"""
+    if isinstance(oid, tuple):
+        return oid
+    if isinstance(oid, str):
+        oid = oid.strip().strip(".")
+        if not oid:
+            return ()
+        return tuple(int(i) for i in oid.split("."))
+    return tuple(oid)
+
+
+def oid_str(oid):
+    """Convert an OID tuple to a dotted string"""
+    if isinstance(oid, str):
+        return oid
+    return ".".join(str(i) for i in oid)
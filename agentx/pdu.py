@@ -9,7 +9,9 @@ from __future__ import (
 # --------------------------------------------
 import struct
 import pprint
+import functools
 import logging
+from collections import namedtuple
 import agentx
 
 
@@ -22,6 +24,76 @@ logger = logging.getLogger("agentx.pdu")
 logger.addHandler(NullHandler())
 
 
+# Sub-id packers by number of sub-ids, an OID has at most 128
+_SUBIDS = [struct.Struct("!%dL" % n) for n in range(129)]
+_OID_HEADER = struct.Struct("BBB")
+
+
+# Encoded OIDs kept by encode_oid(), most recently used first, at least; see
+# size_oid_cache()
+OID_CACHE_SIZE = 1 << 16
+
+CacheInfo = namedtuple("CacheInfo", "hits misses maxsize currsize")
+
+
+def _pack_oid(oid, include):
+    """Encode an OID string or tuple"""
+    if isinstance(oid, str):
+        oid = oid.strip()
+        oid = oid.split(".")
+        oid = [int(i) for i in oid]
+    else:
+        oid = list(oid)
+    if len(oid) > 5 and oid[:4] == [1, 3, 6, 1]:
+        # prefix
+        prefix = oid[4]
+        oid = oid[5:]
+    else:
+        # no prefix
+        prefix = 0
+    buf = struct.pack("BBBB", len(oid), prefix, include, 0)
+    buf += _SUBIDS[len(oid)].pack(*oid)
+    return buf
+
+
+def _unpack_oid(buf, pos):
+    """Decode the OID at pos in buf: (sub-id tuple, include, position after it)"""
+    n_subid, prefix, include = _OID_HEADER.unpack_from(buf, pos)
+    sub_ids = _SUBIDS[n_subid].unpack_from(buf, pos + 4)
+    if prefix:
+        sub_ids = (1, 3, 6, 1, prefix) + sub_ids
+    return sub_ids, include, pos + 4 + 4 * n_subid
+
+
+_encode_oid = functools.lru_cache(maxsize=OID_CACHE_SIZE)(_pack_oid)
+_retired = (0, 0)  # Hits and misses of the caches size_oid_cache() replaced
+
+
+def size_oid_cache(size):
+    """
+    Make the encoded OID cache hold at least size OIDs, e.g. all those encoded
+    again on every walk or refresh: going through more OIDs than it holds in
+    order, an LRU cache misses every time. Only grows, starting over empty.
+    """
+    global _encode_oid, _retired
+    info = _encode_oid.cache_info()
+    maxsize = info.maxsize
+    if size <= maxsize:
+        return
+    while maxsize < size:
+        maxsize *= 2
+    _retired = (_retired[0] + info.hits, _retired[1] + info.misses)
+    _encode_oid = functools.lru_cache(maxsize=maxsize)(_pack_oid)
+
+
+def oid_cache_info():
+    """(hits, misses, maxsize, currsize) of the encoded OID cache"""
+    info = _encode_oid.cache_info()
+    return CacheInfo(
+        _retired[0] + info.hits, _retired[1] + info.misses, info.maxsize, info.currsize
+    )
+
+
 class PDU(object):
     def __init__(self, type=0):
         self.type = type
@@ -54,20 +126,9 @@ class PDU(object):
     # encode functions
 
     def encode_oid(self, oid, include=0):
-        oid = oid.strip()
-        oid = oid.split(".")
-        oid = [int(i) for i in oid]
-        if len(oid) > 5 and oid[:4] == [1, 3, 6, 1]:
-            # prefix
-            prefix = oid[4]
-            oid = oid[5:]
-        else:
-            # no prefix
-            prefix = 0
-        buf = struct.pack("BBBB", len(oid), prefix, include, 0)
-        for i in range(len(oid)):
-            buf += struct.pack("!L", oid[i])
-        return buf
+        if isinstance(oid, list):
+            oid = tuple(oid)
+        return _encode_oid(oid, include)
 
     def encode_octet(self, octet):
         octet = octet.encode("utf-8")
@@ -77,9 +138,19 @@ class PDU(object):
         buf += chr(0).encode() * padding
         return buf
 
-    def encode_value(self, type, name, value):
+    def encode_value(self, type, name, value, cached=True):
+        """
+        Encode a varbind. Pass cached=False for one whose encoding is kept,
+        e.g. in an Arena, to leave the OID out of the encoded OID cache.
+        """
         buf = struct.pack("!HH", type, 0)
-        buf += self.encode_oid(name)
+        buf += self.encode_oid(name) if cached else _pack_oid(name, 0)
+        buf += self.encode_data(type, value)
+        return buf
+
+    def encode_data(self, type, value):
+        """Encode the data of a varbind, without its type and name"""
+        buf = b""
         if type in [agentx.TYPE_INTEGER]:
             buf += struct.pack("!l", value)
         elif type in [
@@ -107,9 +178,27 @@ class PDU(object):
             # No data
             pass
         else:
-            logger.error("Unknown Type:" % type)
+            logger.error("Unknown Type: %s" % type)
         return buf
 
+    def encode_varbinds(self, values):
+        """
+        Encode a VarBindList of {"name", "type", "value"} entries, or
+        already encoded varbinds (bytes or memoryview, e.g. from an Arena)
+        """
+        chunks = []
+        for value in values:
+            if isinstance(value, (bytes, memoryview)):
+                chunks.append(value)
+            elif isinstance(value, dict):
+                chunks.append(
+                    self.encode_value(value["type"], value["name"], value["value"])
+                )
+            else:
+                # An Entry, read without its dict-like accessors
+                chunks.append(self.encode_value(value.type, value.name, value.value))
+        return b"".join(chunks)
+
     def encode_header(self, pdu_type, payload_length=0, flags=0):
         flags = flags | 0x10  # Bit 5 = all ints in NETWORK_BYTE_ORDER
         buf = struct.pack("BBBB", 1, pdu_type, flags, 0)
@@ -143,8 +232,12 @@ class PDU(object):
 
         elif self.type == agentx.AGENTX_RESPONSE_PDU:
             buf += struct.pack("!LHH", 0, self.error, self.error_index)
-            for value in self.values:
-                buf += self.encode_value(value["type"], value["name"], value["value"])
+            buf += self.encode_varbinds(self.values)
+
+        elif self.type == agentx.AGENTX_NOTIFY_PDU:
+            # VarBindList only, starting with snmpTrapOID.0; the master agent
+            # adds sysUpTime.0
+            buf += self.encode_varbinds(self.values)
 
         else:
             # Unsupported PDU type
@@ -159,40 +252,39 @@ class PDU(object):
         self.decode_buf = buf
 
     def decode_oid(self):
+        """Decode an OID as a tuple of sub-ids, and its include flag"""
         try:
-            t = struct.unpack("!BBBB", self.decode_buf[:4])
-            self.decode_buf = self.decode_buf[4:]
-            ret = {
-                "n_subid": t[0],
-                "prefix": t[1],
-                "include": t[2],
-                "reserved": t[3],
-            }
-            sub_ids = []
-            if ret["prefix"]:
-                sub_ids = [1, 3, 6, 1]
-                sub_ids.append(ret["prefix"])
-            for i in range(ret["n_subid"]):
-                t = struct.unpack("!L", self.decode_buf[:4])
-                self.decode_buf = self.decode_buf[4:]
-                sub_ids.append(t[0])
-            oid = ".".join(str(i) for i in sub_ids)
-            return oid, ret["include"]
+            sub_ids, include, end = _unpack_oid(self.decode_buf, 0)
+            self.decode_buf = self.decode_buf[end:]
+            return sub_ids, include
         except Exception as e:
             logger.exception("Invalid packing OID header")
             logger.debug("%s" % pprint.pformat(self.decode_buf))
 
     def decode_search_range(self):
         start_oid, include = self.decode_oid()
-        if start_oid == []:
-            return [], [], 0
         end_oid, _ = self.decode_oid()
         return start_oid, end_oid, include
 
     def decode_search_range_list(self):
+        """
+        Decode a SearchRangeList in one pass, without copying the buffer. A
+        malformed one sets error to parseError, for the response.
+        """
         range_list = []
-        while len(self.decode_buf):
-            range_list.append(self.decode_search_range())
+        buf = self.decode_buf
+        pos = 0
+        try:
+            while pos < len(buf):
+                start_oid, include, end = _unpack_oid(buf, pos)
+                end_oid, _, pos = _unpack_oid(buf, end)
+                range_list.append((start_oid, end_oid, include))
+        except (struct.error, IndexError):
+            # Truncated, or more than 128 sub-ids
+            logger.exception("Invalid packing OID header")
+            logger.debug("%s" % pprint.pformat(buf[pos:]))
+            self.error = agentx.ERROR_PARSEERROR
+        self.decode_buf = b""
         return range_list
 
     def decode_octet(self):
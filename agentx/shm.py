@@ -0,0 +1,395 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (
+    absolute_import,
+    division,
+    print_function,
+)
+
+import os
+import mmap
+import time
+import struct
+import logging
+from array import array
+from bisect import bisect_left, bisect_right
+import agentx
+from agentx.agent import Agent
+from agentx.oid import oid_str
+from agentx.pdu import PDU, size_oid_cache
+
+
+class NullHandler(logging.Handler):
+    def emit(self, record):
+        pass
+
+
+logger = logging.getLogger("agentx.shm")
+logger.addHandler(NullHandler())
+
+
+# Shared region layout, in host byte order:
+#
+#   header   magic, version, reserved, seq, generation, timestamp, count,
+#            length of the body that follows the header
+#   body     for a SnapshotWriter:
+#     offsets  count + 1 uint32, varbind i is at offsets[i]..offsets[i + 1]
+#     varbinds AgentX-encoded varbinds (network byte order) sorted by OID
+#
+# Like VPP's stats segment, seq is odd while the writer is updating the
+# region; readers copy it out and retry if seq was odd or changed meanwhile.
+# generation changes whenever the layout of the body does, for a
+# SnapshotWriter whenever the OIDs or their offsets do.
+MAGIC = b"VSNP"
+VERSION = 1
+HEADER = struct.Struct("=4sHHQQdII")
+SEQ = struct.Struct("=Q")
+SEQ_OFFSET = 8
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _encode(data, order, cached=True):
+    """Encode data's entries in order as (offsets, varbinds)"""
+    pdu = PDU()
+    chunks = []
+    offsets = array("I", [0])
+    pos = 0
+    for key in order:
+        entry = data[key]
+        value = entry["value"]
+        if callable(value):
+            value = value()
+        varbind = pdu.encode_value(entry["type"], key, value, cached)
+        chunks.append(varbind)
+        pos += len(varbind)
+        offsets.append(pos)
+    return offsets, b"".join(chunks)
+
+
+def save(path, data):
+    """
+    Write a dict of OID tuple => Entry, like DataSet._data, or a Snapshot to
+    a file in the snapshot format, atomically, to load() after a restart
+    """
+    if isinstance(data, Snapshot):
+        body, count, timestamp = data._body, len(data), data.timestamp
+    else:
+        order = sorted(data)
+        offsets, varbinds = _encode(data, order, cached=False)
+        body, count, timestamp = offsets.tobytes() + varbinds, len(order), time.time()
+    tmp = "%s.tmp" % path
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0, timestamp, count, len(body)))
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load(path):
+    """Return the Snapshot save() wrote to a file, None if there is none"""
+    try:
+        with open(path, "rb") as f:
+            buf = f.read()
+    except (IOError, OSError):
+        return None
+    if len(buf) < HEADER.size:
+        return None
+    magic, version, _, _, generation, timestamp, count, length = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or version != VERSION or len(buf) < HEADER.size + length:
+        logger.warning("Ignoring unusable snapshot file %s" % path)
+        return None
+    return Snapshot(buf[HEADER.size : HEADER.size + length], count, generation, timestamp)
+
+
+class RegionWriter:
+    """
+    Seqlock-protected shared memory file holding one opaque body, rewritten
+    as a whole by a single writer
+    """
+
+    def __init__(self, path, magic=MAGIC, version=VERSION, size=1 << 20):
+        self.path = path
+        self._magic = magic
+        self._version = version
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < max(size, HEADER.size):
+            os.ftruncate(self._fd, max(size, HEADER.size))
+        self._mm = mmap.mmap(self._fd, 0)
+
+        self._seq = 0
+        self.generation = 0
+        magic, version, _, seq, generation = HEADER.unpack_from(self._mm, 0)[:5]
+        if magic == self._magic and version == self._version:
+            # Carry on from a previous writer, so readers see a change
+            self._seq = seq + (seq & 1)
+            self.generation = generation
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
+
+    def _grow(self, size):
+        size = (size * 2 + mmap.PAGESIZE - 1) // mmap.PAGESIZE * mmap.PAGESIZE
+        logger.info("Growing %s to %d bytes" % (self.path, size))
+        self._mm.close()
+        os.ftruncate(self._fd, size)
+        self._mm = mmap.mmap(self._fd, 0)
+
+    def write(self, body, count):
+        size = HEADER.size + len(body)
+        seq = self._seq + 1
+        SEQ.pack_into(self._mm, SEQ_OFFSET, seq)
+        if size > len(self._mm):
+            self._grow(size)
+            SEQ.pack_into(self._mm, SEQ_OFFSET, seq)
+        self._mm[HEADER.size : size] = body
+        HEADER.pack_into(
+            self._mm,
+            0,
+            self._magic,
+            self._version,
+            0,
+            seq,
+            self.generation,
+            time.time(),
+            count,
+            len(body),
+        )
+        self._seq = seq + 1
+        SEQ.pack_into(self._mm, SEQ_OFFSET, self._seq)
+
+
+class SnapshotWriter(RegionWriter):
+    """Publish datasets into a shared memory file for a SnapshotAgent"""
+
+    def __init__(self, path, size=1 << 20):
+        super(SnapshotWriter, self).__init__(path, size=size)
+        self._order = None
+        self._offsets = None
+
+    def publish(self, data, changed=True):
+        """
+        Publish a dict of OID tuple => Entry, like DataSet._data, resolving
+        query-time values. Pass changed=False when the OIDs are the same as in
+        the previous call, to skip sorting them.
+        """
+        if changed or self._order is None:
+            self._order = sorted(data)
+            # Every OID is encoded again on every call
+            size_oid_cache(len(self._order))
+
+        offsets, varbinds = _encode(data, self._order)
+        if offsets != self._offsets:
+            self.generation += 1
+            self._offsets = offsets
+
+        self.write(offsets.tobytes() + varbinds, len(self._order))
+
+
+class Snapshot:
+    """
+    One published dataset, copied out of shared memory.
+
+    Served like a Table: GET and GETNEXT bisect the sorted OIDs and only the
+    varbind that is returned gets decoded.
+    """
+
+    def __init__(self, body, count, generation, timestamp, previous=None):
+        self.generation = generation
+        self.timestamp = timestamp
+        self._body = body
+        self._offsets = array("I")
+        self._offsets.frombytes(body[: 4 * (count + 1)])
+        self._base = 4 * (count + 1)
+        if previous is not None and previous.generation == generation:
+            # Same OIDs at the same offsets, only values changed
+            self.keys = previous.keys
+        else:
+            self.keys = [self._name(pos) for pos in range(count)]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def view(self):
+        """A snapshot doesn't change, walks keep reading it as it is"""
+        return self
+
+    def _name(self, pos):
+        start = self._base + self._offsets[pos] + 4
+        n_subid, prefix = struct.unpack_from("BB", self._body, start)
+        sub_ids = struct.unpack_from("!%dL" % n_subid, self._body, start + 4)
+        if prefix:
+            return (1, 3, 6, 1, prefix) + sub_ids
+        return sub_ids
+
+    def _entry(self, pos):
+        start = self._base + self._offsets[pos]
+        t = struct.unpack_from("!H", self._body, start)[0]
+        start += 8 + 4 * self._body[start + 4]
+        if t == agentx.TYPE_INTEGER:
+            value = struct.unpack_from("!l", self._body, start)[0]
+        elif t in (agentx.TYPE_COUNTER32, agentx.TYPE_GAUGE32, agentx.TYPE_TIMETICKS):
+            value = struct.unpack_from("!L", self._body, start)[0]
+        elif t == agentx.TYPE_COUNTER64:
+            value = struct.unpack_from("!Q", self._body, start)[0]
+        elif t == agentx.TYPE_OBJECTIDENTIFIER:
+            n_subid, prefix = struct.unpack_from("BB", self._body, start)
+            value = struct.unpack_from("!%dL" % n_subid, self._body, start + 4)
+            if prefix:
+                value = (1, 3, 6, 1, prefix) + value
+            value = oid_str(value)
+        elif t in (agentx.TYPE_IPADDRESS, agentx.TYPE_OPAQUE, agentx.TYPE_OCTETSTRING):
+            length = struct.unpack_from("!L", self._body, start)[0]
+            value = self._body[start + 4 : start + 4 + length].decode("utf-8", "replace")
+        else:
+            value = None
+        return {"name": self.keys[pos], "type": t, "value": value}
+
+    def get(self, oid):
+        """Return the entry for an OID tuple, or None"""
+        pos = bisect_left(self.keys, oid)
+        if pos < len(self.keys) and self.keys[pos] == oid:
+            return self._entry(pos)
+        return None
+
+    def get_next(self, oid, include=False):
+        """Return the first entry after (or at, with include) an OID tuple"""
+        if include:
+            pos = bisect_left(self.keys, oid)
+        else:
+            pos = bisect_right(self.keys, oid)
+        if pos < len(self.keys):
+            return self._entry(pos)
+        return None
+
+
+class RegionReader:
+    """Map a RegionWriter's file read-only and copy out new bodies"""
+
+    def __init__(self, path, magic=MAGIC, version=VERSION, retries=100):
+        self.path = path
+        self._magic = magic
+        self._version = version
+        self._retries = retries
+        self._fd = None
+        self._mm = None
+        self._seq = None
+
+    def _map(self):
+        if self._fd is None:
+            try:
+                self._fd = os.open(self.path, os.O_RDONLY)
+            except OSError:
+                return False
+        size = os.fstat(self._fd).st_size
+        if self._mm is None or len(self._mm) != size:
+            if self._mm is not None:
+                self._mm.close()
+            self._mm = mmap.mmap(self._fd, size, access=mmap.ACCESS_READ)
+        return True
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def read(self):
+        """
+        Return (body, count, generation, timestamp) for a newly written body,
+        or None if there is nothing new (or nothing at all)
+        """
+        for attempt in range(self._retries):
+            if not self._map():
+                return None
+            seq = SEQ.unpack_from(self._mm, SEQ_OFFSET)[0]
+            if seq == self._seq:
+                return None
+            if seq & 1:
+                time.sleep(0.0001)
+                continue
+
+            magic, version, _, _, generation, timestamp, count, length = (
+                HEADER.unpack_from(self._mm, 0)
+            )
+            if magic != self._magic or version != self._version:
+                return None
+            if HEADER.size + length > len(self._mm):
+                # Grown since it was mapped
+                continue
+            body = self._mm[HEADER.size : HEADER.size + length]
+            if SEQ.unpack_from(self._mm, SEQ_OFFSET)[0] != seq:
+                continue
+
+            self._seq = seq
+            return body, count, generation, timestamp
+
+        raise SnapshotError("No consistent snapshot in %s" % self.path)
+
+
+class SnapshotReader(RegionReader):
+    """Copy out the datasets a SnapshotWriter publishes"""
+
+    def __init__(self, path, retries=100):
+        super(SnapshotReader, self).__init__(path, retries=retries)
+        self.snapshot = None
+
+    def read(self):
+        """Return a new Snapshot, or None if nothing new was published"""
+        region = super(SnapshotReader, self).read()
+        if region is None:
+            return None
+        self.snapshot = Snapshot(*region, previous=self.snapshot)
+        return self.snapshot
+
+
+class SnapshotAgent(Agent):
+    """
+    Serve the datasets another process publishes with Agent.publish().
+
+    The other process does all the collection work, so serving latency here
+    doesn't depend on it.
+    """
+
+    def __init__(self, path, oid_list, max_age=60.0, period=0.5, **kwargs):
+        super(SnapshotAgent, self).__init__(period=period, **kwargs)
+        self._reader = SnapshotReader(path)
+        self._snapshot_oids = oid_list
+        self._stale_after = max_age
+
+    def setup(self):
+        self.register(self._snapshot_oids)
+        return True
+
+    def update(self):
+        try:
+            snapshot = self._reader.read()
+        except SnapshotError as e:
+            self.logger.warning("%s" % e)
+            return False
+        if snapshot is not None:
+            self._net.set_snapshot(snapshot)
+        elif self._reader.snapshot is None:
+            self.logger.debug("No snapshot in %s yet" % self._reader.path)
+        return True
+
+    def _replace_warm(self):
+        # The warm start dataset is served until the first snapshot is,
+        # which update() has then put in its place
+        if self._reader.snapshot is not None:
+            self.logger.info("Replacing the warm start dataset with a snapshot")
+            self._warm = None
+
+    def _state(self):
+        return self._reader.snapshot
+
+    def data_time(self):
+        if self._reader.snapshot is None:
+            return self._warm.timestamp if self._warm is not None else 0
+        return self._reader.snapshot.timestamp
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (
+    absolute_import,
+    division,
+    print_function,
+)
+
+from bisect import bisect_left, bisect_right
+from agentx.dataset import type_code
+from agentx.oid import oid_tuple
+
+
+class TableError(Exception):
+    pass
+
+
+class _Layout(object):
+    """
+    The rows and columns of a Table. A Table replaces its layout as a whole
+    instead of changing it, set_value() aside, so that whoever read it sees
+    one consistent table.
+    """
+
+    __slots__ = ("rows", "pos", "columns", "colidx")
+
+    def __init__(self, rows, pos, columns, colidx):
+        self.rows = rows  # Sorted row indexes
+        self.pos = pos  # row index => position in the column values
+        self.columns = columns  # column sub-id => (type, values)
+        self.colidx = colidx  # Sorted column sub-ids
+
+
+class Table:
+    """
+    A conceptual table (e.g. ifEntry) stored by column.
+
+    Instances are entry_oid.column.row, with a single integer row index. Rows
+    are kept as one sorted list and every column holds one value per row, so
+    GET is a row lookup and GETNEXT is computed from the row and column
+    positions instead of walking a sorted list of OIDs.
+    """
+
+    def __init__(self, oid, rows=()):
+        self.oid = oid_tuple(oid)
+        self._plen = len(self.oid)
+        self._layout = _Layout([], {}, {}, [])
+        self.set_rows(rows)
+
+    def __len__(self):
+        layout = self._layout
+        return len(layout.rows) * len(layout.colidx)
+
+    @property
+    def rows(self):
+        return self._layout.rows
+
+    def set_rows(self, rows):
+        """
+        Replace the row indexes. Rows are given in the order of the column
+        values, which needn't be sorted; a None row leaves that position out
+        of the table. Column values are kept by row, see replace().
+        """
+        self.replace(rows)
+
+    def replace(self, rows, columns=None):
+        """
+        Replace the row indexes and the values of some columns at once, rows
+        as for set_rows() and columns a dict of column => values ordered like
+        them. The other columns keep their values by row, 0 for new rows.
+
+        Readers see the table as it was before or after, never new rows with
+        old values.
+        """
+        old = self._layout
+        columns = columns or {}
+        pos = {row: i for i, row in enumerate(rows) if row is not None}
+        table_columns = {}
+        for column, (t, values) in old.columns.items():
+            if column in columns:
+                values = columns[column]
+            elif not callable(values) and pos != old.pos:
+                values = [
+                    values[old.pos[row]] if row in old.pos else 0 for row in rows
+                ]
+            table_columns[column] = (t, values)
+        for column in columns:
+            if column not in table_columns:
+                raise TableError("Unknown column %d in table %s" % (column, self.oid))
+        self._layout = _Layout(sorted(pos), pos, table_columns, old.colidx)
+
+    def add_column(self, column, oid_type, values=None):
+        """
+        Add a column. values is a list ordered like the rows given to
+        set_rows(), or a callable that returns such a list when the column is
+        read (for query-time values).
+        """
+        old = self._layout
+        if values is None:
+            values = [0] * (max(old.pos.values()) + 1 if old.pos else 0)
+        columns = dict(old.columns)
+        columns[column] = (type_code(oid_type), values)
+        colidx = list(old.colidx)
+        if column not in colidx:
+            colidx.insert(bisect_left(colidx, column), column)
+        self._layout = _Layout(old.rows, old.pos, columns, colidx)
+
+    def set_column(self, column, values):
+        """Replace all values of a column, ordered like the rows given to set_rows()"""
+        old = self._layout
+        if column not in old.columns:
+            raise TableError("Unknown column %d in table %s" % (column, self.oid))
+        columns = dict(old.columns)
+        columns[column] = (old.columns[column][0], values)
+        self._layout = _Layout(old.rows, old.pos, columns, old.colidx)
+
+    def set_value(self, column, row, value):
+        """Overwrite the value of one row in a column, in place"""
+        layout = self._layout
+        pos = layout.pos.get(row)
+        if pos is None:
+            return False
+        values = layout.columns[column][1]
+        if callable(values):
+            raise TableError("Column %d in table %s is computed" % (column, self.oid))
+        values[pos] = value
+        return True
+
+    def column(self, column):
+        values = self._layout.columns[column][1]
+        if callable(values):
+            values = values()
+        return values
+
+    def view(self):
+        """
+        The table as it is now, for a walk to keep reading while the table
+        is updated. Only set_value() and query-time columns show through.
+        """
+        view = Table.__new__(Table)
+        view.oid = self.oid
+        view._plen = self._plen
+        view._layout = self._layout
+        return view
+
+    def _entry(self, layout, column, row):
+        pos = layout.pos.get(row)
+        if pos is None:
+            return None
+        t, values = layout.columns[column]
+        if callable(values):
+            values = values()
+        if pos >= len(values):
+            return None
+        return {"name": self.oid + (column, row), "type": t, "value": values[pos]}
+
+    def get(self, oid):
+        """Return the entry for an instance OID tuple, or None"""
+        if len(oid) != self._plen + 2 or oid[: self._plen] != self.oid:
+            return None
+        layout = self._layout
+        column, row = oid[self._plen :]
+        if column not in layout.columns:
+            return None
+        return self._entry(layout, column, row)
+
+    def get_many(self, oids):
+        """
+        Return the entries for several instance OID tuples, None for those
+        not in the table. Every column is read once, however many of its
+        rows are asked for.
+        """
+        layout = self._layout
+        entries = [None] * len(oids)
+        columns = {}  # column => values, read so far
+        for i, oid in enumerate(oids):
+            if len(oid) != self._plen + 2 or oid[: self._plen] != self.oid:
+                continue
+            column, row = oid[self._plen :]
+            pos = layout.pos.get(row)
+            if pos is None or column not in layout.columns:
+                continue
+            t, values = layout.columns[column]
+            if column in columns:
+                values = columns[column]
+            elif callable(values):
+                values = columns[column] = values()
+            if pos < len(values):
+                entries[i] = {"name": oid, "type": t, "value": values[pos]}
+        return entries
+
+    def get_next(self, oid, include=False):
+        """Return the first entry after (or at, with include) an OID tuple"""
+        layout = self._layout
+        rows = layout.rows
+        colidx = layout.colidx
+        if not rows or not colidx:
+            return None
+        prefix = oid[: self._plen]
+        if prefix > self.oid:
+            return None
+        if prefix < self.oid or len(oid) == self._plen:
+            return self._first(layout, 0, 0)
+
+        column = oid[self._plen]
+        ci = bisect_left(colidx, column)
+        pos = 0
+        if ci < len(colidx) and colidx[ci] == column and len(oid) > self._plen + 1:
+            row = oid[self._plen + 1]
+            if include and len(oid) == self._plen + 2:
+                pos = bisect_left(rows, row)
+            else:
+                pos = bisect_right(rows, row)
+        return self._first(layout, ci, pos)
+
+    def _first(self, layout, ci, pos):
+        """
+        The first entry from the pos-th row of the ci-th column on, skipping
+        rows a query-time column returned no value for
+        """
+        rows = layout.rows
+        for column in layout.colidx[ci:]:
+            t, values = layout.columns[column]
+            if callable(values):
+                values = values()
+            for pos in range(pos, len(rows)):
+                row = rows[pos]
+                i = layout.pos[row]
+                if i < len(values):
+                    name = self.oid + (column, row)
+                    return {"name": name, "type": t, "value": values[i]}
+            pos = 0
+        return None
+
+    def items(self):
+        """Yield all entries in OID order"""
+        layout = self._layout
+        for column in layout.colidx:
+            for row in layout.rows:
+                entry = self._entry(layout, column, row)
+                if entry:
+                    yield entry
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Benchmark building and serving a large DataSet, without VPP or snmpd
+
+Builds an ifTable/ifXTable-like dataset of 100k OIDs the way the agents
+do (DataSet.set() per OID), hands it to the network as Agent does, and
+reports build time, memory and the time of GET/GETNEXT lookups. The
+"ordered" lines build it column by column, in OID order, like the
+integrated agent's builders, the "layers" line serves it from a metadata
+and a counter layer, and the "arena" lines serve it from an Arena.
+The "walk" lines time a walk of ifXTable, one GETNEXT at a time.
+
+    python3 bench_dataset.py [--interfaces 2700] [--rounds 3]
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+import agentx
+import agentx.dataset
+from agentx.network import Network
+from agentx.pdu import PDU
+
+IF_ENTRY = "1.3.6.1.2.1.2.2.1"
+IFX_ENTRY = "1.3.6.1.2.1.31.1.1.1"
+IFX_PREFIX = tuple(int(i) for i in IFX_ENTRY.split("."))
+
+# The columns snmp_agent_v2.py serves per interface
+COLUMNS = (
+    [(IF_ENTRY, c, "int") for c in (1, 3, 4, 7, 8)]
+    + [(IF_ENTRY, c, "str") for c in (2, 6)]
+    + [(IF_ENTRY, 5, "gauge32"), (IF_ENTRY, 9, "ticks")]
+    + [(IF_ENTRY, c, "u32") for c in (10, 11, 12, 13, 14, 16, 17, 18, 19, 20)]
+    + [(IFX_ENTRY, c, "u32") for c in (2, 3, 4, 5)]
+    + [(IFX_ENTRY, c, "u64") for c in range(6, 14)]
+    + [(IFX_ENTRY, 1, "str"), (IFX_ENTRY, 18, "str")]
+    + [(IFX_ENTRY, c, "int") for c in (16, 17)]
+    + [(IFX_ENTRY, 15, "gauge32"), (IFX_ENTRY, 19, "ticks")]
+)
+
+
+def value(oid_type, idx, column):
+    if oid_type == "str":
+        return f"GigabitEthernet{idx}/0/{column}"
+    return idx * column
+
+
+def decoded(oid):
+    """An OID as Network gets it from a request PDU"""
+    pdu = PDU()
+    pdu.decode_buf = pdu.encode_oid(oid)
+    return pdu.decode_oid()[0]
+
+
+def build(interfaces):
+    ds = agentx.DataSet()
+    for idx in range(1000, 1000 + interfaces):
+        for entry, column, oid_type in COLUMNS:
+            ds.set(f"{entry}.{column}.{idx}", oid_type, value(oid_type, idx, column))
+    return ds
+
+
+def build_ordered(interfaces):
+    ds = agentx.DataSet()
+    ds.extend(
+        (f"{entry}.{column}.{idx}", oid_type, value(oid_type, idx, column))
+        for entry, column, oid_type in sorted(COLUMNS)
+        for idx in range(1000, 1000 + interfaces)
+    )
+    return ds
+
+
+class Loopback(object):
+    """Socket handing Network.run() one request over and over"""
+
+    def __init__(self, request):
+        self.request = request
+        self.sent = None
+
+    def recv(self, size):
+        return self.request
+
+    def send(self, buf):
+        self.sent = buf
+        return len(buf)
+
+    def settimeout(self, timeout):
+        pass
+
+
+def get_request(oids):
+    """A GET PDU for OIDs, as the master agent sends it"""
+    pdu = PDU()
+    payload = b"".join(pdu.encode_oid(oid) + pdu.encode_oid(()) for oid in oids)
+    return pdu.encode_header(agentx.AGENTX_GET_PDU, len(payload)) + payload
+
+
+def best(rounds, func, *args):
+    times = []
+    result = None
+    for _ in range(rounds):
+        result = None
+        gc.collect()
+        t = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - t)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--interfaces", type=int, default=2700)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    n_oids = args.interfaces * len(COLUMNS)
+    print(f"{args.interfaces} interfaces, {n_oids} OIDs, best of {args.rounds}")
+
+    build_time, ds = best(args.rounds, build, args.interfaces)
+    print(f"build      {build_time * 1000:8.1f} ms  {build_time * 1e9 / n_oids:6.0f} ns/OID")
+
+    # Same again, in place, like a refresh of an unchanged interface set
+    def rebuild():
+        for idx in range(1000, 1000 + args.interfaces):
+            for entry, column, oid_type in COLUMNS:
+                ds.set(f"{entry}.{column}.{idx}", oid_type, idx)
+
+    rebuild_time, _ = best(args.rounds, rebuild)
+    print(f"rebuild    {rebuild_time * 1000:8.1f} ms  {rebuild_time * 1e9 / n_oids:6.0f} ns/OID")
+
+    net = Network()
+
+    def serve():
+        net.update(ds._data)
+
+    serve_time, _ = best(args.rounds, serve)
+    print(f"serve      {serve_time * 1000:8.1f} ms  {serve_time * 1e9 / n_oids:6.0f} ns/OID")
+
+    ordered_time, ordered = best(args.rounds, build_ordered, args.interfaces)
+    print(f"ordered    {ordered_time * 1000:8.1f} ms  {ordered_time * 1e9 / n_oids:6.0f} ns/OID")
+
+    def serve_ordered():
+        net.update(ordered._data, getattr(ordered, "_ordered", False))
+
+    serve_time, _ = best(args.rounds, serve_ordered)
+    print(f"serve ord. {serve_time * 1000:8.1f} ms  {serve_time * 1e9 / n_oids:6.0f} ns/OID")
+
+    # The same split in a metadata and a counter layer, whose ifXTable
+    # columns interleave, merged and served like the integrated agent's
+    static = agentx.DataSet()
+    counters = agentx.DataSet()
+    for entry, column, oid_type in sorted(COLUMNS):
+        layer = counters if oid_type in ("u32", "u64") else static
+        layer.extend(
+            (f"{entry}.{column}.{idx}", oid_type, value(oid_type, idx, column))
+            for idx in range(1000, 1000 + args.interfaces)
+        )
+
+    def serve_layers():
+        data, keys = agentx.dataset.merged([static, counters])
+        net.update(data, keys)
+
+    serve_time, _ = best(args.rounds, serve_layers)
+    print(f"layers     {serve_time * 1000:8.1f} ms  {serve_time * 1e9 / n_oids:6.0f} ns/OID")
+
+    oids = [
+        decoded(f"{IF_ENTRY}.10.{idx}")
+        for idx in range(1000, 1000 + args.interfaces, 7)
+    ]
+    get_time, _ = best(args.rounds, lambda: [net._get(oid) for oid in oids])
+    print(f"GET        {get_time * 1e9 / len(oids):8.0f} ns/OID")
+    next_time, _ = best(
+        args.rounds, lambda: [net._get_next(oid, ()) for oid in oids]
+    )
+    print(f"GETNEXT    {next_time * 1e9 / len(oids):8.0f} ns/OID")
+
+    # A walk of ifXTable as snmpwalk does it, every GETNEXT asking for the
+    # OID after the one it was given last, its response encoded. "cold" is
+    # the same walk without the positions the network keeps for walks.
+    ifx = sorted(key for key in ordered._data if key[: len(IFX_PREFIX)] == IFX_PREFIX)
+    requests = [decoded(IFX_ENTRY)] + [decoded(key) for key in ifx[:-1]]
+    end = decoded("1.3.6.1.2.1.31.1.1.2")
+
+    def walk(cold=False):
+        walks = getattr(net, "_walks", {})
+        pdu = PDU(agentx.AGENTX_RESPONSE_PDU)
+        for oid in requests:
+            if cold:
+                walks.clear()
+            pdu.values = [net._get_next(oid, end)]
+            pdu.encode()
+
+    walk_time, _ = best(args.rounds, walk)
+    print(f"walk       {walk_time * 1e9 / len(requests):8.0f} ns/GETNEXT")
+    walk_time, _ = best(args.rounds, walk, True)
+    print(f"walk cold  {walk_time * 1e9 / len(requests):8.0f} ns/GETNEXT")
+
+    entries = [net._get(oid) for oid in oids]
+
+    def encode():
+        pdu = PDU(agentx.AGENTX_RESPONSE_PDU)
+        pdu.values = entries
+        return pdu.encode()
+
+    encode_time, _ = best(args.rounds, encode)
+    print(f"encode     {encode_time * 1e9 / len(entries):8.0f} ns/varbind")
+
+    # A whole GET, from receiving the request to sending the response,
+    # asking for the counters of a few interfaces
+    net._connected = True
+    net._timeout = 0.1
+    counters = [f"{entry}.{column}" for entry, column, oid_type in COLUMNS if oid_type[0] == "u"]
+    for count in (1, 10, 20, 40, 60):
+        request = get_request(
+            [f"{counters[i % len(counters)]}.{1000 + i // len(counters)}" for i in range(count)]
+        )
+        net.socket = Loopback(request)
+        get_time, _ = best(args.rounds, lambda: [net.run() for _ in range(100)])
+        print(f"GET x{count:<3d}   {get_time * 1e6 / 100:8.1f} us")
+
+    arena = Network(arena=True)
+
+    def serve_arena():
+        arena.update(ordered._data, True)
+
+    arena_time, _ = best(args.rounds, serve_arena)
+    print(f"arena      {arena_time * 1000:8.1f} ms  {arena_time * 1e9 / n_oids:6.0f} ns/OID")
+
+    def refresh_arena():
+        arena.update(ordered._data, True, changed=False)
+
+    refresh_time, _ = best(args.rounds, refresh_arena)
+    print(f"arena same {refresh_time * 1000:8.1f} ms  {refresh_time * 1e9 / n_oids:6.0f} ns/OID")
+    get_time, _ = best(args.rounds, lambda: [arena._get(oid) for oid in oids])
+    print(f"arena GET  {get_time * 1e9 / len(oids):8.0f} ns/OID")
+    next_time, _ = best(
+        args.rounds, lambda: [arena._get_next(oid, ()) for oid in oids]
+    )
+    print(f"arena NEXT {next_time * 1e9 / len(oids):8.0f} ns/OID")
+    nbytes = arena.arena.nbytes()
+    print(f"arena      {nbytes / 2 ** 20:8.1f} MiB  {nbytes / n_oids:6.0f} B/OID")
+
+    ds = None
+    net = None
+    ordered = None
+    arena = None
+    if hasattr(agentx.dataset, "_oids"):
+        # Count the interned OIDs too
+        agentx.dataset._oids.clear()
+    gc.collect()
+    tracemalloc.start()
+    ds = build(args.interfaces)
+    built = tracemalloc.get_traced_memory()[0]
+    net = Network()
+    net.update(ds._data)
+    served = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"dataset    {built / 2 ** 20:8.1f} MiB  {built / n_oids:6.0f} B/OID")
+    print(f"+ serving  {served / 2 ** 20:8.1f} MiB  {served / n_oids:6.0f} B/OID")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,23 @@
 """
 Debug script to identify available stats paths in VPP 25.06
 Run this to see what stats are available and help diagnose the issue
+
+Reads the agent's interface snapshot when there is one, pass --live to
+query the VPP stats segment instead.
 """
 
-from vppstats import VPPStats
+from vppsnapshot import SnapshotStats, open_stats
 import sys
 
 def debug_stats():
     try:
-        print("🔍 Connecting to VPP Stats Segment...")
-        stats = VPPStats(socketname="/run/vpp/stats.sock", timeout=5)
-        stats.connect()
-        print("✅ Connected successfully\n")
+        live = "--live" in sys.argv
+        print("🔍 Opening VPP Stats...")
+        stats = open_stats(live=live)
+        if isinstance(stats, SnapshotStats):
+            print(f"✅ Reading agent snapshot {stats.path} ({stats.snapshot.age:.1f}s old, --live to query VPP)\n")
+        else:
+            print("✅ Connected successfully\n")
         
         # Get interface names
         print("=" * 80)
@@ -2,11 +2,14 @@
 """
 Debug script to list all available stats paths in VPP
 Helps identify which paths are available in current VPP version
+
+Reads the agent's interface snapshot when there is one, pass --live to
+query the VPP stats segment instead.
 """
 
 import sys
 import logging
-from vppstats import VPPStats
+from vppsnapshot import SnapshotStats, open_stats
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -17,10 +20,13 @@ def main():
     print("="*80 + "\n")
     
     try:
-        stats = VPPStats(socketname="/run/vpp/stats.sock", timeout=5)
-        print(f"[*] Connecting to VPP stats segment...")
-        stats.connect()
-        print(f"[✓] Connected successfully")
+        live = "--live" in sys.argv
+        print(f"[*] Opening VPP stats...")
+        stats = open_stats(live=live)
+        if isinstance(stats, SnapshotStats):
+            print(f"[✓] Reading agent snapshot {stats.path} ({stats.snapshot.age:.1f}s old, --live to query VPP)")
+        else:
+            print(f"[✓] Connected successfully")
         print(f"[*] Stats version: {stats.version}")
         print(f"[*] Epoch: {stats.epoch}")
         
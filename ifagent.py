@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Interface serving shared by the VPPDataCollector agents
+
+snmp_agent_v2.py and snmp_agent_integrated.py both serve ifTable and ifXTable
+from what a VPPDataCollector polls. CollectorAgentMixin holds what they do
+alike around it: refreshing on demand when requests arrive, and applying
+interface events to the served status in place. add_arguments() adds their
+common command line options.
+"""
+
+from ifalerts import ErrorAlerts
+from ifindex import DEFAULT_PATH as IFINDEX_PATH, MODES as IFINDEX_MODES
+from ifstatus import InterfaceStatus, LinkNotifier
+from vppsnapshot import DEFAULT_PATH as SNAPSHOT_PATH
+
+STATE_PATH = "/run/vpp-snmp-agent/dataset.state"
+
+# Columns overwritten in place on interface events: ifAdminStatus,
+# ifOperStatus and ifLastChange
+STATUS_COLUMNS = [
+    ("1.3.6.1.2.1.2.2.1.7", "int"),
+    ("1.3.6.1.2.1.2.2.1.8", "int"),
+    ("1.3.6.1.2.1.2.2.1.9", "ticks"),
+]
+
+
+def column_entries(columns, records):
+    """
+    Yield (oid, oid_type, value) of every column for records sorted by
+    ifIndex, column by column: in OID order
+    """
+    for prefix, oid_type, key in columns:
+        for record in records:
+            yield f"{prefix}.{record['index']}", oid_type, record[key]
+
+
+class CollectorAgentMixin:
+    """
+    For the agentx.Agent subclasses serving self.collector, a VPPDataCollector.
+    Call setup_interfaces() once both self.collector and self.config are set.
+    """
+
+    def setup_interfaces(self):
+        """Hook interface events and notifications up to the collector"""
+        # Interface events update the served status right away
+        self.ifstatus = InterfaceStatus(self.sysuptime)
+        self.ifstatus.listeners.append(self.status_changed)
+        self._status_slots = None  # (ColumnSlots, interface name => position)
+        self._ifrows = {}  # interface name => ifIndex
+        self.collector.on_interface_event = self.interface_event
+        self.collector.on_api_connect = self.ifstatus.reconnected
+
+        # linkUp/linkDown notifications, see snmp.traps in the config
+        self.linktraps = None
+        traps = ((self.config or {}).get("snmp") or {}).get("traps") or {}
+        if traps.get("enabled"):
+            self.limit_notifications(traps.get("rate", 1), traps.get("burst", 10))
+            self.linktraps = LinkNotifier(self.notify, self.ifrow, traps)
+            self.ifstatus.listeners.append(self.linktraps.changed)
+            self.collector.alerts = ErrorAlerts(self.notify, self.ifrow, traps)
+
+    def request_received(self):
+        """Resume polling on demand, refreshing the dataset if it was idle"""
+        # This holds up the request, and snmpd gives up on it after its own
+        # AgentX timeout: wait no longer than a refresh may take, and serve
+        # what there is if the collection doesn't make it
+        if self.collector.touch(deadline=self._deadline or 0):
+            self._update()
+
+    def ifrow(self, name):
+        """ifIndex of an interface, None if it isn't served"""
+        return self._ifrows.get(name)
+
+    def interface_event(self, event):
+        """Apply a sw_interface_event, in the VPP API event thread"""
+        self.ifstatus.event(event.sw_if_index, event.flags, event.deleted)
+
+    def status_changed(self, name, status, previous):
+        """Overwrite the served status of an interface without waiting for a rebuild"""
+        if self._status_slots is None:
+            return
+        slots, positions = self._status_slots
+        pos = positions.get(name)
+        if pos is None:
+            return
+        slots.set_value(0, pos, status[0])
+        slots.set_value(1, pos, status[1])
+        slots.set_value(2, pos, self.ifstatus.last_change(name))
+
+    def add_status_columns(self, ds, names, rows, values, events):
+        """
+        Add STATUS_COLUMNS to ds as slots for status_changed() to overwrite.
+
+        Args:
+            names: Interface names, rows: their ifIndex or None if not served
+            values: (admin, oper, last change) lists of the interfaces served
+            events: ifstatus.events when values were read
+        """
+        present = [(name, row) for name, row in zip(names, rows) if row is not None]
+        slots = ds.columns(STATUS_COLUMNS, [row for _, row in present])
+        for column, column_values in enumerate(values):
+            slots.set_column(column, column_values)
+        self._status_slots = (slots, {name: pos for pos, (name, _) in enumerate(present)})
+        self._ifrows = dict(present)
+        if self.ifstatus.events != events:
+            # Events arrived meanwhile, don't let them be overwritten
+            for name, _ in present:
+                self.status_changed(name, self.ifstatus.status(name) or (2, 2), None)
+
+
+def add_arguments(parser):
+    """Add the command line options of both agents to an ArgumentParser"""
+    parser.add_argument(
+        "-a", "--address",
+        type=str,
+        default="localhost:705",
+        help="SNMP AgentX address (default: localhost:705)"
+    )
+    parser.add_argument(
+        "-p", "--period",
+        type=int,
+        default=5,
+        help="Data polling period in seconds (default: 5)"
+    )
+    parser.add_argument(
+        "-t", "--timeout",
+        type=int,
+        default=5,
+        help="VPP API timeout in seconds (default: 5)"
+    )
+    parser.add_argument(
+        "-i", "--idle-timeout",
+        type=int,
+        default=0,
+        help="Suspend polling VPP after this many seconds without SNMP requests,\n"
+             "the next request refreshes within --timeout (default: 0, never)"
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=0.5,
+        help="Refresh deadline in seconds, after which the refresh continues in\n"
+             "the background while the previous data is served (default: 0.5)"
+    )
+    parser.add_argument(
+        "--snapshot-file",
+        type=str,
+        default=SNAPSHOT_PATH,
+        help="File to publish interface counters in for debug_stats.py and\n"
+             f"debug_stats_paths.py, empty to disable (default: {SNAPSHOT_PATH})"
+    )
+    parser.add_argument(
+        "--state-file",
+        type=str,
+        default=STATE_PATH,
+        help="File to save the served data in, and serve from while the first\n"
+             "collection after a restart is running, empty to disable\n"
+             f"(default: {STATE_PATH})"
+    )
+    parser.add_argument(
+        "--arena",
+        action="store_true",
+        help="Serve the dataset from one buffer of encoded varbinds instead of\n"
+             "an object per OID, for very large interface counts; interface\n"
+             "events then show in the served status from the next refresh"
+    )
+    parser.add_argument(
+        "--ifindex-mode",
+        choices=IFINDEX_MODES,
+        default="name",
+        help="Keep each interface name's ifIndex in --ifindex-file (name), or\n"
+             "use 1000 + sw_if_index (sw_if_index) (default: name)"
+    )
+    parser.add_argument(
+        "--ifindex-file",
+        type=str,
+        default=IFINDEX_PATH,
+        help="File keeping the interface name to ifIndex map, empty to keep it\n"
+             f"in memory only (default: {IFINDEX_PATH})"
+    )
+    parser.add_argument(
+        "-c", "--config",
+        type=str,
+        help="Configuration YAML file"
+    )
+    parser.add_argument(
+        "-d", "--debug",
+        action="store_true",
+        help="Enable debug logging"
+    )
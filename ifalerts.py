@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Interface error and drop alerts
+
+Instead of an NMS polling every interface's error counters, ErrorAlerts
+computes error and drop ratios from the counter deltas between two polls and
+sends a notification when one crosses its threshold, and another once it is
+back below its clear threshold.
+
+Every counter is read from the stats segment once per poll as a whole vector
+(one value per interface, summed over threads), and the ratios are computed
+column-wise over those vectors, so a poll costs a fixed six stats reads
+whatever the number of interfaces.
+"""
+
+import logging
+
+import agentx
+from agentx.agent import AGENT_OID
+
+# Counter vectors: (stats path, combined counter field)
+COUNTERS = {
+    "rx": ("/if/rx", "packets"),
+    "tx": ("/if/tx", "packets"),
+    "rx_errors": ("/if/rx-error", None),
+    "tx_errors": ("/if/tx-error", None),
+    "drops": ("/if/drops", None),
+    "rx_no_buf": ("/if/rx-no-buf", None),
+}
+
+# Notifications and their objects, in the agent's private subtree
+ALERTS = AGENT_OID + ".4"
+ALERT_RAISED = ALERTS + ".0.1"
+ALERT_CLEARED = ALERTS + ".0.2"
+ALERT_KIND = ALERTS + ".1.1"  # "errors" or "drops"
+ALERT_RATIO = ALERTS + ".1.2"  # parts per million
+ALERT_THRESHOLD = ALERTS + ".1.3"  # parts per million
+IF_INDEX = "1.3.6.1.2.1.2.2.1.1"
+
+
+class NullHandler(logging.Handler):
+    def emit(self, record):
+        pass
+
+
+logger = logging.getLogger("ifalerts")
+logger.addHandler(NullHandler())
+
+
+def _ppm(part, total):
+    return int(part * 1000000 / total) if total else 0
+
+
+class ErrorAlerts:
+    def __init__(self, notify, ifindex, config=None):
+        """
+        Args:
+            notify: Callable(trap_oid, varbinds), e.g. Agent.notify
+            ifindex: Callable returning an interface name's ifIndex, or None
+            config: The snmp.traps config block. Thresholds are in percent:
+                    error_threshold (rx+tx errors of all packets),
+                    drop_threshold (drops and rx-no-buf of received packets),
+                    error_clear and drop_clear (default half the threshold),
+                    and min_packets per poll for a ratio to count.
+        """
+        config = config or {}
+        self.notify = notify
+        self.ifindex = ifindex
+        error = config.get("error_threshold", 100)
+        drop = config.get("drop_threshold", error)
+        # kind => (raise at, clear below), as fractions of packets
+        self.thresholds = {
+            "errors": (error / 100.0, config.get("error_clear", error / 2.0) / 100.0),
+            "drops": (drop / 100.0, config.get("drop_clear", drop / 2.0) / 100.0),
+        }
+        self.min_packets = config.get("min_packets", 100)
+        self._names = None
+        self._previous = None
+        self.raised = set()  # (name, kind)
+
+    def _read(self, stats, n):
+        """Read every counter as one vector of n per-interface totals"""
+        vectors = {}
+        for key, (path, field) in COUNTERS.items():
+            if path not in stats.directory:
+                vectors[key] = [0] * n
+                continue
+            counter = stats[path]
+            if field == "packets":
+                values = counter.sum_packets_by_index()
+            else:
+                values = counter.sum_by_index()
+            values = values[:n]
+            values.extend([0] * (n - len(values)))
+            vectors[key] = values
+        return vectors
+
+    def poll(self, stats, names):
+        """
+        Compare the counters in a connected VPPStats with those of the
+        previous poll, names being the stats segment's /if/names
+        """
+        names = list(names)
+        vectors = self._read(stats, len(names))
+        previous = self._previous
+        if previous is not None and names != self._names:
+            # Interfaces changed, line up the previous poll by name
+            pos = {name: i for i, name in enumerate(self._names)}
+            previous = {
+                key: [values[pos[name]] if name in pos else None for name in names]
+                for key, values in previous.items()
+            }
+        self._names = names
+        self._previous = vectors
+        if previous is None:
+            return
+
+        delta = {}
+        for key, values in vectors.items():
+            delta[key] = [
+                None if p is None or c < p else c - p
+                for c, p in zip(values, previous[key])
+            ]
+        errors = [
+            None if None in t else t[0] + t[1]
+            for t in zip(delta["rx_errors"], delta["tx_errors"])
+        ]
+        error_totals = [
+            None if e is None or None in t else e + t[0] + t[1]
+            for e, t in zip(errors, zip(delta["rx"], delta["tx"]))
+        ]
+        drops = [
+            None if None in t else t[0] + t[1]
+            for t in zip(delta["drops"], delta["rx_no_buf"])
+        ]
+        drop_totals = [
+            None if d is None or r is None else d + r
+            for d, r in zip(drops, delta["rx"])
+        ]
+
+        self._check(names, "errors", errors, error_totals)
+        self._check(names, "drops", drops, drop_totals)
+        gone = {alert for alert in self.raised if alert[0] not in names}
+        self.raised -= gone
+
+    def _check(self, names, kind, parts, totals):
+        high, clear = self.thresholds[kind]
+        min_packets = self.min_packets
+        # Interfaces over the threshold, and the raised ones under the clear
+        # threshold, in one pass
+        raised = self.raised
+        crossed = [
+            i
+            for i, (part, total) in enumerate(zip(parts, totals))
+            if total is not None
+            and total >= min_packets
+            and (
+                part < clear * total
+                if (names[i], kind) in raised
+                else part >= high * total
+            )
+        ]
+        for i in crossed:
+            name = names[i]
+            ratio = _ppm(parts[i], totals[i])
+            if (name, kind) in self.raised:
+                self.raised.discard((name, kind))
+                logger.info(f"{name} {kind} back to {ratio / 10000:.2f}%")
+                self._send(ALERT_CLEARED, name, kind, ratio, clear)
+            else:
+                self.raised.add((name, kind))
+                logger.warning(f"{name} {kind} at {ratio / 10000:.2f}% of packets")
+                self._send(ALERT_RAISED, name, kind, ratio, high)
+
+    def _send(self, trap, name, kind, ratio, threshold):
+        idx = self.ifindex(name)
+        if idx is None:
+            return
+        self.notify(
+            trap,
+            [
+                {"name": f"{IF_INDEX}.{idx}", "type": agentx.TYPE_INTEGER, "value": idx},
+                {"name": f"{ALERT_KIND}.{idx}", "type": agentx.TYPE_OCTETSTRING, "value": kind},
+                {"name": f"{ALERT_RATIO}.{idx}", "type": agentx.TYPE_GAUGE32, "value": ratio},
+                {
+                    "name": f"{ALERT_THRESHOLD}.{idx}",
+                    "type": agentx.TYPE_GAUGE32,
+                    "value": int(threshold * 1000000),
+                },
+            ],
+        )
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stable ifIndex allocation
+
+Interfaces keep their ifIndex across restarts and interface churn, so an NMS
+only rediscovers interfaces that really changed. In "name" mode every
+interface name is given the next free index once and the mapping is kept in a
+small JSON file. Deleted interfaces are tombstoned: their index stays reserved
+and comes back if an interface with the same name is created again. In
+"sw_if_index" mode the index is derived from VPP's sw_if_index instead.
+"""
+
+import os
+import json
+import time
+import logging
+
+DEFAULT_PATH = "/var/lib/vpp-snmp-agent/ifindex.json"
+MODES = ("name", "sw_if_index")
+
+
+class NullHandler(logging.Handler):
+    def emit(self, record):
+        pass
+
+
+logger = logging.getLogger("ifindex")
+logger.addHandler(NullHandler())
+
+
+class IfIndexAllocator:
+    def __init__(self, path=DEFAULT_PATH, mode="name", base=1000, tombstone_ttl=90 * 86400):
+        """
+        Args:
+            path: JSON file keeping the name => ifIndex map, None to keep it in
+                  memory only
+            mode: "name" or "sw_if_index"
+            base: First ifIndex, and the offset added to sw_if_index
+            tombstone_ttl: Seconds a deleted interface keeps its ifIndex
+                           reserved (default 90 days)
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown ifIndex mode {mode}, expected one of {MODES}")
+        self.path = path
+        self.mode = mode
+        self.base = base
+        self.tombstone_ttl = tombstone_ttl
+        self._map = {}  # name => {"index": int, "deleted": None or timestamp}
+        self._next = base
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+            self._map = state["interfaces"]
+            self._next = max(state["next"], self.base)
+            logger.info(f"Loaded {len(self._map)} ifIndex entries from {self.path}")
+        except (IOError, OSError, ValueError, KeyError) as e:
+            logger.error(f"Could not read {self.path}: {e}, starting a new map")
+
+    def save(self):
+        if not self.path:
+            return
+        state = {"version": 1, "next": self._next, "interfaces": self._map}
+        tmp = f"{self.path}.tmp"
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump(state, f, indent=1, sort_keys=True)
+                # On disk before it replaces the map, or a crash could leave
+                # an empty one and every ifIndex would be renumbered
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except (IOError, OSError) as e:
+            logger.warning(f"Could not save {self.path}: {e}")
+
+    def assign(self, names, ifaces=None):
+        """
+        Return the ifIndex of every name, in the same order. Names that can't
+        be given one (duplicates, or no sw_if_index in that mode) get None.
+
+        Args:
+            names: Interface names, e.g. the stats segment's /if/names
+            ifaces: Interface details by name from VPPApi.get_ifaces(), needed
+                    in sw_if_index mode
+        """
+        if self.mode == "sw_if_index":
+            return self._by_sw_if_index(names, ifaces or {})
+
+        now = time.time()
+        changed = False
+        seen = set()
+        indexes = []
+        for name in names:
+            if not name or name in seen:
+                indexes.append(None)
+                continue
+            seen.add(name)
+            entry = self._map.get(name)
+            if entry is None:
+                entry = self._map[name] = {"index": self._next, "deleted": None}
+                self._next += 1
+                changed = True
+                logger.info(f"Allocated ifIndex {entry['index']} to {name}")
+            elif entry["deleted"] is not None:
+                entry["deleted"] = None
+                changed = True
+                logger.info(f"Restored ifIndex {entry['index']} of {name}")
+            indexes.append(entry["index"])
+
+        for name in list(self._map):
+            entry = self._map[name]
+            if name in seen:
+                continue
+            if entry["deleted"] is None:
+                entry["deleted"] = now
+                changed = True
+                logger.info(f"Tombstoned ifIndex {entry['index']} of deleted {name}")
+            elif now - entry["deleted"] > self.tombstone_ttl:
+                del self._map[name]
+                changed = True
+
+        if changed:
+            self.save()
+        return indexes
+
+    def _by_sw_if_index(self, names, ifaces):
+        seen = set()
+        indexes = []
+        for name in names:
+            iface = ifaces.get(name)
+            if iface is None or iface.sw_if_index in seen:
+                logger.debug(f"No sw_if_index for {name}, leaving it out")
+                indexes.append(None)
+                continue
+            seen.add(iface.sw_if_index)
+            indexes.append(self.base + iface.sw_if_index)
+        return indexes
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Event-driven interface status
+
+VPP sends a sw_interface_event whenever an interface goes up or down. Instead
+of waiting for the next poll, InterfaceStatus applies those events as they
+arrive and tells its listeners, which overwrite the served ifAdminStatus and
+ifOperStatus values in place. It also keeps the sysUpTime at which every
+interface entered its current state (ifLastChange) and at which its counters
+last started over (ifCounterDiscontinuityTime).
+
+The interface dumps of the periodic metadata rebuild are passed to sync(),
+which learns new interfaces and catches up on changes no event was seen for,
+e.g. while the API connection was down.
+
+LinkNotifier is a listener sending linkUp/linkDown notifications for those
+changes, damping interfaces that flap.
+"""
+
+import time
+import threading
+import logging
+
+import agentx
+
+# sw_interface_event and sw_interface_details flags
+ADMIN_UP = 1
+LINK_UP = 2
+
+# IF-MIB ifAdminStatus and ifOperStatus values
+UP = 1
+DOWN = 2
+
+# IF-MIB notifications and their objects
+LINK_DOWN_TRAP = "1.3.6.1.6.3.1.1.5.3"
+LINK_UP_TRAP = "1.3.6.1.6.3.1.1.5.4"
+IF_INDEX = "1.3.6.1.2.1.2.2.1.1"
+IF_ADMIN_STATUS = "1.3.6.1.2.1.2.2.1.7"
+IF_OPER_STATUS = "1.3.6.1.2.1.2.2.1.8"
+
+# Flap damping penalty added for every link change
+PENALTY = 1000
+
+
+class NullHandler(logging.Handler):
+    def emit(self, record):
+        pass
+
+
+logger = logging.getLogger("ifstatus")
+logger.addHandler(NullHandler())
+
+
+def flags_status(flags):
+    """Return (ifAdminStatus, ifOperStatus) for VPP interface flags"""
+    flags = int(flags)
+    return (UP if flags & ADMIN_UP else DOWN, UP if flags & LINK_UP else DOWN)
+
+
+class InterfaceStatus:
+    def __init__(self, uptime):
+        """
+        Args:
+            uptime: Callable returning the current sysUpTime in ticks
+        """
+        self.uptime = uptime
+        # Called with (name, status, previous status) after every change,
+        # from the thread that noticed it
+        self.listeners = []
+        self._lock = threading.Lock()
+        self._names = {}  # sw_if_index => name
+        self._sw_if_index = {}  # name => sw_if_index
+        self._status = {}  # name => (admin, oper)
+        self._last_change = {}  # name => ticks
+        self._discontinuity = {}  # name => ticks
+        self._evented = set()  # names with an event since the last dump
+        self._instance = None
+        self._synced = False
+        self.events = 0
+
+    def status(self, name):
+        """Return (ifAdminStatus, ifOperStatus), or None for an unknown interface"""
+        return self._status.get(name)
+
+    def last_change(self, name):
+        """ifLastChange in ticks, 0 if unchanged since the agent started"""
+        return self._last_change.get(name, 0)
+
+    def discontinuity(self, name):
+        """ifCounterDiscontinuityTime in ticks, 0 if none since the agent started"""
+        return self._discontinuity.get(name, 0)
+
+    def sync(self, names, ifaces, instance=None):
+        """
+        Catch up with an interface dump.
+
+        Args:
+            names: Interface names, e.g. the stats segment's /if/names
+            ifaces: Interface details by name from VPPApi.get_ifaces()
+            instance: Identifies the running VPP, e.g. VPPStats.socket_id; a
+                      new one means all counters started over
+        """
+        changes = []
+        with self._lock:
+            now = self.uptime()
+            first = not self._synced
+            self._synced = True
+            restarted = (
+                instance is not None
+                and self._instance is not None
+                and instance != self._instance
+            )
+            self._instance = instance
+            if restarted:
+                # Events from before the restart say nothing about now
+                self._evented.clear()
+
+            self._names = {}
+            for name in names:
+                iface = ifaces.get(name)
+                if iface is None:
+                    continue
+                self._names[iface.sw_if_index] = name
+                status = flags_status(iface.flags)
+                previous = self._status.get(name)
+
+                if not first and (
+                    restarted or self._sw_if_index.get(name) != iface.sw_if_index
+                ):
+                    # Created, or recreated: its counters started over
+                    self._discontinuity[name] = now
+                self._sw_if_index[name] = iface.sw_if_index
+
+                if name in self._evented:
+                    # The first dump after an event may have been taken
+                    # before it: keep what the event said. The next dump
+                    # was taken after this one and wins.
+                    self._evented.discard(name)
+                    if status != previous:
+                        continue
+                if status == previous:
+                    continue
+                self._status[name] = status
+                if not first:
+                    self._last_change[name] = now
+                if previous is not None:
+                    changes.append((name, status, previous))
+
+            present = set(self._names.values())
+            for table in (
+                self._status,
+                self._sw_if_index,
+                self._last_change,
+                self._discontinuity,
+            ):
+                for name in [name for name in table if name not in present]:
+                    del table[name]
+            self._evented &= present
+
+        for change in changes:
+            logger.info(f"Interface {change[0]} status changed to {change[1]}, without an event")
+            self._notify(*change)
+
+    def reconnected(self):
+        """
+        The API connection events arrive on was (re)established: events may
+        have been missed meanwhile, so the next dump wins.
+        """
+        with self._lock:
+            self._evented.clear()
+
+    def event(self, sw_if_index, flags, deleted=False):
+        """
+        Apply a sw_interface_event. Returns True if the status changed.
+
+        Runs in the VPP API event thread.
+        """
+        with self._lock:
+            self.events += 1
+            name = self._names.get(sw_if_index)
+            if name is None or deleted:
+                # Not known yet, or gone: the next sync() takes care of it
+                return False
+            status = flags_status(flags)
+            previous = self._status.get(name)
+            self._evented.add(name)
+            if status == previous:
+                return False
+            self._status[name] = status
+            self._last_change[name] = self.uptime()
+
+        logger.info(f"Interface {name} status changed to {status}")
+        self._notify(name, status, previous)
+        return True
+
+    def _notify(self, name, status, previous):
+        for listener in self.listeners:
+            try:
+                listener(name, status, previous)
+            except Exception as e:
+                logger.error(f"Interface status listener failed for {name}: {e}")
+
+
+class LinkNotifier:
+    """
+    Send IF-MIB linkUp/linkDown notifications for InterfaceStatus changes.
+
+    Like BGP route flap damping, every link change adds a penalty to the
+    interface that halves every half_life seconds. An interface whose penalty
+    exceeds suppress sends nothing more until it has decayed below reuse;
+    tick() then sends one notification for its state if that changed.
+    """
+
+    def __init__(self, notify, ifindex, config=None):
+        """
+        Args:
+            notify: Callable(trap_oid, varbinds), e.g. Agent.notify
+            ifindex: Callable returning an interface name's ifIndex, or None
+            config: The snmp.traps config block
+        """
+        config = config or {}
+        damping = config.get("damping") or {}
+        self.notify = notify
+        self.ifindex = ifindex
+        self.up = config.get("interface_up", True)
+        self.down = config.get("interface_down", True)
+        self.half_life = damping.get("half_life", 60)
+        self.suppress = damping.get("suppress", 3000)
+        self.reuse = damping.get("reuse", 1000)
+        self._lock = threading.Lock()
+        # name => [penalty, time, suppressed, current status, notified oper]
+        self._flaps = {}
+
+    def _decay(self, flap, now):
+        flap[0] *= 0.5 ** ((now - flap[1]) / self.half_life)
+        flap[1] = now
+
+    def changed(self, name, status, previous):
+        """InterfaceStatus listener"""
+        if previous is None or status[1] == previous[1]:
+            # Only links going up or down are notified
+            return
+        now = time.monotonic()
+        with self._lock:
+            flap = self._flaps.get(name)
+            if flap is None:
+                flap = self._flaps[name] = [0.0, now, False, status, previous[1]]
+            self._decay(flap, now)
+            flap[0] += PENALTY
+            flap[3] = status
+            if not flap[2] and flap[0] > self.suppress:
+                flap[2] = True
+                logger.warning(f"Interface {name} is flapping, suppressing link notifications")
+            if flap[2]:
+                return
+            flap[4] = status[1]
+        self._send(name, status)
+
+    def tick(self):
+        """Release interfaces whose penalty decayed, call every now and then"""
+        now = time.monotonic()
+        release = []
+        with self._lock:
+            for name, flap in list(self._flaps.items()):
+                self._decay(flap, now)
+                if flap[2] and flap[0] < self.reuse:
+                    flap[2] = False
+                    logger.info(f"Interface {name} stopped flapping, resuming link notifications")
+                    if flap[3][1] != flap[4]:
+                        flap[4] = flap[3][1]
+                        release.append((name, flap[3]))
+                elif not flap[2] and flap[0] < 1:
+                    del self._flaps[name]
+        for name, status in release:
+            self._send(name, status)
+
+    def _send(self, name, status):
+        if status[1] == DOWN and not self.down or status[1] != DOWN and not self.up:
+            return
+        idx = self.ifindex(name)
+        if idx is None:
+            return
+        trap = LINK_DOWN_TRAP if status[1] == DOWN else LINK_UP_TRAP
+        logger.info(f"Sending {'linkDown' if trap == LINK_DOWN_TRAP else 'linkUp'} for {name}")
+        self.notify(
+            trap,
+            [
+                {"name": f"{IF_INDEX}.{idx}", "type": agentx.TYPE_INTEGER, "value": idx},
+                {"name": f"{IF_ADMIN_STATUS}.{idx}", "type": agentx.TYPE_INTEGER, "value": status[0]},
+                {"name": f"{IF_OPER_STATUS}.{idx}", "type": agentx.TYPE_INTEGER, "value": status[1]},
+            ],
+        )
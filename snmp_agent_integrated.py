@@ -7,16 +7,21 @@ Uses improved async polling with AgentX protocol
 
 import argparse
 import logging
+import multiprocessing
 import threading
 import time
 import yaml
 import signal
 import sys
 from datetime import datetime
+from types import MappingProxyType
 
 try:
     from vppstats import VPPStats
-    from vppapi import VPPApi
+    from vppsnapshot import InterfaceSnapshotWriter
+    from ifindex import IfIndexAllocator
+    from ifagent import CollectorAgentMixin, add_arguments, column_entries
+    from vppapi import VPPMetadataFetcher
     import agentx
 except ImportError as e:
     print(f"ERROR: Import failed: {e}")
@@ -109,41 +114,95 @@ def get_interface_speed(ifname, ifaces, bond_members_map=None, logger=None):
     return 0
 
 
+# Refresh timing stages of the VPPMetadataFetcher requests, by kind
+API_STAGES = {
+    "ifaces": "sw_interface_dump",
+    "lcp": "lcp_itf_pair_get",
+    "bonds": "bond dumps",
+}
+
+# MIB counter columns: (oid, type, iface_stats key)
+COUNTER_COLUMNS = [
+    # RX stats (32-bit)
+    ("1.3.6.1.2.1.2.2.1.10", "u32", 'rx_octets'),
+    ("1.3.6.1.2.1.2.2.1.11", "u32", 'rx_packets'),
+    ("1.3.6.1.2.1.2.2.1.12", "u32", 'rx_multicast'),
+    ("1.3.6.1.2.1.2.2.1.13", "u32", 'rx_no_buf'),
+    ("1.3.6.1.2.1.2.2.1.14", "u32", 'rx_errors'),
+    # TX stats (32-bit)
+    ("1.3.6.1.2.1.2.2.1.16", "u32", 'tx_octets'),
+    ("1.3.6.1.2.1.2.2.1.17", "u32", 'tx_packets'),
+    ("1.3.6.1.2.1.2.2.1.18", "u32", 'tx_multicast'),
+    ("1.3.6.1.2.1.2.2.1.19", "u32", 'drops'),
+    ("1.3.6.1.2.1.2.2.1.20", "u32", 'tx_errors'),
+    # ifX table (64-bit counters)
+    ("1.3.6.1.2.1.31.1.1.1.6", "u64", 'rx_octets'),
+    ("1.3.6.1.2.1.31.1.1.1.7", "u64", 'rx_packets'),
+    ("1.3.6.1.2.1.31.1.1.1.8", "u64", 'rx_multicast'),
+    ("1.3.6.1.2.1.31.1.1.1.9", "u64", 'rx_broadcast'),
+    ("1.3.6.1.2.1.31.1.1.1.10", "u64", 'tx_octets'),
+    ("1.3.6.1.2.1.31.1.1.1.11", "u64", 'tx_packets'),
+    ("1.3.6.1.2.1.31.1.1.1.12", "u64", 'tx_multicast'),
+    ("1.3.6.1.2.1.31.1.1.1.13", "u64", 'tx_broadcast'),
+]
+
+
 class VPPDataCollector:
     """
     Collects data from VPP in a separate thread
-    Provides thread-safe access to latest data
+    Publishes each collection as an immutable snapshot, swapped in atomically
     """
     
-    def __init__(self, poll_interval=5, timeout=5):
+    def __init__(self, poll_interval=5, timeout=5, idle_timeout=0, snapshot_path=None):
         """
         Args:
             poll_interval: Seconds between polls (default 5 seconds)
             timeout: VPP API timeout in seconds (default 5 seconds)
+            idle_timeout: Suspend polling after this many seconds without
+                          requests, see touch() (default 0, never suspend)
+            snapshot_path: File to publish interface counters in for
+                           debugging tools, see vppsnapshot (default None)
         """
         self.logger = logging.getLogger("VPPDataCollector")
         self.poll_interval = poll_interval
         self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.snapshot_path = snapshot_path
+        self._snapshot_writer = None
+        # Called with every sw_interface_event, in the VPP API event thread
+        self.on_interface_event = None
+        self.on_api_connect = None
+        # ErrorAlerts polled after every collection, in the poll thread
+        self.alerts = None
         
         # Thread control
         self._running = False
         self._thread = None
-        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._collected = threading.Condition()
+        self._suspended = False
+        self._last_demand = time.monotonic()
         
-        # Data storage
-        self._data = {
+        # Latest snapshot, read-only and replaced as a whole by the poll
+        # thread, which is its only writer
+        self._snapshot = MappingProxyType({
             'interfaces': {},
             'iface_stats': {},
             'lcps': {},
-            'iface_names': [],
+            'bond_members': {},
+            'metadata_generation': 0,
+            'iface_names': (),
             'last_update': 0,
             'error_count': 0,
             'update_count': 0,
-        }
+            'vpp_instance': None,
+            'timings': None,
+        })
         
         # VPP connections
         self.vpp_api = None
         self.vpp_stats = None
+        self._last_interfaces = None
         
     def start(self):
         """Start the data collection thread"""
@@ -158,6 +217,7 @@ class VPPDataCollector:
     def stop(self):
         """Stop the data collection thread"""
         self._running = False
+        self._wakeup.set()
         if self._thread:
             self._thread.join(timeout=5)
         self._disconnect_vpp()
@@ -169,6 +229,19 @@ class VPPDataCollector:
         max_consecutive_errors = 3
         
         while self._running:
+            if self.idle_timeout and time.monotonic() - self._last_demand > self.idle_timeout:
+                self._suspended = True
+                # Check again now that touch() can see the flag, so a request
+                # arriving in between isn't missed
+                if time.monotonic() - self._last_demand > self.idle_timeout:
+                    self.logger.info(f"No requests for {self.idle_timeout}s, suspending polling")
+                    self._wakeup.wait()
+                    self._wakeup.clear()
+                    if not self._running:
+                        break
+                    self.logger.info("Request received, resuming polling")
+                self._suspended = False
+            
             try:
                 # Connect to VPP if not connected
                 if not self.vpp_api or not self.vpp_api.connected:
@@ -178,13 +251,14 @@ class VPPDataCollector:
                     self._connect_stats()
                 
                 # Collect data
-                self._collect_data()
+                self._collect_data(retries=consecutive_errors)
                 consecutive_errors = 0
+                with self._collected:
+                    self._collected.notify_all()
                 
             except Exception as e:
                 consecutive_errors += 1
-                with self._lock:
-                    self._data['error_count'] += 1
+                self._publish(error_count=self._snapshot['error_count'] + 1)
                     
                 self.logger.error(f"Poll error ({consecutive_errors}/{max_consecutive_errors}): {e}")
                 
@@ -197,17 +271,49 @@ class VPPDataCollector:
                     time.sleep(0.5)
                 continue
             
-            # Sleep until next poll
-            time.sleep(self.poll_interval)
+            # Sleep until next poll, or until woken up by touch()
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+    
+    def touch(self, deadline=None):
+        """
+        Record demand for data. If polling was suspended, resume it and wait up
+        to deadline seconds for a fresh collection.
+        
+        Returns:
+            True if fresh data was collected while waiting
+        """
+        self._last_demand = time.monotonic()
+        if not self._suspended:
+            return False
+        
+        count = self._snapshot['update_count']
+        self._wakeup.set()
+        with self._collected:
+            return self._collected.wait_for(
+                lambda: self._snapshot['update_count'] > count, timeout=deadline
+            )
     
     def _connect_vpp(self):
         """Connect to VPP API"""
         self.logger.debug("Connecting to VPP API...")
-        self.vpp_api = VPPApi(clientname="snmp-agent-v2-integrated")
+        self.vpp_api = VPPMetadataFetcher(
+            clientname="snmp-agent-v2-integrated", deadline=self.timeout
+        )
+        self.vpp_api.on_event(self._interface_event)
+        self.vpp_api.on_connect(self._api_connect)
         if not self.vpp_api.connect():
             raise Exception("Failed to connect to VPP API")
         self.logger.info("Connected to VPP API")
     
+    def _interface_event(self, event):
+        if self.on_interface_event:
+            self.on_interface_event(event)
+    
+    def _api_connect(self):
+        if self.on_api_connect:
+            self.on_api_connect()
+    
     def _connect_stats(self):
         """Connect to VPP Stats segment"""
         self.logger.debug("Connecting to VPP Stats...")
@@ -265,56 +371,30 @@ class VPPDataCollector:
             self.logger.debug(f"Error accessing {path} for interface {index}: {e}")
             return default
     
-    def _get_bond_members_map(self, interfaces):
-        """
-        Build a map of bond interface sw_if_index to list of member sw_if_indices.
-        Uses VPP sw_interface_bond_dump and sw_interface_slave_dump APIs.
-        
-        Returns:
-            Dict mapping bond sw_if_index to list of member sw_if_indices
+    def _collect_data(self, retries=0):
         """
-        bond_members = {}
-        try:
-            # Try to get bond info via API
-            if not hasattr(self.vpp_api.vpp, 'api'):
-                return bond_members
-            
-            result = self.vpp_api.vpp.api.sw_interface_bond_dump()
-            if result:
-                for bond_info in result:
-                    bond_sw_if_index = bond_info.sw_if_index
-                    members = []
-                    
-                    try:
-                        # Get slave members for this bond
-                        slaves = self.vpp_api.vpp.api.sw_interface_slave_dump(sw_if_index=bond_sw_if_index)
-                        if slaves:
-                            for slave_info in slaves:
-                                members.append(slave_info.sw_if_index)
-                    except Exception as e:
-                        self.logger.debug(f"Could not get slaves for bond {bond_sw_if_index}: {e}")
-                    
-                    bond_members[bond_sw_if_index] = members
-                    self.logger.debug(f"Bond sw_if_index={bond_sw_if_index} has {len(members)} members")
-        except Exception as e:
-            self.logger.debug(f"Could not get bond members: {e}")
-        
-        return bond_members
-    
-    def _collect_data(self):
-        """
-        Collect data from VPP
+        Collect data from VPP, retries being the failed polls before this one
         VPP 25.06 compatible - handles missing optional stats paths
         """
-        interfaces = self.vpp_api.get_ifaces()
-        lcps = self.vpp_api.get_lcp()
-        
-        # Get bond members map for speed calculation
-        bond_members_map = self._get_bond_members_map(interfaces)
+        timings = agentx.Timings()
+        timings.count("poll retries", retries)
+        t = time.time()
+        # Interfaces, LCPs and bond members (for speed calculation) are
+        # requested concurrently, each on its own API connection
+        metadata = self.vpp_api.fetch()
+        interfaces = metadata['ifaces']
+        lcps = metadata['lcp']
+        bond_members_map = metadata['bonds']
+        t = timings.stage("fetch", t)
+        # Each request on its own, for those that completed in this fetch
+        for kind, seconds in self.vpp_api.durations.items():
+            timings.record(API_STAGES.get(kind, kind), seconds)
+        timings.count("api late", len(self.vpp_api.late))
         
         # Get stats from shared memory
+        stats_retries = self.vpp_stats.retries
         iface_stats = {}
-        iface_names = list(self.vpp_stats["/if/names"])
+        iface_names = self.vpp_stats["/if/names"]
         
         for i, ifname in enumerate(iface_names):
             try:
@@ -338,31 +418,85 @@ class VPPDataCollector:
                 iface_stats[ifname] = stats
             except Exception as e:
                 self.logger.warning(f"Could not get stats for {ifname}: {e}")
+        timings.stage("stats", t)
+        timings.count("stats retries", self.vpp_stats.retries - stats_retries)
+        timings.count("interfaces", len(iface_names))
         
-        # Update data atomically
-        with self._lock:
-            self._data['interfaces'] = interfaces
-            self._data['iface_stats'] = iface_stats
-            self._data['lcps'] = lcps
-            self._data['iface_names'] = iface_names
-            self._data['last_update'] = time.time()
-            self._data['update_count'] += 1
+        # Publish a new snapshot; readers holding the previous one keep a
+        # consistent view of it
+        generation = self._snapshot['metadata_generation']
+        if interfaces is not self._last_interfaces:
+            # VPPApi hands out the same cached dict until an interface
+            # event or reconnect, so a new dict means metadata changed
+            generation += 1
+            self._last_interfaces = interfaces
+        self._publish(
+            interfaces=MappingProxyType(interfaces),
+            iface_stats=MappingProxyType(iface_stats),
+            lcps=MappingProxyType(lcps),
+            bond_members=MappingProxyType(bond_members_map),
+            metadata_generation=generation,
+            iface_names=tuple(iface_names),
+            last_update=time.time(),
+            update_count=self._snapshot['update_count'] + 1,
+            vpp_instance=self.vpp_stats.socket_id,
+            timings=timings,
+        )
+        self._write_snapshot(iface_names, iface_stats)
+        if self.alerts:
+            try:
+                self.alerts.poll(self.vpp_stats, iface_names)
+            except Exception as e:
+                self.logger.warning(f"Could not check error alerts: {e}")
+    
+    def _write_snapshot(self, iface_names, iface_stats):
+        """Publish interface counters for debugging tools, see vppsnapshot"""
+        if not self.snapshot_path:
+            return
+        try:
+            if self._snapshot_writer is None:
+                self._snapshot_writer = InterfaceSnapshotWriter(self.snapshot_path)
+            self._snapshot_writer.publish(
+                iface_names, iface_stats, self.vpp_stats.directory.keys(), self.vpp_stats.epoch
+            )
+        except Exception as e:
+            self.logger.warning(f"Could not write interface snapshot {self.snapshot_path}: {e}, disabling it")
+            self.snapshot_path = None
+    
+    def _publish(self, **changes):
+        """Swap in a snapshot with changes applied to the current one"""
+        data = dict(self._snapshot)
+        data.update(changes)
+        self._snapshot = MappingProxyType(data)
     
     def get_data(self):
-        """Get current data snapshot (thread-safe)"""
-        with self._lock:
-            return {
-                'interfaces': dict(self._data['interfaces']),
-                'iface_stats': dict(self._data['iface_stats']),
-                'lcps': dict(self._data['lcps']),
-                'iface_names': list(self._data['iface_names']),
-                'last_update': self._data['last_update'],
-                'error_count': self._data['error_count'],
-                'update_count': self._data['update_count'],
-            }
+        """
+        Get the current data snapshot, without locking or copying.
+        The snapshot is read-only and never changes once published.
+        """
+        return self._snapshot
 
 
-class SNMPAgentIntegrated(agentx.Agent):
+# Interface metadata columns: (column OID, type, interface record key), in
+# OID order before and after ifagent.STATUS_COLUMNS
+IF_STATIC_COLUMNS = [
+    ("1.3.6.1.2.1.2.2.1.1", "int", 'index'),
+    ("1.3.6.1.2.1.2.2.1.2", "str", 'name'),
+    ("1.3.6.1.2.1.2.2.1.3", "int", 'type'),
+    ("1.3.6.1.2.1.2.2.1.4", "int", 'mtu'),
+    ("1.3.6.1.2.1.2.2.1.5", "gauge32", 'speed_32'),
+    ("1.3.6.1.2.1.2.2.1.6", "str", 'mac'),
+]
+IFX_STATIC_COLUMNS = [
+    ("1.3.6.1.2.1.31.1.1.1.1", "str", 'name'),
+    # ifHighSpeed in Mbps as 64-bit
+    ("1.3.6.1.2.1.31.1.1.1.15", "u64", 'high_speed'),
+    # ifCounterDiscontinuityTime
+    ("1.3.6.1.2.1.31.1.1.1.19", "ticks", 'discontinuity'),
+]
+
+
+class SNMPAgentIntegrated(CollectorAgentMixin, agentx.Agent):
     """SNMP Agent integrated with VPPDataCollector"""
     
     def setup(self):
@@ -382,19 +516,40 @@ class SNMPAgentIntegrated(agentx.Agent):
         # Create data collector with config from args
         poll_period = getattr(self._args, 'period', 5)
         timeout = getattr(self._args, 'timeout', 5)
-        self.collector = VPPDataCollector(poll_interval=poll_period, timeout=timeout)
+        idle_timeout = getattr(self._args, 'idle_timeout', 0)
+        snapshot_path = getattr(self._args, 'snapshot_file', None)
+        self.collector = VPPDataCollector(poll_interval=poll_period, timeout=timeout,
+                                          idle_timeout=idle_timeout,
+                                          snapshot_path=snapshot_path)
+        
+        self.setup_interfaces()
         self.collector.start()
         
-        # Wait for first data
-        for i in range(30):
-            data = self.collector.get_data()
-            if data['update_count'] > 0:
-                self.logger.info(f"Data collector ready with {len(data['iface_names'])} interfaces")
-                break
-            time.sleep(0.5)
+        # Wait for first data, unless there is a saved dataset to serve
+        # meanwhile
+        if self.warm_start():
+            self.logger.info("Serving saved data until the collector is ready")
         else:
-            self.logger.error("Could not get data from VPP")
-            return False
+            for i in range(30):
+                data = self.collector.get_data()
+                if data['update_count'] > 0:
+                    self.logger.info(f"Data collector ready with {len(data['iface_names'])} interfaces")
+                    break
+                time.sleep(0.5)
+            else:
+                self.logger.error("Could not get data from VPP")
+                return False
+        
+        self.ifindex = IfIndexAllocator(
+            path=getattr(self._args, 'ifindex_file', None) or None,
+            mode=getattr(self._args, 'ifindex_mode', 'name')
+        )
+        
+        self._static_names = None
+        self._static_generation = None
+        self._rows = None
+        self._counters = None
+        self._counters_rows = None
         
         # Register OID subtrees
         self.register("1.3.6.1.2.1.2.2.1")  # ifEntry
@@ -403,84 +558,116 @@ class SNMPAgentIntegrated(agentx.Agent):
         self.logger.info("SNMP Agent setup complete")
         return True
     
-    def update(self):
-        """Update phase - called periodically to update MIB data"""
+    def update_static(self):
+        """Static phase - interface metadata, rebuilt when interfaces change"""
         try:
             data = self.collector.get_data()
             ds = agentx.DataSet()
             
-            if not data['iface_stats']:
-                self.logger.warning("No interface data available")
-                return ds
-            
-            # Build bond members map for speed calculation
             interfaces = data['interfaces']
-            bond_members_map = self.collector._get_bond_members_map(interfaces)
+            bond_members_map = data['bond_members']
+            
+            # Interface index in SNMP, stable across restarts and churn
+            t = time.time()
+            rows = self.ifindex.assign(data['iface_names'], interfaces)
+            self.ifstatus.sync(data['iface_names'], interfaces, data['vpp_instance'])
+            t = self.timings.stage("ifindex", t)
+            events = self.ifstatus.events
+            status_values = ([], [], [])
+            records = []
             
-            # Build MIB data for each interface
-            for i, ifname in enumerate(data['iface_names']):
-                idx = 1000 + i  # Interface index in SNMP
-                stats = data['iface_stats'].get(ifname, {})
+            # Gather MIB data for each interface
+            for ifname, idx in zip(data['iface_names'], rows):
+                if idx is None:
+                    continue
                 
                 # Get interface metadata
                 iface = interfaces.get(ifname)
-                mtu = iface.mtu[0] if iface else 0
-                admin_status = 1 if (iface and int(iface.flags) & 1) else 2
-                oper_status = 1 if (iface and int(iface.flags) & 2) else 2
-                mac = str(iface.l2_address) if iface else "00:00:00:00:00:00"
+                admin_status, oper_status = self.ifstatus.status(ifname) or (2, 2)
                 
                 # Speed in bps (VPP reports link_speed in Kbps)
                 # Use improved get_interface_speed for bonding support
                 speed_kbps = get_interface_speed(ifname, interfaces, bond_members_map, self.logger)
                 speed = speed_kbps * 1000  # Convert Kbps to bps
                 
-                # For OID 1.3.6.1.2.1.2.2.1.5 (32-bit ifSpeed), cap at 4.29 Gbps
-                # For speeds > 4.29 Gbps, use 0 to indicate use HC counter
-                speed_32 = 0 if speed >= 2 ** 32 else speed
-                
-                # Interface Name (mib-2.ifTable.ifEntry.ifName)
-                ds.set(f"1.3.6.1.2.1.2.2.1.1.{idx}", "int", idx)
-                ds.set(f"1.3.6.1.2.1.2.2.1.2.{idx}", "str", ifname)
-                
-                # Interface type
-                if ifname.startswith("loop"):
-                    ds.set(f"1.3.6.1.2.1.2.2.1.3.{idx}", "int", 24)  # softwareLoopback
+                records.append({
+                    'index': idx,
+                    'name': ifname,
+                    # softwareLoopback or ethernet-csmacd
+                    'type': 24 if ifname.startswith("loop") else 6,
+                    'mtu': iface.mtu[0] if iface else 0,
+                    # For OID 1.3.6.1.2.1.2.2.1.5 (32-bit ifSpeed), cap at 4.29 Gbps
+                    # For speeds > 4.29 Gbps, use 0 to indicate use HC counter
+                    'speed_32': 0 if speed >= 2 ** 32 else speed,
+                    'mac': str(iface.l2_address) if iface else "00:00:00:00:00:00",
+                    'high_speed': int(speed / 1000000),
+                    'discontinuity': self.ifstatus.discontinuity(ifname),
+                })
+                status_values[0].append(admin_status)
+                status_values[1].append(oper_status)
+                status_values[2].append(self.ifstatus.last_change(ifname))
+            
+            # Add the OIDs in order, so serving them needs no sort; the
+            # status columns as slots, for status_changed() to overwrite
+            records.sort(key=lambda record: record['index'])
+            ds.extend(column_entries(IF_STATIC_COLUMNS, records))
+            self.add_status_columns(ds, data['iface_names'], rows, status_values, events)
+            ds.extend(column_entries(IFX_STATIC_COLUMNS, records))
+            
+            self._static_names = data['iface_names']
+            self._static_generation = data['metadata_generation']
+            self._rows = rows
+            self.timings.stage("format", t)
+            return ds
+        
+        except Exception as e:
+            self.logger.error(f"Error in update_static: {e}")
+            return False
+    
+    def update(self):
+        """Update phase - called periodically to update MIB counters"""
+        try:
+            data = self.collector.get_data()
+            ds = agentx.DataSet()
+            
+            if data['update_count'] == 0:
+                self.logger.debug("No data collected yet")
+                return False
+            if self.linktraps:
+                self.linktraps.tick()
+            # The stages of the collection this refresh serves
+            self.timings.add(data['timings'])
+            
+            if not data['iface_stats']:
+                self.logger.warning("No interface data available")
+                return ds
+            
+            if (data['iface_names'] != self._static_names or
+                    data['metadata_generation'] != self._static_generation):
+                self.logger.info("Interfaces changed, rebuilding interface metadata")
+                self.invalidate_static()
+            
+            # Counter rows follow the static layer, which is rebuilt first
+            # when the interfaces changed
+            if self._counters is None or self._counters_rows is not self._rows:
+                self._counters = agentx.DataSet()
+                self._slots = self._counters.columns(
+                    [(oid, oid_type) for oid, oid_type, _ in COUNTER_COLUMNS],
+                    self._rows,
+                )
+                self._counters_rows = self._rows
+            ds = self._counters
+            
+            # Overwrite counter values in place, column by column
+            t = time.time()
+            iface_stats = [data['iface_stats'].get(ifname, {}) for ifname in self._static_names]
+            for col, (oid, oid_type, key) in enumerate(COUNTER_COLUMNS):
+                if oid_type == "u32":
+                    values = [stats.get(key, 0) % 2**32 for stats in iface_stats]
                 else:
-                    ds.set(f"1.3.6.1.2.1.2.2.1.3.{idx}", "int", 6)  # ethernet-csmacd
-                
-                ds.set(f"1.3.6.1.2.1.2.2.1.4.{idx}", "int", mtu)
-                ds.set(f"1.3.6.1.2.1.2.2.1.5.{idx}", "gauge32", speed_32)
-                ds.set(f"1.3.6.1.2.1.2.2.1.6.{idx}", "str", mac)
-                ds.set(f"1.3.6.1.2.1.2.2.1.7.{idx}", "int", admin_status)
-                ds.set(f"1.3.6.1.2.1.2.2.1.8.{idx}", "int", oper_status)
-                ds.set(f"1.3.6.1.2.1.2.2.1.9.{idx}", "ticks", 0)
-                
-                # RX stats (32-bit)
-                ds.set(f"1.3.6.1.2.1.2.2.1.10.{idx}", "u32", stats.get('rx_octets', 0) % 2**32)
-                ds.set(f"1.3.6.1.2.1.2.2.1.11.{idx}", "u32", stats.get('rx_packets', 0) % 2**32)
-                ds.set(f"1.3.6.1.2.1.2.2.1.12.{idx}", "u32", stats.get('rx_multicast', 0) % 2**32)
-                ds.set(f"1.3.6.1.2.1.2.2.1.13.{idx}", "u32", stats.get('rx_no_buf', 0) % 2**32)
-                ds.set(f"1.3.6.1.2.1.2.2.1.14.{idx}", "u32", stats.get('rx_errors', 0) % 2**32)
-                
-                # TX stats (32-bit)
-                ds.set(f"1.3.6.1.2.1.2.2.1.16.{idx}", "u32", stats.get('tx_octets', 0) % 2**32)
-                ds.set(f"1.3.6.1.2.1.2.2.1.17.{idx}", "u32", stats.get('tx_packets', 0) % 2**32)
-                ds.set(f"1.3.6.1.2.1.2.2.1.18.{idx}", "u32", stats.get('tx_multicast', 0) % 2**32)
-                ds.set(f"1.3.6.1.2.1.2.2.1.19.{idx}", "u32", stats.get('drops', 0) % 2**32)
-                ds.set(f"1.3.6.1.2.1.2.2.1.20.{idx}", "u32", stats.get('tx_errors', 0) % 2**32)
-                
-                # ifX table (64-bit counters)
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.1.{idx}", "str", ifname)
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.6.{idx}", "u64", stats.get('rx_octets', 0))
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.7.{idx}", "u64", stats.get('rx_packets', 0))
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.8.{idx}", "u64", stats.get('rx_multicast', 0))
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.9.{idx}", "u64", stats.get('rx_broadcast', 0))
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.10.{idx}", "u64", stats.get('tx_octets', 0))
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.11.{idx}", "u64", stats.get('tx_packets', 0))
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.12.{idx}", "u64", stats.get('tx_multicast', 0))
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.13.{idx}", "u64", stats.get('tx_broadcast', 0))
-                # HC Speed counter (OID 1.3.6.1.2.1.31.1.1.1.15) - ifHighSpeed in Mbps as 64-bit
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.15.{idx}", "u64", int(speed / 1000000))
+                    values = [stats.get(key, 0) for stats in iface_stats]
+                self._slots.set_column(col, values)
+            self.timings.stage("counters", t)
             
             return ds
         
@@ -489,6 +676,70 @@ class SNMPAgentIntegrated(agentx.Agent):
             return agentx.DataSet()
 
 
+class SNMPAgentSnapshot(agentx.SnapshotAgent):
+    """
+    SNMP Agent serving what a separate collector process publishes into
+    shared memory, see --collector-process
+    """
+    
+    def __init__(self, args, **kwargs):
+        super().__init__(
+            args.shm_path,
+            ["1.3.6.1.2.1.2.2.1", "1.3.6.1.2.1.31.1.1.1"],
+            max_age=2 * args.period + args.timeout,
+            args=args,
+            **kwargs
+        )
+        self.process = None
+    
+    def setup(self):
+        """Start the collector process and register its OID subtrees"""
+        self._start_collector()
+        if self.warm_start():
+            self.logger.info("Serving saved data until the collector publishes")
+        return super().setup()
+    
+    def _start_collector(self):
+        self.process = multiprocessing.Process(
+            target=run_collector, args=(self._args,), name="vpp-collector", daemon=True
+        )
+        self.process.start()
+        self.logger.info(f"Started collector process {self.process.pid}")
+    
+    def update(self):
+        """Pick up new snapshots, restarting the collector if it died"""
+        if not self.process.is_alive():
+            self.logger.error(
+                f"Collector process exited with {self.process.exitcode}, restarting"
+            )
+            self._start_collector()
+        return super().update()
+    
+    def stop(self):
+        if self.process and self.process.is_alive():
+            self.process.terminate()
+        super().stop()
+
+
+def run_collector(args):
+    """Collector process: collect from VPP and publish into shared memory"""
+    setup_logging(args.debug)
+    if args.idle_timeout:
+        # Requests arrive in the serving process, the collector never sees them
+        logging.getLogger("main").warning("--idle-timeout is ignored with --collector-process")
+        args.idle_timeout = 0
+    agent = SNMPAgentIntegrated(
+        period=args.period,
+        static_period=args.static_period,
+        agent_oid=None,
+        args=args
+    )
+    # The serving process' handler came along with the fork, dump the
+    # collector's own refreshes instead
+    signal.signal(signal.SIGUSR1, lambda sig, frame: agent.dump_timings())
+    agent.publish(agentx.SnapshotWriter(args.shm_path))
+
+
 def setup_logging(debug=False):
     """Configure logging"""
     level = logging.DEBUG if debug else logging.INFO
@@ -503,33 +754,25 @@ def main():
         description="VPP SNMP Agent - Integrated with Real-time Data Collector",
         formatter_class=argparse.RawTextHelpFormatter
     )
+    add_arguments(parser)
     parser.add_argument(
-        "-a", "--address",
-        type=str,
-        default="localhost:705",
-        help="SNMP AgentX address (default: localhost:705)"
-    )
-    parser.add_argument(
-        "-p", "--period",
+        "-s", "--static-period",
         type=int,
-        default=5,
-        help="Data polling period in seconds (default: 5)"
+        default=300,
+        help="Interface metadata rebuild period in seconds (default: 300)"
     )
     parser.add_argument(
-        "-t", "--timeout",
-        type=int,
-        default=5,
-        help="VPP API timeout in seconds (default: 5)"
+        "--collector-process",
+        action="store_true",
+        help="Collect from VPP in a separate process, which publishes into\n"
+             "shared memory that this process serves from"
     )
     parser.add_argument(
-        "-c", "--config",
+        "--shm-path",
         type=str,
-        help="Configuration YAML file"
-    )
-    parser.add_argument(
-        "-d", "--debug",
-        action="store_true",
-        help="Enable debug logging"
+        default="/dev/shm/vpp-snmp-agent-v2",
+        help="Shared memory file for --collector-process\n"
+             "(default: /dev/shm/vpp-snmp-agent-v2)"
     )
     
     args = parser.parse_args()
@@ -547,11 +790,25 @@ def main():
     
     try:
         logger.info(f"Starting SNMP Agent on {args.address}")
-        agent = SNMPAgentIntegrated(
-            server_address=args.address,
-            period=args.period,
-            args=args
-        )
+        if args.collector_process:
+            agent = SNMPAgentSnapshot(
+                args,
+                server_address=args.address,
+                deadline=args.deadline,
+                state_file=args.state_file
+            )
+        else:
+            agent = SNMPAgentIntegrated(
+                server_address=args.address,
+                period=args.period,
+                static_period=args.static_period,
+                deadline=args.deadline,
+                state_file=args.state_file,
+                arena=args.arena,
+                args=args
+            )
+        # Log the timings of the last refreshes
+        signal.signal(signal.SIGUSR1, lambda sig, frame: agent.dump_timings())
         agent.run()
     except Exception as e:
         logger.error(f"Fatal error: {e}", exc_info=True)
@@ -20,10 +20,14 @@ import signal
 import sys
 from collections import defaultdict
 from datetime import datetime
+from types import MappingProxyType
 
 try:
     from vppapi import VPPApi
     from vppstats import VPPStats
+    from vppsnapshot import InterfaceSnapshotWriter
+    from ifindex import IfIndexAllocator
+    from ifagent import CollectorAgentMixin, add_arguments, column_entries
 except ImportError:
     print("ERROR: Could not import vppapi or vppstats")
     sys.exit(1)
@@ -133,33 +137,51 @@ def get_interface_speed(ifname, ifaces, logger=None):
 class VPPDataCollector:
     """
     Collects data from VPP in a separate thread
-    Provides thread-safe access to latest data
+    Publishes each collection as an immutable snapshot, swapped in atomically
     """
     
-    def __init__(self, poll_interval=5, timeout=5):
+    def __init__(self, poll_interval=5, timeout=5, idle_timeout=0, snapshot_path=None):
         """
         Args:
             poll_interval: Seconds between polls (default 5 seconds)
             timeout: VPP API timeout in seconds (default 5 seconds)
+            idle_timeout: Suspend polling after this many seconds without
+                          requests, see touch() (default 0, never suspend)
+            snapshot_path: File to publish interface counters in for
+                           debugging tools, see vppsnapshot (default None)
         """
         self.logger = logging.getLogger("VPPDataCollector")
         self.poll_interval = poll_interval
         self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.snapshot_path = snapshot_path
+        self._snapshot_writer = None
+        # Called with every sw_interface_event, in the VPP API event thread
+        self.on_interface_event = None
+        self.on_api_connect = None
+        # ErrorAlerts polled after every collection, in the poll thread
+        self.alerts = None
         
         # Thread control
         self._running = False
         self._thread = None
-        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._collected = threading.Condition()
+        self._suspended = False
+        self._last_demand = time.monotonic()
         
-        # Data storage
-        self._data = {
+        # Latest snapshot, read-only and replaced as a whole by the poll
+        # thread, which is its only writer
+        self._snapshot = MappingProxyType({
             'interfaces': {},
             'iface_stats': {},
             'lcps': {},
             'last_update': 0,
             'error_count': 0,
             'update_count': 0,
-        }
+            'vpp_instance': None,
+            'timings': None,
+        })
         
         # VPP connections
         self.vpp_api = None
@@ -178,6 +200,7 @@ class VPPDataCollector:
     def stop(self):
         """Stop the data collection thread"""
         self._running = False
+        self._wakeup.set()
         if self._thread:
             self._thread.join(timeout=5)
         self.logger.info("Data collector stopped")
@@ -188,6 +211,19 @@ class VPPDataCollector:
         max_consecutive_errors = 3
         
         while self._running:
+            if self.idle_timeout and time.monotonic() - self._last_demand > self.idle_timeout:
+                self._suspended = True
+                # Check again now that touch() can see the flag, so a request
+                # arriving in between isn't missed
+                if time.monotonic() - self._last_demand > self.idle_timeout:
+                    self.logger.info(f"No requests for {self.idle_timeout}s, suspending polling")
+                    self._wakeup.wait()
+                    self._wakeup.clear()
+                    if not self._running:
+                        break
+                    self.logger.info("Request received, resuming polling")
+                self._suspended = False
+            
             try:
                 # Connect to VPP if not connected
                 if not self.vpp_api or not self.vpp_api.connected:
@@ -197,13 +233,14 @@ class VPPDataCollector:
                     self._connect_stats()
                 
                 # Collect data
-                self._collect_data()
+                self._collect_data(retries=consecutive_errors)
                 consecutive_errors = 0
+                with self._collected:
+                    self._collected.notify_all()
                 
             except Exception as e:
                 consecutive_errors += 1
-                with self._lock:
-                    self._data['error_count'] += 1
+                self._publish(error_count=self._snapshot['error_count'] + 1)
                     
                 self.logger.error(f"Poll error ({consecutive_errors}/{max_consecutive_errors}): {e}")
                 
@@ -216,17 +253,47 @@ class VPPDataCollector:
                     time.sleep(0.5)  # Short sleep before next attempt
                 continue
             
-            # Sleep until next poll
-            time.sleep(self.poll_interval)
+            # Sleep until next poll, or until woken up by touch()
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+    
+    def touch(self, deadline=None):
+        """
+        Record demand for data. If polling was suspended, resume it and wait up
+        to deadline seconds for a fresh collection.
+        
+        Returns:
+            True if fresh data was collected while waiting
+        """
+        self._last_demand = time.monotonic()
+        if not self._suspended:
+            return False
+        
+        count = self._snapshot['update_count']
+        self._wakeup.set()
+        with self._collected:
+            return self._collected.wait_for(
+                lambda: self._snapshot['update_count'] > count, timeout=deadline
+            )
     
     def _connect_vpp(self):
         """Connect to VPP API"""
         self.logger.info("Connecting to VPP API...")
         self.vpp_api = VPPApi(clientname="snmp-agent-v2")
+        self.vpp_api.event_callback = self._interface_event
+        self.vpp_api.connect_callback = self._api_connect
         if not self.vpp_api.connect():
             raise Exception("Failed to connect to VPP API")
         self.logger.info("Connected to VPP API")
     
+    def _interface_event(self, event):
+        if self.on_interface_event:
+            self.on_interface_event(event)
+    
+    def _api_connect(self):
+        if self.on_api_connect:
+            self.on_api_connect()
+    
     def _connect_stats(self):
         """Connect to VPP Stats segment"""
         self.logger.info("Connecting to VPP Stats...")
@@ -250,12 +317,20 @@ class VPPDataCollector:
                 pass
             self.vpp_stats = None
     
-    def _collect_data(self):
-        """Collect data from VPP"""
+    def _collect_data(self, retries=0):
+        """
+        Collect data from VPP, retries being the failed polls before this one
+        """
+        timings = agentx.Timings()
+        timings.count("poll retries", retries)
+        t = time.time()
         interfaces = self.vpp_api.get_ifaces()
+        t = timings.stage("sw_interface_dump", t)
         lcps = self.vpp_api.get_lcp()
+        t = timings.stage("lcp_itf_pair_get", t)
         
         # Get stats from shared memory
+        stats_retries = self.vpp_stats.retries
         iface_stats = {}
         iface_names = self.vpp_stats["/if/names"]
         
@@ -280,46 +355,132 @@ class VPPDataCollector:
                 iface_stats[ifname] = stats
             except Exception as e:
                 self.logger.warning(f"Could not get stats for {ifname}: {e}")
+        timings.stage("stats", t)
+        timings.count("stats retries", self.vpp_stats.retries - stats_retries)
+        timings.count("interfaces", len(iface_names))
         
-        # Update data atomically
-        with self._lock:
-            self._data['interfaces'] = interfaces
-            self._data['iface_stats'] = iface_stats
-            self._data['lcps'] = lcps
-            self._data['last_update'] = time.time()
-            self._data['update_count'] += 1
+        # Publish a new snapshot; readers holding the previous one keep a
+        # consistent view of it
+        self._publish(
+            interfaces=MappingProxyType(interfaces),
+            iface_stats=MappingProxyType(iface_stats),
+            lcps=MappingProxyType(lcps),
+            last_update=time.time(),
+            update_count=self._snapshot['update_count'] + 1,
+            vpp_instance=self.vpp_stats.socket_id,
+            timings=timings,
+        )
+        self._write_snapshot(iface_names, iface_stats)
+        if self.alerts:
+            try:
+                self.alerts.poll(self.vpp_stats, iface_names)
+            except Exception as e:
+                self.logger.warning(f"Could not check error alerts: {e}")
+    
+    def _write_snapshot(self, iface_names, iface_stats):
+        """Publish interface counters for debugging tools, see vppsnapshot"""
+        if not self.snapshot_path:
+            return
+        try:
+            if self._snapshot_writer is None:
+                self._snapshot_writer = InterfaceSnapshotWriter(self.snapshot_path)
+            self._snapshot_writer.publish(
+                iface_names, iface_stats, self.vpp_stats.directory.keys(), self.vpp_stats.epoch
+            )
+        except Exception as e:
+            self.logger.warning(f"Could not write interface snapshot {self.snapshot_path}: {e}, disabling it")
+            self.snapshot_path = None
+    
+    def _publish(self, **changes):
+        """Swap in a snapshot with changes applied to the current one"""
+        data = dict(self._snapshot)
+        data.update(changes)
+        self._snapshot = MappingProxyType(data)
     
     def get_data(self):
-        """Get current data snapshot (thread-safe)"""
-        with self._lock:
-            return {
-                'interfaces': dict(self._data['interfaces']),
-                'iface_stats': dict(self._data['iface_stats']),
-                'lcps': dict(self._data['lcps']),
-                'last_update': self._data['last_update'],
-                'error_count': self._data['error_count'],
-                'update_count': self._data['update_count'],
-            }
+        """
+        Get the current data snapshot, without locking or copying.
+        The snapshot is read-only and never changes once published.
+        """
+        return self._snapshot
     
     def get_interface_stat(self, ifname, stat_name):
-        """Get a specific interface statistic (thread-safe)"""
-        with self._lock:
-            if ifname in self._data['iface_stats']:
-                return self._data['iface_stats'][ifname].get(stat_name, 0)
-            return 0
+        """Get a specific interface statistic from the current snapshot"""
+        iface_stats = self._snapshot['iface_stats']
+        if ifname in iface_stats:
+            return iface_stats[ifname].get(stat_name, 0)
+        return 0
 
 
-class SNMPAgent(agentx.Agent):
+# iface_stats keys served: interface records hold each value as it is, and
+# modulo 2 ** 32 under the key with a _32 suffix for the 32-bit columns
+COUNTER_KEYS = (
+    'rx_octets', 'rx_packets', 'rx_multicast', 'rx_broadcast', 'rx_no_buf',
+    'rx_errors', 'tx_octets', 'tx_packets', 'tx_multicast', 'tx_broadcast',
+    'drops', 'tx_errors',
+)
+
+# Interface columns: (column OID, type, interface record key), in OID order
+# before and after ifagent.STATUS_COLUMNS
+IF_COLUMNS = [
+    ("1.3.6.1.2.1.2.2.1.1", "int", 'index'),
+    ("1.3.6.1.2.1.2.2.1.2", "str", 'name'),
+    ("1.3.6.1.2.1.2.2.1.3", "int", 'type'),
+    ("1.3.6.1.2.1.2.2.1.4", "int", 'mtu'),
+    ("1.3.6.1.2.1.2.2.1.5", "gauge32", 'speed_32'),
+    ("1.3.6.1.2.1.2.2.1.6", "str", 'mac'),
+]
+IF_COUNTER_COLUMNS = [
+    # RX stats (32-bit)
+    ("1.3.6.1.2.1.2.2.1.10", "u32", 'rx_octets_32'),
+    ("1.3.6.1.2.1.2.2.1.11", "u32", 'rx_packets_32'),
+    ("1.3.6.1.2.1.2.2.1.12", "u32", 'rx_multicast_32'),
+    ("1.3.6.1.2.1.2.2.1.13", "u32", 'rx_no_buf_32'),
+    ("1.3.6.1.2.1.2.2.1.14", "u32", 'rx_errors_32'),
+    # TX stats (32-bit)
+    ("1.3.6.1.2.1.2.2.1.16", "u32", 'tx_octets_32'),
+    ("1.3.6.1.2.1.2.2.1.17", "u32", 'tx_packets_32'),
+    ("1.3.6.1.2.1.2.2.1.18", "u32", 'tx_multicast_32'),
+    ("1.3.6.1.2.1.2.2.1.19", "u32", 'drops_32'),
+    ("1.3.6.1.2.1.2.2.1.20", "u32", 'tx_errors_32'),
+]
+IFX_COLUMNS = [
+    ("1.3.6.1.2.1.31.1.1.1.1", "str", 'name'),
+    ("1.3.6.1.2.1.31.1.1.1.2", "u32", 'rx_multicast_32'),
+    ("1.3.6.1.2.1.31.1.1.1.3", "u32", 'rx_broadcast_32'),
+    ("1.3.6.1.2.1.31.1.1.1.4", "u32", 'tx_multicast_32'),
+    ("1.3.6.1.2.1.31.1.1.1.5", "u32", 'tx_broadcast_32'),
+    # 64-bit counters
+    ("1.3.6.1.2.1.31.1.1.1.6", "u64", 'rx_octets'),
+    ("1.3.6.1.2.1.31.1.1.1.7", "u64", 'rx_packets'),
+    ("1.3.6.1.2.1.31.1.1.1.8", "u64", 'rx_multicast'),
+    ("1.3.6.1.2.1.31.1.1.1.9", "u64", 'rx_broadcast'),
+    ("1.3.6.1.2.1.31.1.1.1.10", "u64", 'tx_octets'),
+    ("1.3.6.1.2.1.31.1.1.1.11", "u64", 'tx_packets'),
+    ("1.3.6.1.2.1.31.1.1.1.12", "u64", 'tx_multicast'),
+    ("1.3.6.1.2.1.31.1.1.1.13", "u64", 'tx_broadcast'),
+    ("1.3.6.1.2.1.31.1.1.1.15", "gauge32", 'high_speed'),
+    ("1.3.6.1.2.1.31.1.1.1.16", "int", 'promiscuous'),
+    ("1.3.6.1.2.1.31.1.1.1.17", "int", 'connector'),
+    ("1.3.6.1.2.1.31.1.1.1.18", "str", 'name'),  # ifAlias
+    ("1.3.6.1.2.1.31.1.1.1.19", "ticks", 'discontinuity'),
+]
+
+
+class SNMPAgent(CollectorAgentMixin, agentx.Agent):
     """
     SNMP Agent that responds to SNMP queries
     Uses pyagentx for AgentX protocol
     """
     
-    def __init__(self, collector, config=None, *args, **kwargs):
+    def __init__(self, collector, config=None, ifindex=None, *args, **kwargs):
         self.logger = logging.getLogger("SNMPAgent")
         self.collector = collector
         self.config = config or {}
+        self.ifindex = ifindex or IfIndexAllocator(path=None)
         super().__init__(*args, **kwargs)
+        
+        self.setup_interfaces()
     
     def setup(self):
         """Setup SNMP OID registrations"""
@@ -335,88 +496,63 @@ class SNMPAgent(agentx.Agent):
         
         try:
             data = self.collector.get_data()
+            if data['update_count'] == 0:
+                self.logger.debug("No data collected yet")
+                return False
+            if self.linktraps:
+                self.linktraps.tick()
+            # The stages of the collection this refresh serves
+            self.timings.add(data['timings'])
             interfaces = data['interfaces']
             iface_stats = data['iface_stats']
             iface_names = list(iface_stats.keys())
             
             self.logger.debug(f"Updating SNMP data for {len(iface_names)} interfaces")
             
-            # Build MIB data for each interface
-            for idx, ifname in enumerate(iface_names, start=1000):
+            # Interface index in SNMP, stable across restarts and churn
+            t = time.time()
+            rows = self.ifindex.assign(iface_names, interfaces)
+            self.ifstatus.sync(iface_names, interfaces, data['vpp_instance'])
+            t = self.timings.stage("ifindex", t)
+            events = self.ifstatus.events
+            status_values = ([], [], [])
+            
+            records = []
+            
+            # Gather MIB data for each interface
+            for ifname, idx in zip(iface_names, rows):
+                if idx is None:
+                    continue
                 stats = iface_stats.get(ifname, {})
                 iface = interfaces.get(ifname)
-                
-                # Get interface properties
-                mtu = iface.mtu[0] if iface else 0
-                admin_status = 1 if (iface and int(iface.flags) & 1) else 2
-                oper_status = 1 if (iface and int(iface.flags) & 2) else 2
-                mac = str(iface.l2_address) if iface else "00:00:00:00:00:00"
+                admin_status, oper_status = self.ifstatus.status(ifname) or (2, 2)
                 
                 # Get speed with bonding interface support
                 speed_kbps = get_interface_speed(ifname, interfaces, self.logger)
                 speed_bps = speed_kbps * 1000
-                if speed_bps >= 2 ** 32:
-                    speed_32 = 2 ** 32 - 1
-                else:
-                    speed_32 = speed_bps
-                
-                # Set interface table OIDs (ifTable - 1.3.6.1.2.1.2.2.1)
-                ds.set(f"1.3.6.1.2.1.2.2.1.1.{idx}", "int", idx)
-                ds.set(f"1.3.6.1.2.1.2.2.1.2.{idx}", "str", ifname)
-                
-                # Interface type
-                if ifname.startswith("loop"):
-                    ds.set(f"1.3.6.1.2.1.2.2.1.3.{idx}", "int", 24)  # softwareLoopback
-                else:
-                    ds.set(f"1.3.6.1.2.1.2.2.1.3.{idx}", "int", 6)  # ethernet-csmacd
-                
-                ds.set(f"1.3.6.1.2.1.2.2.1.4.{idx}", "int", mtu)
-                ds.set(f"1.3.6.1.2.1.2.2.1.5.{idx}", "gauge32", int(speed_32))
-                ds.set(f"1.3.6.1.2.1.2.2.1.6.{idx}", "str", mac)
-                ds.set(f"1.3.6.1.2.1.2.2.1.7.{idx}", "int", admin_status)
-                ds.set(f"1.3.6.1.2.1.2.2.1.8.{idx}", "int", oper_status)
-                ds.set(f"1.3.6.1.2.1.2.2.1.9.{idx}", "ticks", 0)
-                
-                # RX stats (32-bit)
-                ds.set(f"1.3.6.1.2.1.2.2.1.10.{idx}", "u32", int(stats.get('rx_octets', 0) % 2**32))
-                ds.set(f"1.3.6.1.2.1.2.2.1.11.{idx}", "u32", int(stats.get('rx_packets', 0) % 2**32))
-                ds.set(f"1.3.6.1.2.1.2.2.1.12.{idx}", "u32", int(stats.get('rx_multicast', 0) % 2**32))
-                ds.set(f"1.3.6.1.2.1.2.2.1.13.{idx}", "u32", int(stats.get('rx_no_buf', 0) % 2**32))
-                ds.set(f"1.3.6.1.2.1.2.2.1.14.{idx}", "u32", int(stats.get('rx_errors', 0) % 2**32))
-                
-                # TX stats (32-bit)
-                ds.set(f"1.3.6.1.2.1.2.2.1.16.{idx}", "u32", int(stats.get('tx_octets', 0) % 2**32))
-                ds.set(f"1.3.6.1.2.1.2.2.1.17.{idx}", "u32", int(stats.get('tx_packets', 0) % 2**32))
-                ds.set(f"1.3.6.1.2.1.2.2.1.18.{idx}", "u32", int(stats.get('tx_multicast', 0) % 2**32))
-                ds.set(f"1.3.6.1.2.1.2.2.1.19.{idx}", "u32", int(stats.get('drops', 0) % 2**32))
-                ds.set(f"1.3.6.1.2.1.2.2.1.20.{idx}", "u32", int(stats.get('tx_errors', 0) % 2**32))
                 
-                # Set ifXTable OIDs (1.3.6.1.2.1.31.1.1.1)
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.1.{idx}", "str", ifname)
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.2.{idx}", "u32", int(stats.get('rx_multicast', 0) % 2**32))
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.3.{idx}", "u32", int(stats.get('rx_broadcast', 0) % 2**32))
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.4.{idx}", "u32", int(stats.get('tx_multicast', 0) % 2**32))
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.5.{idx}", "u32", int(stats.get('tx_broadcast', 0) % 2**32))
-                
-                # 64-bit counters
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.6.{idx}", "u64", int(stats.get('rx_octets', 0)))
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.7.{idx}", "u64", int(stats.get('rx_packets', 0)))
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.8.{idx}", "u64", int(stats.get('rx_multicast', 0)))
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.9.{idx}", "u64", int(stats.get('rx_broadcast', 0)))
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.10.{idx}", "u64", int(stats.get('tx_octets', 0)))
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.11.{idx}", "u64", int(stats.get('tx_packets', 0)))
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.12.{idx}", "u64", int(stats.get('tx_multicast', 0)))
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.13.{idx}", "u64", int(stats.get('tx_broadcast', 0)))
-                
-                # Speed in Mbps for ifXTable
-                speed_mbps = int(speed_kbps / 1000)
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.15.{idx}", "gauge32", speed_mbps)
-                
-                # Other ifXTable OIDs
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.16.{idx}", "int", 2)  # promiscuousMode: false
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.17.{idx}", "int", 1)  # connectionless: true
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.18.{idx}", "str", ifname)  # ifAlias
-                ds.set(f"1.3.6.1.2.1.31.1.1.1.19.{idx}", "ticks", 0)  # ifCounterDiscontinuityTime
+                record = {
+                    'index': idx,
+                    'name': ifname,
+                    # softwareLoopback or ethernet-csmacd
+                    'type': 24 if ifname.startswith("loop") else 6,
+                    'mtu': iface.mtu[0] if iface else 0,
+                    'speed_32': int(min(speed_bps, 2 ** 32 - 1)),
+                    'mac': str(iface.l2_address) if iface else "00:00:00:00:00:00",
+                    # Speed in Mbps for ifXTable
+                    'high_speed': int(speed_kbps / 1000),
+                    'promiscuous': 2,  # promiscuousMode: false
+                    'connector': 1,  # connectionless: true
+                    'discontinuity': self.ifstatus.discontinuity(ifname),
+                }
+                for key in COUNTER_KEYS:
+                    value = int(stats.get(key, 0))
+                    record[key] = value
+                    record[f"{key}_32"] = value % 2 ** 32
+                records.append(record)
+                status_values[0].append(admin_status)
+                status_values[1].append(oper_status)
+                status_values[2].append(self.ifstatus.last_change(ifname))
                 
                 self.logger.debug(
                     f"Interface {ifname}: speed={speed_kbps}Kbps, "
@@ -424,6 +560,15 @@ class SNMPAgent(agentx.Agent):
                     f"tx_pkts={stats.get('tx_packets', 0)}"
                 )
             
+            # Add the OIDs in order, so serving them needs no sort; the
+            # status columns as slots, for status_changed() to overwrite
+            records.sort(key=lambda record: record['index'])
+            ds.extend(column_entries(IF_COLUMNS, records))
+            self.add_status_columns(ds, iface_names, rows, status_values, events)
+            ds.extend(column_entries(IF_COUNTER_COLUMNS, records))
+            ds.extend(column_entries(IFX_COLUMNS, records))
+            self.timings.stage("format", t)
+            
             return ds
             
         except Exception as e:
@@ -445,34 +590,7 @@ def main():
         description="VPP SNMP Agent V2",
         formatter_class=argparse.RawTextHelpFormatter
     )
-    parser.add_argument(
-        "-p", "--period",
-        type=int,
-        default=5,
-        help="Polling period in seconds (default: 5)"
-    )
-    parser.add_argument(
-        "-t", "--timeout",
-        type=int,
-        default=5,
-        help="VPP API timeout in seconds (default: 5)"
-    )
-    parser.add_argument(
-        "-a", "--address",
-        type=str,
-        default="localhost:705",
-        help="SNMP agent socket address (default: localhost:705)"
-    )
-    parser.add_argument(
-        "-c", "--config",
-        type=str,
-        help="Configuration YAML file"
-    )
-    parser.add_argument(
-        "-d", "--debug",
-        action="store_true",
-        help="Enable debug logging"
-    )
+    add_arguments(parser)
     parser.add_argument(
         "-dd", "--debug-agent",
         action="store_true",
@@ -499,7 +617,9 @@ def main():
             logger.error(f"Could not load config: {e}")
     
     # Create collector
-    collector = VPPDataCollector(poll_interval=args.period, timeout=args.timeout)
+    collector = VPPDataCollector(poll_interval=args.period, timeout=args.timeout,
+                                 idle_timeout=args.idle_timeout,
+                                 snapshot_path=args.snapshot_file)
     
     # Handle signals
     def signal_handler(sig, frame):
@@ -514,28 +634,38 @@ def main():
     # Start collector
     collector.start()
     
-    # Wait for data
-    logger.info("Waiting for first data update...")
-    for i in range(30):
-        data = collector.get_data()
-        if data['update_count'] > 0:
-            logger.info(f"Successfully collected data ({data['update_count']} updates so far)")
-            break
-        time.sleep(1)
+    agent = SNMPAgent(
+        collector=collector,
+        config=config,
+        ifindex=IfIndexAllocator(path=args.ifindex_file or None, mode=args.ifindex_mode),
+        server_address=args.address,
+        period=args.period,
+        deadline=args.deadline,
+        state_file=args.state_file,
+        arena=args.arena
+    )
+    # Log the timings of the last refreshes
+    signal.signal(signal.SIGUSR1, lambda sig, frame: agent.dump_timings())
+    
+    # Wait for data, unless there is a saved dataset to serve meanwhile
+    if agent.warm_start():
+        logger.info("Serving saved data until the collector is ready")
     else:
-        logger.error("Could not get data from VPP, exiting")
-        collector.stop()
-        sys.exit(1)
+        logger.info("Waiting for first data update...")
+        for i in range(30):
+            data = collector.get_data()
+            if data['update_count'] > 0:
+                logger.info(f"Successfully collected data ({data['update_count']} updates so far)")
+                break
+            time.sleep(1)
+        else:
+            logger.error("Could not get data from VPP, exiting")
+            collector.stop()
+            sys.exit(1)
     
-    # Create and start SNMP agent
+    # Start SNMP agent
     logger.info(f"Starting SNMP agent on {args.address}")
     try:
-        agent = SNMPAgent(
-            collector=collector,
-            config=config,
-            server_address=args.address,
-            period=args.period
-        )
         agent.run()
     except Exception as e:
         logger.error(f"SNMP agent error: {e}", exc_info=True)
@@ -0,0 +1,90 @@
+import os
+import sys
+
+import pytest
+
+# The agent's modules live at the top of the tree, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import agentx  # noqa: E402
+from agentx.agent import Agent  # noqa: E402
+from agentx.pdu import PDU  # noqa: E402
+from agentx.shm import SnapshotAgent, SnapshotWriter  # noqa: E402
+
+IFX_ENTRY = (1, 3, 6, 1, 2, 1, 31, 1, 1, 1)
+ROWS = range(1, 41)
+
+
+def decoded(varbind):
+    """(name, value) of an entry, or of an encoded varbind as sent"""
+    if not isinstance(varbind, (bytes, memoryview)):
+        return varbind["name"], varbind["value"]
+    pdu = PDU()
+    pdu.decode_buf = bytes(varbind)
+    varbind = pdu.decode_value()
+    if isinstance(varbind["data"], bytes):
+        return varbind["name"], varbind["data"].decode()
+    return varbind["name"], varbind["data"]
+
+
+class CounterAgent(Agent):
+    """Overwrites two counter columns in place, with the poll number"""
+
+    def __init__(self, **kwargs):
+        super(CounterAgent, self).__init__(**kwargs)
+        self.ds = agentx.DataSet()
+        self.slots = self.ds.columns(
+            [(IFX_ENTRY + (6,), "u64"), (IFX_ENTRY + (10,), "u64")], ROWS
+        )
+        self.poll = 0
+
+    def update(self):
+        self.poll += 1
+        for column in range(2):
+            self.slots.set_column(column, [self.poll] * len(ROWS))
+        return self.ds
+
+
+class TableAgent(Agent):
+    """Sets the same columns in a Table"""
+
+    def __init__(self, **kwargs):
+        super(TableAgent, self).__init__(**kwargs)
+        self.table = agentx.Table(IFX_ENTRY)
+        self.table.add_column(6, "u64")
+        self.table.add_column(10, "u64")
+        self.table.set_rows(ROWS)
+        self._net.register_table(self.table)
+        self.poll = 0
+
+    def update(self):
+        self.poll += 1
+        for column in (6, 10):
+            self.table.set_column(column, [self.poll] * len(ROWS))
+        return True
+
+
+class SnapshotPublisher(object):
+    """Publishes the columns to a SnapshotAgent through shared memory"""
+
+    def __init__(self, path):
+        self.writer = SnapshotWriter(path)
+        self.source = CounterAgent()
+        self.agent = SnapshotAgent(path, [])
+        self._net = self.agent._net
+
+    def _update(self):
+        self.writer.publish(self.source.update()._data)
+        self.agent._update()
+
+
+@pytest.fixture(params=["dict", "arena", "table", "snapshot"])
+def agent(request, tmp_path):
+    if request.param == "table":
+        agent = TableAgent()
+    elif request.param == "snapshot":
+        agent = SnapshotPublisher(str(tmp_path / "snapshot"))
+    else:
+        agent = CounterAgent(arena=request.param == "arena")
+    agent._update()
+    return agent
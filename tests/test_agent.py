@@ -0,0 +1,62 @@
+from agentx.agent import AGENT_OID
+from agentx.oid import oid_tuple
+from agentx.pdu import oid_cache_info
+from agentx.shm import SnapshotAgent, SnapshotWriter, load
+
+from conftest import IFX_ENTRY, CounterAgent, SnapshotPublisher, decoded
+
+
+def get(net, oid):
+    entry = net._get(oid_tuple(AGENT_OID + oid))
+    return None if entry is None else decoded(entry)[1]
+
+
+def test_metrics_served(agent):
+    # SnapshotPublisher serves through its SnapshotAgent
+    served = getattr(agent, "agent", agent)
+    served._agentset = served._agent_dataset()
+    agent._update()
+    agent._update()
+    net = agent._net
+
+    assert get(net, ".1.2.0") == 2  # Not stale
+    assert get(net, ".2.1.1.1.5") == 0  # GETs served
+    assert get(net, ".2.3.1.0") == net.size()
+    info = oid_cache_info()
+    assert get(net, ".2.3.4.0") <= info.misses
+    assert get(net, ".2.3.5.0") <= info.maxsize
+
+    stages = [get(net, ".3.1.1.1.%d" % i) for i in range(1, 10)]
+    assert stages[:2] == ["static", "update"]
+    assert "publish" in stages
+    assert get(net, ".3.1.1.4.1") is not None  # Max of the first stage
+    counts = [get(net, ".3.2.1.1.%d" % i) for i in range(1, 3)]
+    assert "oids" in counts
+    assert get(net, ".3.2.1.2.%d" % (counts.index("oids") + 1)) == net.size()
+
+
+def test_snapshot_agent_warm_start(tmp_path):
+    state = str(tmp_path / "state")
+    publisher = SnapshotPublisher(str(tmp_path / "snapshot"))
+    publisher.agent._state_file = state
+    publisher._update()
+    publisher.agent._save()
+
+    # Restarted, before the collector process publishes
+    path = str(tmp_path / "restarted")
+    agent = SnapshotAgent(path, [], state_file=state)
+    assert agent.warm_start()
+    agent._net.set_snapshot(agent._warm)  # As run() does
+    agent._update()
+    assert decoded(agent._net._get(IFX_ENTRY + (6, 1)))[1] == 1
+    assert agent.is_stale()
+
+    source = CounterAgent()
+    source.update()
+    SnapshotWriter(path).publish(source.update()._data)
+    agent._update()
+    assert decoded(agent._net._get(IFX_ENTRY + (6, 1)))[1] == 2
+    assert agent._warm is None
+
+    agent._save()
+    assert decoded(load(state)._entry(0))[1] == 2
@@ -0,0 +1,62 @@
+import agentx
+from agentx.arena import Arena, PackedKeys
+
+from conftest import IFX_ENTRY, decoded
+
+SYS_DESCR = (1, 3, 6, 1, 2, 1, 1, 1, 0)
+KEYS = sorted(
+    [SYS_DESCR]
+    + [IFX_ENTRY + (column, row) for column in (6, 10) for row in (1, 2, 5, 1000)]
+)
+
+
+def expected_next(oid, include=False):
+    for pos, key in enumerate(KEYS):
+        if key > oid or (include and key == oid):
+            return pos
+    return None
+
+
+def test_packed_keys():
+    keys = PackedKeys(KEYS)
+    assert len(keys) == len(KEYS)
+    assert [keys.oid(pos) for pos in range(len(KEYS))] == KEYS
+    for pos, key in enumerate(KEYS):
+        assert keys.find(key) == pos
+
+    probes = KEYS + [
+        (1,),
+        (1, 3, 6, 1, 2, 1, 1),
+        IFX_ENTRY,
+        IFX_ENTRY + (6,),
+        IFX_ENTRY + (6, 3),
+        IFX_ENTRY + (6, 2, 1),
+        IFX_ENTRY + (7,),
+        IFX_ENTRY + (10, 1001),
+        (2,),
+    ]
+    for oid in probes:
+        if oid not in KEYS:
+            assert keys.find(oid) is None
+        assert keys.find(oid, next=True) == expected_next(oid)
+        assert keys.find(oid, next=True, include=True) == expected_next(oid, True)
+
+
+def test_arena_serves_encoded_varbinds():
+    data = {key: {"name": key, "type": agentx.TYPE_COUNTER64, "value": key[-1]} for key in KEYS}
+    data[SYS_DESCR] = {"name": SYS_DESCR, "type": agentx.TYPE_OCTETSTRING, "value": "vpp"}
+    arena = Arena(data, KEYS)
+    assert len(arena) == len(KEYS)
+    assert decoded(arena.varbind(arena.find(SYS_DESCR))) == (SYS_DESCR, "vpp")
+    pos = arena.find_next(IFX_ENTRY + (6, 2))
+    assert decoded(arena.varbind(pos)) == (IFX_ENTRY + (6, 5), 5)
+    assert arena.find_next(IFX_ENTRY + (10, 1000)) is None
+
+    # Rebuilt for the same keys, with new values
+    for key in KEYS[1:]:
+        data[key] = dict(data[key], value=data[key]["value"] + 1)
+    rebuilt = Arena(data, KEYS, previous=arena)
+    assert rebuilt.keys is arena.keys
+    assert [decoded(rebuilt.varbind(pos)) for pos in range(len(KEYS))] == [
+        (key, data[key]["value"]) for key in KEYS
+    ]
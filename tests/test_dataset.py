@@ -0,0 +1,39 @@
+import agentx
+from agentx.dataset import merged
+
+IFX_ENTRY = "1.3.6.1.2.1.31.1.1.1"
+
+
+def layer(columns, rows=range(1, 4), value=0):
+    ds = agentx.DataSet()
+    ds.extend(
+        ("%s.%d.%d" % (IFX_ENTRY, column, row), "int", value)
+        for column in columns
+        for row in rows
+    )
+    return ds
+
+
+def test_merged_interleaving_layers_in_order():
+    static = layer([1, 15, 19])
+    counters = layer(range(6, 14))
+    data, keys = merged([static, None, counters])
+    assert keys == sorted(data)
+    assert len(keys) == len(data) == 3 * 11
+
+
+def test_merged_later_layer_wins():
+    first = layer([1, 2], value=1)
+    second = layer([2, 3], value=2)
+    data, keys = merged([first, second])
+    assert keys == sorted(data)
+    assert [data[key].value for key in keys] == [1] * 3 + [2] * 6
+
+
+def test_merged_unordered():
+    ds = agentx.DataSet()
+    ds.set(IFX_ENTRY + ".2.1", "int", 0)
+    ds.set(IFX_ENTRY + ".1.1", "int", 0)
+    data, keys = merged([ds, layer([3])])
+    assert keys is None
+    assert len(data) == 5
@@ -0,0 +1,64 @@
+from collections import namedtuple
+
+import agentx
+from agentx.agent import Agent
+from ifagent import CollectorAgentMixin
+from ifstatus import DOWN, UP
+
+Iface = namedtuple("Iface", "sw_if_index flags")
+Event = namedtuple("Event", "sw_if_index flags deleted")
+IF_OPER_STATUS = (1, 3, 6, 1, 2, 1, 2, 2, 1, 8)
+
+
+class Collector(object):
+    on_interface_event = None
+    on_api_connect = None
+
+    def __init__(self):
+        self.touched = []
+
+    def touch(self, deadline=None):
+        self.touched.append(deadline)
+        return True
+
+
+class InterfaceAgent(CollectorAgentMixin, Agent):
+    def __init__(self, **kwargs):
+        super(InterfaceAgent, self).__init__(**kwargs)
+        self.collector = Collector()
+        self.config = None
+        self.setup_interfaces()
+        self.updates = 0
+
+    def _update(self):
+        self.updates += 1
+
+
+def test_events_overwrite_status_columns():
+    agent = InterfaceAgent()
+    assert agent.collector.on_interface_event == agent.interface_event
+    names = ["eth0", "eth1", "eth2"]
+    agent.ifstatus.sync(names, {"eth0": Iface(1, 1), "eth1": Iface(2, 3)})
+    events = agent.ifstatus.events
+
+    ds = agentx.DataSet()
+    agent.add_status_columns(ds, names, [1001, None, 1002], ([1, 1], [2, 1], [0, 0]), events)
+    assert agent.ifrow("eth0") == 1001
+    assert agent.ifrow("eth1") is None
+
+    agent.interface_event(Event(1, 3, False))
+    assert agent.ifstatus.status("eth0") == (UP, UP)
+    assert ds._data[IF_OPER_STATUS + (1001,)]["value"] == UP
+
+    # An event between reading the status and adding the columns
+    ds = agentx.DataSet()
+    agent.interface_event(Event(1, 1, False))
+    agent.add_status_columns(ds, names, [1001, None, 1002], ([1, 1], [1, 1], [0, 0]), events)
+    assert ds._data[IF_OPER_STATUS + (1001,)]["value"] == DOWN
+
+
+def test_request_received_refreshes_within_the_deadline():
+    agent = InterfaceAgent(deadline=0.25)
+    agent.request_received()
+    assert agent.collector.touched == [0.25]
+    assert agent.updates == 1
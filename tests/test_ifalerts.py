@@ -0,0 +1,88 @@
+from ifalerts import ALERT_CLEARED, ALERT_RAISED, COUNTERS, ErrorAlerts
+
+
+class Counter(object):
+    def __init__(self, values):
+        self.values = values
+
+    def sum_by_index(self):
+        return list(self.values)
+
+    def sum_packets_by_index(self):
+        return list(self.values)
+
+
+class Stats(object):
+    """The counter vectors of a stats segment, by COUNTERS key"""
+
+    def __init__(self, **vectors):
+        self.directory = {COUNTERS[key][0]: Counter(v) for key, v in vectors.items()}
+
+    def __getitem__(self, path):
+        return self.directory[path]
+
+
+def alerts(**config):
+    sent = []
+    rows = {"eth0": 1001, "eth1": 1002}
+    config.setdefault("min_packets", 10)
+    notifier = ErrorAlerts(lambda trap, varbinds: sent.append((trap, varbinds)), rows.get, config)
+    return notifier, sent
+
+
+def test_raise_and_clear_with_hysteresis():
+    notifier, sent = alerts(error_threshold=10)
+    names = ["eth0", "eth1"]
+    notifier.poll(Stats(rx=[0, 0], tx=[0, 0], rx_errors=[0, 0]), names)
+    assert sent == []
+
+    # 20 errors of 100 packets on eth0
+    notifier.poll(Stats(rx=[80, 100], tx=[0, 0], rx_errors=[20, 0]), names)
+    assert [trap for trap, _ in sent] == [ALERT_RAISED]
+    varbinds = sent[0][1]
+    assert varbinds[0]["value"] == 1001
+    assert varbinds[1]["value"] == "errors"
+    assert varbinds[2]["value"] == 200000
+    assert notifier.raised == {("eth0", "errors")}
+
+    # 8%: under the threshold but not under the clear threshold of 5%
+    notifier.poll(Stats(rx=[172, 200], tx=[0, 0], rx_errors=[28, 0]), names)
+    assert len(sent) == 1
+
+    # 2%
+    notifier.poll(Stats(rx=[270, 300], tx=[0, 0], rx_errors=[30, 0]), names)
+    assert [trap for trap, _ in sent] == [ALERT_RAISED, ALERT_CLEARED]
+    assert notifier.raised == set()
+
+
+def test_too_few_packets():
+    notifier, sent = alerts(error_threshold=10, min_packets=100)
+    notifier.poll(Stats(rx=[0], rx_errors=[0]), ["eth0"])
+    notifier.poll(Stats(rx=[5], rx_errors=[5]), ["eth0"])
+    assert sent == []
+
+
+def test_interfaces_lined_up_by_name():
+    notifier, sent = alerts(drop_threshold=10)
+    notifier.poll(Stats(rx=[1000, 0], drops=[0, 0]), ["eth0", "eth1"])
+
+    # eth0 deleted and eth1 moved up: compared with its own counters
+    notifier.poll(Stats(rx=[100], drops=[5]), ["eth1"])
+    assert sent == []
+    notifier.poll(Stats(rx=[200], drops=[50]), ["eth1"])
+    assert len(sent) == 1
+    assert sent[0][1][0]["value"] == 1002
+    assert sent[0][1][1]["value"] == "drops"
+
+    # A new interface in its place has no previous poll to compare with
+    notifier.poll(Stats(rx=[5000, 300], drops=[4000, 60]), ["eth0", "eth1"])
+    assert [varbinds[0]["value"] for _, varbinds in sent] == [1002]
+
+
+def test_gone_interfaces_forgotten():
+    notifier, sent = alerts(error_threshold=10)
+    notifier.poll(Stats(rx=[0], rx_errors=[0]), ["eth0"])
+    notifier.poll(Stats(rx=[50], rx_errors=[50]), ["eth0"])
+    assert notifier.raised == {("eth0", "errors")}
+    notifier.poll(Stats(rx=[0], rx_errors=[0]), ["eth1"])
+    assert notifier.raised == set()
@@ -0,0 +1,50 @@
+import os
+from collections import namedtuple
+
+import pytest
+
+from ifindex import IfIndexAllocator
+
+Iface = namedtuple("Iface", "sw_if_index")
+
+
+def test_stable_across_reload(tmp_path):
+    path = str(tmp_path / "ifindex.json")
+    allocator = IfIndexAllocator(path=path)
+    assert allocator.assign(["eth0", "eth1", "eth0", ""]) == [1000, 1001, None, None]
+
+    allocator = IfIndexAllocator(path=path)
+    assert allocator.assign(["eth1", "eth2", "eth0"]) == [1001, 1002, 1000]
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_tombstones(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("ifindex.time.time", lambda: now[0])
+    allocator = IfIndexAllocator(path=str(tmp_path / "ifindex.json"), tombstone_ttl=60)
+    allocator.assign(["eth0", "eth1"])
+
+    # Deleted, its index stays reserved and comes back with the name
+    allocator.assign(["eth1"])
+    assert allocator.assign(["eth1", "eth2"]) == [1001, 1002]
+    assert allocator.assign(["eth0", "eth1", "eth2"]) == [1000, 1001, 1002]
+
+    # Until the tombstone expires
+    allocator.assign(["eth1", "eth2"])
+    now[0] += 61
+    allocator.assign(["eth1", "eth2"])
+    assert allocator.assign(["eth0"]) == [1003]
+
+
+def test_unreadable_map(tmp_path):
+    path = tmp_path / "ifindex.json"
+    path.write_text("")
+    assert IfIndexAllocator(path=str(path)).assign(["eth0"]) == [1000]
+
+
+def test_sw_if_index_mode():
+    allocator = IfIndexAllocator(path=None, mode="sw_if_index")
+    ifaces = {"eth0": Iface(1), "eth1": Iface(1)}
+    assert allocator.assign(["eth0", "eth1", "eth2"], ifaces) == [1001, None, None]
+    with pytest.raises(ValueError):
+        IfIndexAllocator(path=None, mode="ifname")
@@ -0,0 +1,70 @@
+from collections import namedtuple
+
+import ifstatus
+from ifstatus import DOWN, UP, InterfaceStatus, LinkNotifier, flags_status
+
+Iface = namedtuple("Iface", "sw_if_index flags")
+
+
+def test_flags_status():
+    assert flags_status(0) == (DOWN, DOWN)
+    assert flags_status(ifstatus.ADMIN_UP) == (UP, DOWN)
+    assert flags_status(ifstatus.ADMIN_UP | ifstatus.LINK_UP) == (UP, UP)
+
+
+def test_sync_and_event():
+    ticks = [100]
+    status = InterfaceStatus(lambda: ticks[0])
+    changes = []
+    status.listeners.append(lambda *change: changes.append(change))
+
+    status.sync(["eth0", "eth1"], {"eth0": Iface(1, 3), "eth1": Iface(2, 1)})
+    assert status.status("eth0") == (UP, UP)
+    assert status.status("eth1") == (UP, DOWN)
+    assert changes == []
+
+    ticks[0] = 200
+    assert status.event(2, 3)
+    assert status.status("eth1") == (UP, UP)
+    assert status.last_change("eth1") == 200
+    assert changes == [("eth1", (UP, UP), (UP, DOWN))]
+
+    # A change no event was seen for
+    ticks[0] = 300
+    status.sync(["eth0", "eth1"], {"eth0": Iface(1, 1), "eth1": Iface(2, 3)})
+    assert status.status("eth0") == (UP, DOWN)
+    assert status.last_change("eth0") == 300
+    assert changes[-1] == ("eth0", (UP, DOWN), (UP, UP))
+
+
+def test_link_notifier():
+    sent = []
+    notifier = LinkNotifier(lambda trap, varbinds: sent.append((trap, varbinds)), lambda name: 7)
+    notifier.changed("eth0", (UP, DOWN), (UP, UP))
+    notifier.changed("eth0", (UP, UP), (UP, DOWN))
+    assert [trap for trap, _ in sent] == [ifstatus.LINK_DOWN_TRAP, ifstatus.LINK_UP_TRAP]
+    assert sent[0][1][2] == {"name": "%s.7" % ifstatus.IF_OPER_STATUS, "type": 2, "value": DOWN}
+
+
+def test_dump_wins_after_an_event():
+    status = InterfaceStatus(lambda: 100)
+    up = {"eth1": Iface(2, 3)}
+    status.sync(["eth1"], up)
+
+    # The first dump may predate the event, the next one wins
+    status.event(2, 1)
+    status.sync(["eth1"], up)
+    assert status.status("eth1") == (UP, DOWN)
+    status.sync(["eth1"], up)
+    assert status.status("eth1") == (UP, UP)
+
+    # Events from before a reconnect or a VPP restart don't hold up dumps
+    status.event(2, 1)
+    status.reconnected()
+    status.sync(["eth1"], up)
+    assert status.status("eth1") == (UP, UP)
+    status.event(2, 1)
+    status.sync(["eth1"], up, instance=1)
+    status.event(2, 1)
+    status.sync(["eth1"], up, instance=2)
+    assert status.status("eth1") == (UP, UP)
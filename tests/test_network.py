@@ -0,0 +1,105 @@
+import socket
+import struct
+
+import agentx
+from agentx.network import Network
+from agentx.pdu import PDU
+
+from conftest import IFX_ENTRY
+
+
+class FakeSocket(object):
+    """Hands out reads as given, keeps what is sent"""
+
+    def __init__(self, reads):
+        self.reads = list(reads)
+        self.sent = []
+
+    def settimeout(self, timeout):
+        pass
+
+    def recv(self, size):
+        if not self.reads:
+            raise socket.timeout()
+        return self.reads.pop(0)
+
+    def send(self, buf):
+        self.sent.append(buf)
+
+
+def served(reads, data, tables=()):
+    net = Network()
+    net.update(data)
+    for table in tables:
+        net.register_table(table)
+    net.socket = FakeSocket(reads)
+    net._connected = True
+    for _ in reads:
+        net.run()
+    return net.socket.sent
+
+
+def request(pdu_type, packet_id, *oids):
+    pdu = PDU(pdu_type)
+    pdu.packet_id = packet_id
+    body = b"".join(pdu.encode_oid(oid) + pdu.encode_oid(()) for oid in oids)
+    return pdu.encode_header(pdu_type, len(body)) + body
+
+
+def ack(packet_id):
+    pdu = PDU(agentx.AGENTX_RESPONSE_PDU)
+    pdu.packet_id = packet_id
+    return pdu.encode()
+
+
+def response(buf):
+    pdu = PDU()
+    pdu.decode(buf)
+    return pdu.packet_id, [(value["name"], value["data"]) for value in pdu.values]
+
+
+def test_requests_after_notify_acks():
+    oid = IFX_ENTRY + (6, 1)
+    data = {oid: {"name": oid, "type": agentx.TYPE_COUNTER64, "value": 5}}
+    get = request(agentx.AGENTX_GET_PDU, 3, oid)
+    getnext = request(agentx.AGENTX_GETNEXT_PDU, 4, IFX_ENTRY)
+
+    # Acks and a GET in one read, then a GETNEXT split across two
+    sent = served([ack(1) + ack(2) + get + getnext[:7], getnext[7:]], data)
+    assert [response(buf) for buf in sent] == [(3, [(oid, 5)]), (4, [(oid, 5)])]
+
+
+def test_malformed_request():
+    oid = IFX_ENTRY + (6, 1)
+    data = {oid: {"name": oid, "type": agentx.TYPE_COUNTER64, "value": 5}}
+    pdu = PDU(agentx.AGENTX_GET_PDU)
+    pdu.packet_id = 3
+    # 200 sub-ids, where an OID has at most 128
+    body = struct.pack("BBBB", 200, 0, 0, 0) + b"\0" * 800
+    get = pdu.encode_header(agentx.AGENTX_GET_PDU, len(body)) + body
+
+    sent = served([get, request(agentx.AGENTX_GET_PDU, 4, oid)], data)
+    errors = []
+    for buf in sent:
+        pdu = PDU()
+        pdu.decode(buf)
+        errors.append((pdu.packet_id, pdu.response["error"]))
+    assert errors == [(3, agentx.ERROR_PARSEERROR), (4, 0)]
+
+
+def test_get_many():
+    oid = IFX_ENTRY + (6, 1)
+    data = {oid: {"name": oid, "type": agentx.TYPE_COUNTER64, "value": 5}}
+    table = agentx.Table(IFX_ENTRY)
+    table.add_column(10, "u64", lambda: [7, 8])
+    table.set_rows([1, 2])
+    missing = IFX_ENTRY + (6, 2)
+    get = request(
+        agentx.AGENTX_GET_PDU, 3, IFX_ENTRY + (10, 2), missing, oid, IFX_ENTRY + (10, 1)
+    )
+
+    # One response with the varbinds in the order asked
+    sent = served([get], data, [table])
+    assert [response(buf) for buf in sent] == [
+        (3, [(IFX_ENTRY + (10, 2), 8), (missing, None), (oid, 5), (IFX_ENTRY + (10, 1), 7)])
+    ]
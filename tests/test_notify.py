@@ -0,0 +1,71 @@
+import agentx
+from agentx import notify
+from agentx.agent import Agent
+from agentx.notify import SNMP_TRAP_OID, TokenBucket
+from agentx.pdu import PDU
+
+from test_network import FakeSocket
+
+LINK_DOWN = "1.3.6.1.6.3.1.1.5.3"
+IF_INDEX = "1.3.6.1.2.1.2.2.1.1.7"
+
+
+def notifications(sent):
+    """(pdu type, [(name, value)]) of the PDUs sent"""
+    pdus = []
+    for buf in sent:
+        pdu = PDU()
+        pdu.set_decode_buf(buf)
+        header = pdu.decode_header()
+        values = []
+        while len(pdu.decode_buf):
+            value = pdu.decode_value()
+            values.append((value["name"], value["data"]))
+        pdus.append((header["pdu_type"], values))
+    return pdus
+
+
+def test_token_bucket(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(notify.time, "monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+    now[0] += 0.5
+    assert [bucket.take() for _ in range(2)] == [True, False]
+
+    # Tokens don't pile up beyond the burst
+    now[0] += 60
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+
+
+def test_notify_sent_from_run():
+    agent = Agent()
+    net = agent._net
+    assert not agent.notify(LINK_DOWN)
+
+    net.socket = FakeSocket([])
+    net._connected = True
+    varbind = {"name": IF_INDEX, "type": agentx.TYPE_INTEGER, "value": 7}
+    assert agent.notify(LINK_DOWN, [varbind])
+    assert net.socket.sent == []
+
+    net.run()
+    trap_oid = tuple(int(i) for i in SNMP_TRAP_OID.split("."))
+    assert notifications(net.socket.sent) == [
+        (
+            agentx.AGENTX_NOTIFY_PDU,
+            [
+                (trap_oid, tuple(int(i) for i in LINK_DOWN.split("."))),
+                (tuple(int(i) for i in IF_INDEX.split(".")), 7),
+            ],
+        )
+    ]
+
+
+def test_notify_rate_limit():
+    agent = Agent()
+    agent._net.socket = FakeSocket([])
+    agent._net._connected = True
+    agent.limit_notifications(0.001, 2)
+    assert [agent.notify(LINK_DOWN) for _ in range(3)] == [True, True, False]
+    assert len(agent._net.notifications) == 2
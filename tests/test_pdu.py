@@ -0,0 +1,26 @@
+import agentx
+from agentx import pdu
+from agentx.arena import Arena
+from agentx.pdu import PDU, oid_cache_info, size_oid_cache
+
+
+def test_size_oid_cache(monkeypatch):
+    monkeypatch.setattr(pdu, "_encode_oid", pdu._encode_oid)
+    monkeypatch.setattr(pdu, "_retired", pdu._retired)
+    PDU().encode_oid((1, 3, 6, 1, 2, 1, 1))
+    before = oid_cache_info()
+
+    size_oid_cache(before.maxsize)
+    assert oid_cache_info() == before
+    size_oid_cache(before.maxsize + 1)
+    after = oid_cache_info()
+    assert after.maxsize == 2 * before.maxsize
+    assert (after.hits, after.misses, after.currsize) == (before.hits, before.misses, 0)
+
+
+def test_arena_leaves_the_cache_alone():
+    key = (1, 3, 6, 1, 4, 1, 99, 1, 1)
+    data = {key: {"name": key, "type": agentx.TYPE_INTEGER, "value": 1}}
+    before = oid_cache_info()
+    Arena(data, [key])
+    assert oid_cache_info() == before
@@ -0,0 +1,43 @@
+from collections import namedtuple
+
+import pytest
+
+pytest.importorskip("vpp_papi")
+
+import snmp_agent_v2  # noqa: E402
+from ifindex import IfIndexAllocator  # noqa: E402
+
+Iface = namedtuple(
+    "Iface",
+    "sw_if_index flags mtu l2_address link_speed interface_dev_type sup_sw_if_index",
+)
+NAMES = ["eth%d" % i for i in range(12)] + ["loop0"]
+
+
+class Collector(object):
+    def get_data(self):
+        interfaces = {
+            name: Iface(i + 1, 3, [9000], "aa:bb", 10000000, "eth", i + 1)
+            for i, name in enumerate(NAMES)
+        }
+        stats = {name: {"rx_octets": 2 ** 32 + i} for i, name in enumerate(NAMES)}
+        return {
+            "update_count": 1,
+            "timings": None,
+            "interfaces": interfaces,
+            "iface_stats": stats,
+            "vpp_instance": 1,
+        }
+
+
+def test_dataset_in_oid_order():
+    agent = snmp_agent_v2.SNMPAgent(
+        Collector(), ifindex=IfIndexAllocator(path=None, mode="sw_if_index")
+    )
+    agent.timings.add = lambda timings: None
+    ds = agent.update()
+    assert ds._ordered
+    assert len(ds) == 37 * len(NAMES)
+    assert ds.get("1.3.6.1.2.1.2.2.1.10.1010")["value"] == 9  # ifInOctets wraps
+    assert ds.get("1.3.6.1.2.1.31.1.1.1.6.1010")["value"] == 2 ** 32 + 9
+    assert ds.get("1.3.6.1.2.1.2.2.1.8.1001")["value"] == 1  # ifOperStatus
@@ -0,0 +1,80 @@
+import agentx
+
+IF_ENTRY = (1, 3, 6, 1, 2, 1, 2, 2, 1)
+
+
+def table():
+    t = agentx.Table(IF_ENTRY)
+    t.add_column(2, "str")
+    t.add_column(10, "u32")
+    t.replace([5, 3], {2: ["eth5", "eth3"]})
+    t.set_column(10, [50, 30])
+    return t
+
+
+def test_replace_keeps_other_columns_by_row():
+    t = table()
+    t.replace([3, None, 7], {2: ["eth3", "gone", "eth7"]})
+    assert t.rows == [3, 7]
+    assert t.get(IF_ENTRY + (2, 3))["value"] == "eth3"
+    assert t.get(IF_ENTRY + (10, 3))["value"] == 30
+    assert t.get(IF_ENTRY + (10, 7))["value"] == 0
+    assert t.get(IF_ENTRY + (10, 5)) is None
+    assert [e["value"] for e in t.items()] == ["eth3", "eth7", 30, 0]
+
+
+def test_replace_is_one_swap():
+    t = table()
+    layout = t._layout
+    t.replace([7, 5], {2: ["eth7", "eth5"], 10: [70, 50]})
+    # A reader holding the layout from before still sees it whole
+    assert layout.rows == [3, 5]
+    assert layout.columns[2][1] == ["eth5", "eth3"]
+    assert t.get_next(IF_ENTRY + (2, 5))["value"] == "eth7"
+    assert t.get_many([IF_ENTRY + (10, 7), IF_ENTRY + (10, 3)])[0]["value"] == 70
+
+
+def test_get_next():
+    t = table()
+    assert t.get_next(IF_ENTRY)["name"] == IF_ENTRY + (2, 3)
+    assert t.get_next(IF_ENTRY + (2, 3))["name"] == IF_ENTRY + (2, 5)
+    assert t.get_next(IF_ENTRY + (2, 3), include=True)["name"] == IF_ENTRY + (2, 3)
+    assert t.get_next(IF_ENTRY + (2, 5))["name"] == IF_ENTRY + (10, 3)
+    assert t.get_next(IF_ENTRY + (4,))["name"] == IF_ENTRY + (10, 3)
+    assert t.get_next(IF_ENTRY + (10, 5)) is None
+    assert t.get_next(IF_ENTRY[:-1] + (2,)) is None
+
+
+def test_get_next_skips_missing_values():
+    t = table()
+    # A query-time column whose read failed, and one short of a row
+    t.add_column(3, "u32", lambda: [])
+    t.add_column(4, "u32", lambda: [6])  # Only the row at position 0, 5
+    assert t.get_next(IF_ENTRY + (2, 5))["name"] == IF_ENTRY + (4, 5)
+    assert t.get_next(IF_ENTRY + (4, 3))["name"] == IF_ENTRY + (4, 5)
+    assert t.get_next(IF_ENTRY + (4, 5))["name"] == IF_ENTRY + (10, 3)
+    assert [e["name"][-2] for e in t.items()] == [2, 2, 4, 10, 10]
+
+
+def test_get_many_reads_columns_once():
+    t = table()
+    reads = []
+
+    def mtu():
+        reads.append(1)
+        return [1500]  # Only the row at position 0, 5
+
+    t.add_column(4, "u32", mtu)
+    entries = t.get_many(
+        [
+            IF_ENTRY + (4, 3),
+            IF_ENTRY + (4, 5),
+            IF_ENTRY + (2, 3),
+            IF_ENTRY + (4, 7),
+            IF_ENTRY + (9, 3),
+            IF_ENTRY + (2,),
+            IF_ENTRY[:-1] + (3, 2, 3),
+        ]
+    )
+    assert [e and e["value"] for e in entries] == [None, 1500, "eth3", None, None, None, None]
+    assert reads == [1]
@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+pytest.importorskip("vpp_papi")
+
+from vppapi import VPPMetadataFetcher  # noqa: E402
+
+
+class Blocked(object):
+    """A request that runs until released, counting its calls"""
+
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+        self.release = threading.Event()
+
+    def __call__(self, *args):
+        self.calls += 1
+        self.release.wait(5)
+        return self.result
+
+
+@pytest.fixture
+def fetcher(monkeypatch):
+    requests = dict(VPPMetadataFetcher.REQUESTS)
+    requests["ifaces"] = lambda client: {"eth0": 1}
+    requests["lcp"] = Blocked({"lcp": 1})
+    monkeypatch.setattr(VPPMetadataFetcher, "REQUESTS", requests)
+    fetcher = VPPMetadataFetcher(kinds=("ifaces", "lcp"), deadline=0.05)
+    yield fetcher
+    requests["lcp"].release.set()
+    fetcher.disconnect()
+
+
+def test_late_kinds(fetcher):
+    lcp = fetcher.REQUESTS["lcp"]
+    assert fetcher.fetch() == {"ifaces": {"eth0": 1}, "lcp": {}}
+    assert fetcher.late == ["lcp"]
+    assert "ifaces" in fetcher.durations
+
+    # Not issued again while in flight, then picked up once it completes
+    assert fetcher.fetch()["lcp"] == {}
+    assert lcp.calls == 1
+    lcp.release.set()
+    assert fetcher.fetch(deadline=1)["lcp"] == {"lcp": 1}
+    assert fetcher.late == []
+    assert lcp.calls == 1
+
+
+def test_ping_has_its_own_connection(fetcher):
+    ping = fetcher._pinger.ping = Blocked(True)
+    assert not fetcher.ping()
+    assert not fetcher.ping()
+    assert ping.calls == 1
+    ping.release.set()
+    assert fetcher.ping(deadline=1)
+    assert ping.calls == 1
+
+
+def test_nothing_issued_while_connecting(fetcher):
+    fetcher.REQUESTS["lcp"].release.set()
+    connect = fetcher.clients["ifaces"].connect = Blocked(True)
+    fetcher.clients["lcp"].connect = lambda: True
+    assert not fetcher.connect()
+    assert fetcher.fetch()["ifaces"] == {}
+    assert "ifaces" in fetcher.late
+    connect.release.set()
+    fetcher._connecting["ifaces"].result()
+    assert fetcher.fetch(deadline=1)["ifaces"] == {"eth0": 1}
+    assert connect.calls == 1
@@ -0,0 +1,82 @@
+from vppliveness import VPPLiveness
+
+
+class Stats(object):
+    def __init__(self):
+        self.connected = False
+        self.heartbeat = 1
+        self.replaced = False
+        self.connects = 0
+
+    def connect(self):
+        self.connected = True
+        self.connects += 1
+
+    def disconnect(self):
+        self.connected = False
+
+    def restarted(self):
+        return self.replaced
+
+
+class Api(object):
+    def __init__(self):
+        self.answers = True
+        self.pings = 0
+        self.connected = True
+
+    def ping(self):
+        self.pings += 1
+        return self.answers
+
+    def disconnect(self):
+        self.connected = False
+
+
+def test_heartbeat_spares_the_ping():
+    stats, api = Stats(), Api()
+    liveness = VPPLiveness(stats, api, silence=0)
+    assert liveness.check()
+    assert stats.connected
+    stats.heartbeat = 2
+    assert liveness.check()
+    assert api.pings == 0
+
+
+def test_silence_pings_vpp():
+    stats, api = Stats(), Api()
+    stats.heartbeat = None
+    liveness = VPPLiveness(stats, api, silence=0)
+    assert liveness.check()
+
+    # No heartbeat to go by: VPP answering is enough
+    assert liveness.check()
+    assert api.pings == 1
+
+    api.answers = False
+    assert not liveness.check()
+    assert not stats.connected
+    assert not api.connected
+
+
+def test_frozen_heartbeat_reconnects():
+    stats, api = Stats(), Api()
+    liveness = VPPLiveness(stats, api, silence=0)
+    assert liveness.check()
+    assert not liveness.check()
+    assert api.pings == 1
+    assert not stats.connected
+
+    # The next check reconnects
+    assert liveness.check()
+    assert stats.connects == 2
+
+
+def test_replaced_socket_reconnects():
+    stats, api = Stats(), Api()
+    liveness = VPPLiveness(stats, api)
+    assert liveness.check()
+    stats.replaced = True
+    assert not liveness.check()
+    assert api.pings == 0
+    assert not stats.connected
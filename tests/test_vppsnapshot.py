@@ -0,0 +1,56 @@
+import pytest
+
+from vppsnapshot import InterfaceSnapshotReader, InterfaceSnapshotWriter, SnapshotStats, open_stats
+
+
+def read(path):
+    reader = InterfaceSnapshotReader(path)
+    try:
+        return reader.read()
+    finally:
+        reader.close()
+
+
+def test_publish_and_read(tmp_path):
+    path = str(tmp_path / "run" / "interfaces.snapshot")
+    writer = InterfaceSnapshotWriter(path)
+    iface_stats = {
+        "local0": {"rx_packets": 0, "rx_octets": 0},
+        "eth0": {"rx_packets": 10, "rx_octets": 1500, "drops": 2},
+    }
+    writer.publish(["local0", "eth0"], iface_stats, ["/if/rx", "/if/drops"], epoch=3)
+
+    snapshot = read(path)
+    assert snapshot.epoch == 3
+    assert snapshot.names == ["local0", "eth0"]
+    assert snapshot.paths == ["/if/drops", "/if/rx"]
+    assert snapshot.counter("/if/rx", 1, "packets") == 10
+    assert snapshot.counter("/if/rx", 1, "octets") == 1500
+    assert snapshot.counter("/if/drops", 0) == 0
+    with pytest.raises(KeyError):
+        snapshot.counter("/if/tx", 1, "packets")
+
+    # Later collections replace the counters
+    generation = snapshot.generation
+    iface_stats["eth0"]["rx_packets"] = 20
+    writer.publish(["local0", "eth0"], iface_stats, ["/if/rx", "/if/drops"], epoch=3)
+    snapshot = read(path)
+    assert snapshot.counter("/if/rx", 1, "packets") == 20
+    assert snapshot.generation == generation
+    writer.close()
+
+
+def test_snapshot_stats(tmp_path):
+    path = str(tmp_path / "interfaces.snapshot")
+    writer = InterfaceSnapshotWriter(path)
+    writer.publish(["eth0"], {"eth0": {"tx_packets": 7, "tx_errors": 1}}, ["/if/tx"])
+    writer.close()
+
+    stats = open_stats(path)
+    assert isinstance(stats, SnapshotStats)
+    assert "/if/tx" in stats.directory
+    assert stats["/if/names"] == ["eth0"]
+    assert stats["/if/tx"][:, 0].sum_packets() == 7
+    assert stats["/if/tx-error"][:, 0].sum() == 1
+    with pytest.raises(KeyError):
+        stats["/if/rx"]
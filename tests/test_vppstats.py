@@ -0,0 +1,62 @@
+import vppstats
+from vppstats import StatsCache
+
+
+class Counter(object):
+    def __init__(self, packets, octets):
+        self.packets = packets
+        self.octets = octets
+
+    def sum_packets_by_index(self):
+        return list(self.packets)
+
+    def sum_octets_by_index(self):
+        return list(self.octets)
+
+
+class Stats(object):
+    def __init__(self):
+        self.reads = []
+        self.counters = {"/if/rx": Counter([1, 2], [100, 2 ** 32 + 5])}
+
+    def __getitem__(self, path):
+        self.reads.append(path)
+        return self.counters[path]
+
+
+def test_one_read_per_ttl(monkeypatch):
+    now = [10.0]
+    monkeypatch.setattr(vppstats.time, "monotonic", lambda: now[0])
+    stats = Stats()
+    cache = StatsCache(stats, ttl=1.0)
+    packets = cache.provider("/if/rx", "packets")
+    octets = cache.provider("/if/rx", "octets", modulo=2 ** 32)
+
+    assert packets() == [1, 2]
+    assert octets() == [100, 5]
+    assert stats.reads == ["/if/rx"]
+
+    stats.counters["/if/rx"] = Counter([3, 4], [200, 300])
+    now[0] = 10.5
+    assert packets() == [1, 2]
+    now[0] = 11.0
+    assert packets() == [3, 4]
+    assert stats.reads == ["/if/rx", "/if/rx"]
+
+    cache.clear()
+    assert octets() == [200, 300]
+    assert len(stats.reads) == 3
+
+
+def test_last_values_when_unreadable(monkeypatch):
+    now = [10.0]
+    monkeypatch.setattr(vppstats.time, "monotonic", lambda: now[0])
+    stats = Stats()
+    cache = StatsCache(stats, ttl=1.0)
+    packets = cache.provider("/if/rx", "packets")
+    assert packets() == [1, 2]
+
+    del stats.counters["/if/rx"]
+    now[0] = 12.0
+    assert packets() == [1, 2]
+    assert cache.provider("/if/tx", "packets")() == []
@@ -0,0 +1,59 @@
+import agentx
+from agentx.network import WALK_IDLE, Network
+
+from conftest import IFX_ENTRY, ROWS, decoded
+
+END = (1, 3, 6, 1, 2, 1, 31, 1, 1, 2)
+
+
+def walk(net, steps=None, start=IFX_ENTRY, during=None):
+    """GETNEXT after GETNEXT from start, calling during() after the first few"""
+    values = []
+    oid = start
+    while steps is None or len(values) < steps:
+        entry = net._get_next(oid, END)
+        if entry is None:
+            break
+        oid, value = decoded(entry)
+        values.append(value)
+        if during is not None and len(values) == 3:
+            during()
+    return values, oid
+
+
+def test_prefetched_values_follow_writes():
+    ds = agentx.DataSet()
+    slots = ds.columns([(IFX_ENTRY + (6,), "u64")], ROWS)
+    slots.set_column(0, [1] * len(ROWS))
+    net = Network()
+    net.update(ds._data)
+
+    values, oid = walk(net, steps=3)
+    # Overwritten in place with no walk reading them
+    for pos in range(len(ROWS)):
+        slots.set_value(0, pos, 2)
+    values, _ = walk(net, start=oid)
+    assert values == [2] * (len(ROWS) - 3)
+
+
+def test_walk_reads_one_poll(agent):
+    # Refreshed in place after the walk started
+    values, _ = walk(agent._net, during=agent._update)
+    assert values == [1] * 2 * len(ROWS)
+    values, _ = walk(agent._net)
+    assert values == [2] * 2 * len(ROWS)
+
+
+def test_walks_started_between_refreshes(agent):
+    for poll in range(2, 5):
+        values, _ = walk(agent._net, during=agent._update)
+        assert values == [poll - 1] * 2 * len(ROWS)
+
+
+def test_idle_walk_reads_new_data(agent):
+    values, oid = walk(agent._net, steps=3)
+    for cursor in agent._net._walks.values():
+        cursor.used -= WALK_IDLE
+    agent._update()
+    values, _ = walk(agent._net, start=oid)
+    assert values == [2] * (2 * len(ROWS) - 3)
@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from vppstats import VPPStats
-from vppapi import VPPApi
+from vppstats import VPPStats, StatsCache
+from vppapi import VPPMetadataFetcher
+from vppliveness import VPPLiveness
+from ifindex import IfIndexAllocator, DEFAULT_PATH as IFINDEX_PATH
+from ifstatus import InterfaceStatus, LinkNotifier
+from ifalerts import ErrorAlerts
 import sys
+import signal
 import yaml
+from collections import defaultdict
 import agentx
 
 try:
@@ -118,8 +124,57 @@ def get_interface_speed(ifname, ifaces, logger=None):
     return 0
 
 
+IF_ENTRY = "1.3.6.1.2.1.2.2.1"
+IFX_ENTRY = "1.3.6.1.2.1.31.1.1.1"
+
+# Interface metadata columns, rebuilt by update_static(): (table, column, type)
+STATIC_COLUMNS = [
+    (IF_ENTRY, 1, "int"),  # ifIndex
+    (IF_ENTRY, 2, "str"),  # ifDescr
+    (IF_ENTRY, 3, "int"),  # ifType
+    (IF_ENTRY, 4, "int"),  # ifMtu
+    (IF_ENTRY, 5, "gauge32"),  # ifSpeed
+    (IF_ENTRY, 6, "str"),  # ifPhysAddress
+    (IF_ENTRY, 7, "int"),  # ifAdminStatus
+    (IF_ENTRY, 8, "int"),  # ifOperStatus
+    (IF_ENTRY, 9, "ticks"),  # ifLastChange
+    (IFX_ENTRY, 1, "str"),  # ifName
+    (IFX_ENTRY, 15, "gauge32"),  # ifHighSpeed
+    (IFX_ENTRY, 16, "int"),  # ifPromiscuousMode
+    (IFX_ENTRY, 17, "int"),  # ifConnectorPresent
+    (IFX_ENTRY, 18, "str"),  # ifAlias
+    (IFX_ENTRY, 19, "ticks"),  # ifCounterDiscontinuityTime
+]
+
+# Counter columns refreshed every period: (table, column, type, stats path, field)
+COUNTER_COLUMNS = [
+    (IF_ENTRY, 10, "u32", "/if/rx", "octets"),
+    (IF_ENTRY, 11, "u32", "/if/rx", "packets"),
+    (IF_ENTRY, 12, "u32", "/if/rx-multicast", "packets"),
+    (IF_ENTRY, 13, "u32", "/if/rx-no-buf", None),
+    (IF_ENTRY, 14, "u32", "/if/rx-error", None),
+    (IF_ENTRY, 16, "u32", "/if/tx", "octets"),
+    (IF_ENTRY, 17, "u32", "/if/tx", "packets"),
+    (IF_ENTRY, 18, "u32", "/if/tx-multicast", "packets"),
+    (IF_ENTRY, 19, "u32", "/if/drops", None),
+    (IF_ENTRY, 20, "u32", "/if/tx-error", None),
+    (IFX_ENTRY, 2, "u32", "/if/rx-multicast", "packets"),
+    (IFX_ENTRY, 3, "u32", "/if/rx-broadcast", "packets"),
+    (IFX_ENTRY, 4, "u32", "/if/tx-multicast", "packets"),
+    (IFX_ENTRY, 5, "u32", "/if/tx-broadcast", "packets"),
+    (IFX_ENTRY, 6, "u64", "/if/rx", "octets"),
+    (IFX_ENTRY, 7, "u64", "/if/rx", "packets"),
+    (IFX_ENTRY, 8, "u64", "/if/rx-multicast", "packets"),
+    (IFX_ENTRY, 9, "u64", "/if/rx-broadcast", "packets"),
+    (IFX_ENTRY, 10, "u64", "/if/tx", "octets"),
+    (IFX_ENTRY, 11, "u64", "/if/tx", "packets"),
+    (IFX_ENTRY, 12, "u64", "/if/tx-multicast", "packets"),
+    (IFX_ENTRY, 13, "u64", "/if/tx-broadcast", "packets"),
+]
+
+
 class MyAgent(agentx.Agent):
-    def setup(self):
+    def load_config(self):
         self.config = None
         if self._args.config:
             try:
@@ -130,6 +185,15 @@ class MyAgent(agentx.Agent):
             except:
                 self.logger.error("Couldn't read config from %s" % self._args.config)
 
+    def reload(self, signum=None, frame=None):
+        self.logger.info("Reloading configuration")
+        self.load_config()
+        self.invalidate_static()
+
+    def setup(self):
+        self.load_config()
+        signal.signal(signal.SIGHUP, self.reload)
+
         try:
             self.logger.info("Connecting to VPP Stats Segment")
             self.vppstat = VPPStats(socketname="/run/vpp/stats.sock", timeout=2)
@@ -139,35 +203,109 @@ class MyAgent(agentx.Agent):
             return False
 
         try:
-            self.vpp = VPPApi(clientname="vpp-snmp-agent")
+            self.vpp = VPPMetadataFetcher(
+                clientname="vpp-snmp-agent", kinds=("ifaces", "lcp")
+            )
             self.vpp.connect()
         except:
             self.logger.error("Could not connect to VPP API")
             return False
 
-        self.register("1.3.6.1.2.1.2.2.1")
-        self.register("1.3.6.1.2.1.31.1.1.1")
+        self.liveness = VPPLiveness(self.vppstat, self.vpp)
+
+        ifindex = {}
+        if self.config and "ifindex" in self.config:
+            ifindex = self.config["ifindex"]
+        self.ifindex = IfIndexAllocator(
+            path=ifindex.get("file", IFINDEX_PATH), mode=ifindex.get("mode", "name")
+        )
+        self.ifnames = []
+        self.generation = None
+
+        # Interface events update the served status right away
+        self.ifstatus = InterfaceStatus(self.sysuptime)
+        self.ifstatus.listeners.append(self.status_changed)
+        self.ifrows = {}  # interface name => ifIndex
+        self.vpp.on_event(self.interface_event)
+        self.vpp.on_connect(self.ifstatus.reconnected)
+
+        # linkUp/linkDown notifications, see snmp.traps in the config
+        self.linktraps = None
+        self.alerts = None
+        traps = {}
+        if self.config and "snmp" in self.config:
+            traps = self.config["snmp"].get("traps") or {}
+        if traps.get("enabled"):
+            self.limit_notifications(traps.get("rate", 1), traps.get("burst", 10))
+            self.linktraps = LinkNotifier(self.notify, self.ifrow, traps)
+            self.ifstatus.listeners.append(self.linktraps.changed)
+            self.alerts = ErrorAlerts(self.notify, self.ifrow, traps)
+
+        cache_ttl = 1
+        if self.config and "performance" in self.config:
+            cache_ttl = self.config["performance"].get("cache_ttl", cache_ttl)
+        self.cache = StatsCache(self.vppstat, ttl=cache_ttl)
+        self.lazy = self._args.lazy
+
+        self.iftable = agentx.Table(IF_ENTRY)
+        self.ifxtable = agentx.Table(IFX_ENTRY)
+        self.tables = {IF_ENTRY: self.iftable, IFX_ENTRY: self.ifxtable}
+        for entry, column, oid_type in STATIC_COLUMNS:
+            self.tables[entry].add_column(column, oid_type)
+        for entry, column, oid_type, path, field in COUNTER_COLUMNS:
+            values = None
+            if self.lazy:
+                # Read from the stats segment when queried
+                modulo = 2 ** 32 if oid_type == "u32" else None
+                values = self.cache.provider(path, field, modulo)
+            self.tables[entry].add_column(column, oid_type, values)
+        self.register_table(self.iftable)
+        self.register_table(self.ifxtable)
 
         return True
 
-    def update(self):
+    def ifrow(self, name):
+        """ifIndex of an interface, None if it isn't served"""
+        return self.ifrows.get(name)
+
+    def interface_event(self, event):
+        """Apply a sw_interface_event, in the VPP API event thread"""
+        self.ifstatus.event(event.sw_if_index, event.flags, event.deleted)
+
+    def status_changed(self, name, status, previous):
+        """Overwrite the served status of an interface without waiting for a rebuild"""
+        row = self.ifrows.get(name)
+        if row is None:
+            return
+        self.iftable.set_value(7, row, status[0])
+        self.iftable.set_value(8, row, status[1])
+        self.iftable.set_value(9, row, self.ifstatus.last_change(name))
+
+    def check_vpp(self):
         try:
-            self.vpp.connect()
-            r = self.vpp.vpp.api.control_ping()
-            self.logger.debug(f"VPP API: {r}")
-            self.vppstat.connect()
+            if self.liveness.check():
+                return True
         except Exception as e:
             self.logger.error(f"VPP API: {e}, retrying")
             self.vppstat.disconnect()
             self.vpp.disconnect()
+        return False
+
+    def update_static(self):
+        """Interface metadata: rebuilt on interface events and config reload"""
+        if not self.check_vpp():
             return False
 
-        ds = agentx.DataSet()
-        ifaces = self.vpp.get_ifaces()
-        lcp = self.vpp.get_lcp()
+        ifentry = defaultdict(list)
+        ifxentry = defaultdict(list)
+        generation = self.vpp.generation
+        r = self.vpp.fetch()
+        ifaces = r["ifaces"]
+        lcp = r["lcp"]
+        ifnames = self.vppstat["/if/names"]
 
         num_ifaces = len(ifaces)
-        num_vppstat = len(self.vppstat["/if/names"])
+        num_vppstat = len(ifnames)
         num_lcp = len(lcp)
         self.logger.debug(
             "Retrieved Interfaces: vppapi=%d vppstat=%d lcp=%d"
@@ -180,11 +318,14 @@ class MyAgent(agentx.Agent):
                 % (num_ifaces, num_vppstat)
             )
 
-        for i in range(len(self.vppstat["/if/names"])):
-            ifname = self.vppstat["/if/names"][i]
-            idx = 1000 + i
+        rows = self.ifindex.assign(ifnames, ifaces)
+        self.ifstatus.sync(ifnames, ifaces, self.vppstat.socket_id)
+        events = self.ifstatus.events
+        for i in range(len(ifnames)):
+            ifname = ifnames[i]
+            idx = rows[i]
 
-            ds.set("1.3.6.1.2.1.2.2.1.1.%u" % (idx), "int", idx)
+            ifentry[1].append(idx)
 
             ifName = ifname
             ifAlias = None
@@ -207,19 +348,19 @@ class MyAgent(agentx.Agent):
                 self.logger.debug("No config entry found for ifname %s" % (ifname))
                 pass
 
-            ds.set("1.3.6.1.2.1.2.2.1.2.%u" % (idx), "str", ifName)
+            ifentry[2].append(ifName)
 
             if ifname.startswith("loop"):
-                ds.set("1.3.6.1.2.1.2.2.1.3.%u" % (idx), "int", 24)  # softwareLoopback
+                ifentry[3].append(24)  # softwareLoopback
             else:
-                ds.set("1.3.6.1.2.1.2.2.1.3.%u" % (idx), "int", 6)  # ethermet-csmacd
+                ifentry[3].append(6)  # ethermet-csmacd
 
             mtu = 0
             if not ifname in ifaces:
                 self.logger.warning("Could not get MTU for interface %s", ifname)
             else:
                 mtu = ifaces[ifname].mtu[0]
-            ds.set("1.3.6.1.2.1.2.2.1.4.%u" % (idx), "int", mtu)
+            ifentry[4].append(mtu)
 
             speed = 0
             if ifname.startswith("loop") or ifname.startswith("tap"):
@@ -230,7 +371,7 @@ class MyAgent(agentx.Agent):
                 speed = get_interface_speed(ifname, ifaces, self.logger) * 1000
             if speed >= 2 ** 32:
                 speed = 2 ** 32 - 1
-            ds.set("1.3.6.1.2.1.2.2.1.5.%u" % (idx), "gauge32", speed)
+            ifentry[5].append(speed)
 
             mac = "00:00:00:00:00:00"
             if not ifname in ifaces:
@@ -239,146 +380,21 @@ class MyAgent(agentx.Agent):
                 )
             else:
                 mac = str(ifaces[ifname].l2_address)
-            ds.set("1.3.6.1.2.1.2.2.1.6.%u" % (idx), "str", mac)
+            ifentry[6].append(mac)
 
             admin_status = 3  # testing
-            if not ifname in ifaces:
-                self.logger.warning(
-                    "Could not get AdminStatus for interface %s", ifname
-                )
-            else:
-                if int(ifaces[ifname].flags) & 1:
-                    admin_status = 1  # up
-                else:
-                    admin_status = 2  # down
-            ds.set("1.3.6.1.2.1.2.2.1.7.%u" % (idx), "int", admin_status)
-
             oper_status = 3  # testing
-            if not ifname in ifaces:
-                self.logger.warning("Could not get OperStatus for interface %s", ifname)
+            status = self.ifstatus.status(ifname)
+            if status is None:
+                self.logger.warning("Could not get status for interface %s", ifname)
             else:
-                if int(ifaces[ifname].flags) & 2:
-                    oper_status = 1  # up
-                else:
-                    oper_status = 2  # down
-            ds.set("1.3.6.1.2.1.2.2.1.8.%u" % (idx), "int", oper_status)
-
-            ds.set("1.3.6.1.2.1.2.2.1.9.%u" % (idx), "ticks", 0)
-            ds.set(
-                "1.3.6.1.2.1.2.2.1.10.%u" % (idx),
-                "u32",
-                self.vppstat["/if/rx"][:, i].sum_octets() % 2 ** 32,
-            )
-            ds.set(
-                "1.3.6.1.2.1.2.2.1.11.%u" % (idx),
-                "u32",
-                self.vppstat["/if/rx"][:, i].sum_packets() % 2 ** 32,
-            )
-            ds.set(
-                "1.3.6.1.2.1.2.2.1.12.%u" % (idx),
-                "u32",
-                self.vppstat["/if/rx-multicast"][:, i].sum_packets() % 2 ** 32,
-            )
-            ds.set(
-                "1.3.6.1.2.1.2.2.1.13.%u" % (idx),
-                "u32",
-                self.vppstat["/if/rx-no-buf"][:, i].sum() % 2 ** 32,
-            )
-            ds.set(
-                "1.3.6.1.2.1.2.2.1.14.%u" % (idx),
-                "u32",
-                self.vppstat["/if/rx-error"][:, i].sum() % 2 ** 32,
-            )
-
-            ds.set(
-                "1.3.6.1.2.1.2.2.1.16.%u" % (idx),
-                "u32",
-                self.vppstat["/if/tx"][:, i].sum_octets() % 2 ** 32,
-            )
-            ds.set(
-                "1.3.6.1.2.1.2.2.1.17.%u" % (idx),
-                "u32",
-                self.vppstat["/if/tx"][:, i].sum_packets() % 2 ** 32,
-            )
-            ds.set(
-                "1.3.6.1.2.1.2.2.1.18.%u" % (idx),
-                "u32",
-                self.vppstat["/if/tx-multicast"][:, i].sum_packets() % 2 ** 32,
-            )
-            ds.set(
-                "1.3.6.1.2.1.2.2.1.19.%u" % (idx),
-                "u32",
-                self.vppstat["/if/drops"][:, i].sum() % 2 ** 32,
-            )
-            ds.set(
-                "1.3.6.1.2.1.2.2.1.20.%u" % (idx),
-                "u32",
-                self.vppstat["/if/tx-error"][:, i].sum() % 2 ** 32,
-            )
-
-            ds.set("1.3.6.1.2.1.31.1.1.1.1.%u" % (idx), "str", ifName)
-            ds.set(
-                "1.3.6.1.2.1.31.1.1.1.2.%u" % (idx),
-                "u32",
-                self.vppstat["/if/rx-multicast"][:, i].sum_packets() % 2 ** 32,
-            )
-            ds.set(
-                "1.3.6.1.2.1.31.1.1.1.3.%u" % (idx),
-                "u32",
-                self.vppstat["/if/rx-broadcast"][:, i].sum_packets() % 2 ** 32,
-            )
-            ds.set(
-                "1.3.6.1.2.1.31.1.1.1.4.%u" % (idx),
-                "u32",
-                self.vppstat["/if/tx-multicast"][:, i].sum_packets() % 2 ** 32,
-            )
-            ds.set(
-                "1.3.6.1.2.1.31.1.1.1.5.%u" % (idx),
-                "u32",
-                self.vppstat["/if/tx-broadcast"][:, i].sum_packets() % 2 ** 32,
-            )
+                admin_status, oper_status = status
+            ifentry[7].append(admin_status)
+            ifentry[8].append(oper_status)
 
-            ds.set(
-                "1.3.6.1.2.1.31.1.1.1.6.%u" % (idx),
-                "u64",
-                self.vppstat["/if/rx"][:, i].sum_octets(),
-            )
-            ds.set(
-                "1.3.6.1.2.1.31.1.1.1.7.%u" % (idx),
-                "u64",
-                self.vppstat["/if/rx"][:, i].sum_packets(),
-            )
-            ds.set(
-                "1.3.6.1.2.1.31.1.1.1.8.%u" % (idx),
-                "u64",
-                self.vppstat["/if/rx-multicast"][:, i].sum_packets(),
-            )
-            ds.set(
-                "1.3.6.1.2.1.31.1.1.1.9.%u" % (idx),
-                "u64",
-                self.vppstat["/if/rx-broadcast"][:, i].sum_packets(),
-            )
+            ifentry[9].append(self.ifstatus.last_change(ifname))
 
-            ds.set(
-                "1.3.6.1.2.1.31.1.1.1.10.%u" % (idx),
-                "u64",
-                self.vppstat["/if/tx"][:, i].sum_octets(),
-            )
-            ds.set(
-                "1.3.6.1.2.1.31.1.1.1.11.%u" % (idx),
-                "u64",
-                self.vppstat["/if/tx"][:, i].sum_packets(),
-            )
-            ds.set(
-                "1.3.6.1.2.1.31.1.1.1.12.%u" % (idx),
-                "u64",
-                self.vppstat["/if/tx-multicast"][:, i].sum_packets(),
-            )
-            ds.set(
-                "1.3.6.1.2.1.31.1.1.1.13.%u" % (idx),
-                "u64",
-                self.vppstat["/if/tx-broadcast"][:, i].sum_packets(),
-            )
+            ifxentry[1].append(ifName)
 
             speed = 0
             if ifname.startswith("loop") or ifname.startswith("tap"):
@@ -387,14 +403,10 @@ class MyAgent(agentx.Agent):
                 self.logger.warning("Could not get link speed for interface %s", ifname)
             else:
                 speed = int(get_interface_speed(ifname, ifaces, self.logger) / 1000)
-            ds.set("1.3.6.1.2.1.31.1.1.1.15.%u" % (idx), "gauge32", speed)
+            ifxentry[15].append(speed)
 
-            ds.set(
-                "1.3.6.1.2.1.31.1.1.1.16.%u" % (idx), "int", 2
-            )  # Hardcode to false(2)
-            ds.set(
-                "1.3.6.1.2.1.31.1.1.1.17.%u" % (idx), "int", 1
-            )  # Hardcode to true(1)
+            ifxentry[16].append(2)  # Hardcode to false(2)
+            ifxentry[17].append(1)  # Hardcode to true(1)
 
             if self.config and not ifAlias:
                 try:
@@ -412,11 +424,53 @@ class MyAgent(agentx.Agent):
                     "Setting ifAlias of %s to ifname %s" % (ifname, ifname)
                 )
                 ifAlias = ifname
-            ds.set("1.3.6.1.2.1.31.1.1.1.18.%u" % (idx), "str", ifAlias)
-            ds.set(
-                "1.3.6.1.2.1.31.1.1.1.19.%u" % (idx), "ticks", 0
-            )  # Hardcode to Timeticks: (0) 0:00:00.00
-        return ds
+            ifxentry[18].append(ifAlias)
+            ifxentry[19].append(self.ifstatus.discontinuity(ifname))
+
+        # Rows and columns together, the serving thread reads them meanwhile
+        self.iftable.replace(rows, ifentry)
+        self.ifxtable.replace(rows, ifxentry)
+        self.ifrows = {
+            ifname: row for ifname, row in zip(ifnames, rows) if row is not None
+        }
+        if self.ifstatus.events != events:
+            # Events arrived meanwhile, don't let them be overwritten
+            for ifname in self.ifrows:
+                status = self.ifstatus.status(ifname)
+                if status:
+                    self.status_changed(ifname, status, None)
+
+        self.ifnames = ifnames
+        self.generation = generation
+        return True
+
+    def update(self):
+        """Interface counters: refreshed from the stats segment every period"""
+        if not self.check_vpp():
+            return False
+        if self.linktraps:
+            self.linktraps.tick()
+
+        ifnames = self.vppstat["/if/names"]
+        if ifnames != self.ifnames or self.vpp.generation != self.generation:
+            self.logger.info("Interfaces changed, rebuilding interface metadata")
+            self.invalidate_static()
+        if self.alerts:
+            self.alerts.poll(self.vppstat, ifnames)
+
+        if self.lazy:
+            # Counter columns read the stats segment at query time
+            return True
+
+        # Read every stats path once and sum all interfaces in one pass
+        self.cache.clear()
+        for entry, column, oid_type, path, field in COUNTER_COLUMNS:
+            modulo = 2 ** 32 if oid_type == "u32" else None
+            self.tables[entry].set_column(
+                column, self.cache.column(path, field, modulo)
+            )
+
+        return True
 
 
 def main():
@@ -435,12 +489,34 @@ def main():
         default=30,
         help="""Period to poll VPP, default 30 (seconds)""",
     )
+    parser.add_argument(
+        "-s",
+        dest="static_period",
+        type=int,
+        default=300,
+        help="""Period to rebuild interface metadata, default 300 (seconds)""",
+    )
+    parser.add_argument(
+        "-t",
+        dest="deadline",
+        type=float,
+        default=0.5,
+        help="""Deadline for a refresh, after which it continues in the background
+while the previous data is served, default 0.5 (seconds)""",
+    )
     parser.add_argument(
         "-c",
         dest="config",
         type=str,
         help="""Optional vppcfg YAML configuration file, default empty""",
     )
+    parser.add_argument(
+        "-l",
+        dest="lazy",
+        action="store_true",
+        help="""Read counters from VPP when queried, cached for performance.cache_ttl
+seconds from the config file (default 1), instead of every period""",
+    )
     parser.add_argument(
         "-d", dest="debug", action="store_true", help="""Enable debug, default False"""
     )
@@ -458,7 +534,13 @@ def main():
     agentx.setup_logging(debug=args.debug)
 
     try:
-        a = MyAgent(server_address=args.address, period=args.period, args=args)
+        a = MyAgent(
+            server_address=args.address,
+            period=args.period,
+            static_period=args.static_period,
+            deadline=args.deadline,
+            args=args,
+        )
         a.run()
     except Exception as e:
         print("Unhandled exception:", e)
@@ -4,10 +4,12 @@ interface metadata.
 """
 
 from vpp_papi import VPPApiClient, VPPApiJSONFiles
+from concurrent.futures import ThreadPoolExecutor, wait
 import os
 import fnmatch
 import logging
 import socket
+import time
 
 
 class NullHandler(logging.Handler):
@@ -20,21 +22,41 @@ logger.addHandler(NullHandler())
 
 
 class VPPApi:
-    def __init__(self, address="/run/vpp/api.sock", clientname="vppapi-client"):
+    def __init__(
+        self, address="/run/vpp/api.sock", clientname="vppapi-client", events=True
+    ):
         self.address = address
         self.connected = False
         self.clientname = clientname
+        # Subscribe to sw_interface_events, which invalidate the caches
+        self.events = events
         self.vpp = None
         self.iface_dict = None
         self.lcp_dict = None
+        self.bond_dict = None
+        # Bumped whenever cached metadata is invalidated
+        self.generation = 0
+        # Called with every sw_interface_event, in the event thread
+        self.event_callback = None
+        # Called on every connect that subscribes to events, as those sent
+        # while disconnected were missed
+        self.connect_callback = None
 
     def _sw_interface_event(self, event):
         # NOTE(pim): this callback runs in a background thread, so we just clear the
         # cached interfaces and LCPs here, subsequent call to get_ifaces() or get_lcp()
         # will refresh them in the main thread.
         logger.info(f"Clearing iface and LCP cache due to interface event")
+        self.invalidate()
+        if self.event_callback:
+            self.event_callback(event)
+
+    def invalidate(self):
+        """Drop the cached metadata, e.g. on an event seen on another connection"""
         self.iface_dict = None
         self.lcp_dict = None
+        self.bond_dict = None
+        self.generation += 1
 
     def _event_callback(self, msg_type_name, msg_type):
         logger.debug(f"Received callback: {msg_type_name} => {msg_type}")
@@ -64,12 +86,15 @@ class VPPApi:
         v = self.vpp.api.show_version()
         logger.info("VPP version is %s" % v.version)
 
-        logger.info("Enabling VPP API interface events")
-        r = self.vpp.api.want_interface_events(enable_disable=True)
-        if r.retval != 0:
-            logger.error("Could not enable VPP API interface events, disconnecting")
-            self.disconnect()
-            return False
+        if self.events:
+            if self.connect_callback:
+                self.connect_callback()
+            logger.info("Enabling VPP API interface events")
+            r = self.vpp.api.want_interface_events(enable_disable=True)
+            if r.retval != 0:
+                logger.error("Could not enable VPP API interface events, disconnecting")
+                self.disconnect()
+                return False
 
         self.connected = True
         return True
@@ -80,9 +105,25 @@ class VPPApi:
         self.vpp.disconnect()
         self.iface_dict = None
         self.lcp_dict = None
+        self.bond_dict = None
+        self.generation += 1
         self.connected = False
         return True
 
+    def ping(self):
+        if not self.connected and not self.connect():
+            logger.warning("Can't connect to VPP API")
+            return False
+
+        try:
+            r = self.vpp.api.control_ping()
+            logger.debug(f"VPP API: {r}")
+        except Exception as e:
+            logger.error(f"VPP API: {e}, disconnecting")
+            self.disconnect()
+            return False
+        return True
+
     def get_ifaces(self):
         ret = {}
         if not self.connected and not self.connect():
@@ -142,3 +183,205 @@ class VPPApi:
         self.lcp_dict = ret
         logger.debug(f"Caching LCPs: {ret}")
         return self.lcp_dict
+
+    def get_bond_members(self):
+        """Return a dict of bond sw_if_index to a list of member sw_if_indices."""
+        ret = {}
+        if not self.connected and not self.connect():
+            logger.warning("Can't connect to VPP API")
+            return ret
+
+        if type(self.bond_dict) is dict:
+            logger.debug("Returning cached bond members")
+            return self.bond_dict
+
+        try:
+            logger.info("Requesting bonds from VPP API")
+            bond_list = self.vpp.api.sw_interface_bond_dump()
+        except Exception as e:
+            logger.error(f"VPP communication error, disconnecting: {e}")
+            self.disconnect()
+            return ret
+
+        for bond in bond_list or []:
+            members = []
+            try:
+                slaves = self.vpp.api.sw_interface_slave_dump(sw_if_index=bond.sw_if_index)
+                for slave in slaves or []:
+                    members.append(slave.sw_if_index)
+            except Exception as e:
+                logger.debug(f"Could not get members for bond {bond.sw_if_index}: {e}")
+            ret[bond.sw_if_index] = members
+
+        self.bond_dict = ret
+        logger.debug(f"Caching bond members: {ret}")
+        return self.bond_dict
+
+
+class VPPMetadataFetcher:
+    """
+    Fetches interface metadata from VPP with all requests in flight at once.
+
+    Every request kind runs on its own API connection in a small worker pool,
+    so a fetch takes as long as the slowest dump instead of the sum of all of
+    them. A request that misses the deadline keeps running in the background
+    and the previous result for that kind is returned until it completes.
+
+    Only the first connection subscribes to interface events, so that VPP
+    sends each of them once; it invalidates the caches of the others.
+
+    A connection is only used by one request at a time: nothing is issued on
+    it while its connect or last request is still running. ping() has a
+    connection of its own.
+    """
+
+    REQUESTS = {
+        "ping": VPPApi.ping,
+        "ifaces": VPPApi.get_ifaces,
+        "lcp": VPPApi.get_lcp,
+        "bonds": VPPApi.get_bond_members,
+    }
+
+    def __init__(
+        self,
+        address="/run/vpp/api.sock",
+        clientname="vppapi-client",
+        kinds=("ifaces", "lcp", "bonds"),
+        deadline=5.0,
+    ):
+        self.kinds = tuple(kinds)
+        self.deadline = deadline
+        self.clients = {
+            kind: VPPApi(
+                address=address, clientname=f"{clientname}-{kind}", events=i == 0
+            )
+            for i, kind in enumerate(self.kinds)
+        }
+        self._pinger = VPPApi(
+            address=address, clientname=f"{clientname}-ping", events=False
+        )
+        self._callback = None
+        self.clients[self.kinds[0]].event_callback = self._event
+        self.results = {kind: {} for kind in self.kinds}
+        # Seconds the requests that completed during the last fetch took, and
+        # the kinds that missed its deadline
+        self.durations = {}
+        self.late = []
+        self._pending = {}
+        self._connecting = {}  # kind => connect still running
+        self._ping = None  # control_ping still running
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self.kinds) + 1, thread_name_prefix="vppapi"
+        )
+
+    @property
+    def connected(self):
+        return all(client.connected for client in self.clients.values())
+
+    @property
+    def generation(self):
+        return sum(client.generation for client in self.clients.values())
+
+    def connect(self):
+        for kind, client in self.clients.items():
+            if not client.connected and kind not in self._connecting:
+                self._connecting[kind] = self._executor.submit(client.connect)
+        done, _ = wait(self._connecting.values(), timeout=self.deadline)
+        self._connecting = {
+            kind: future
+            for kind, future in self._connecting.items()
+            if future not in done
+        }
+        return all(f.result() for f in done) and not self._connecting
+
+    def on_event(self, callback):
+        """Call callback with every sw_interface_event, in the event thread"""
+        self._callback = callback
+
+    def on_connect(self, callback):
+        """Call callback whenever the connection events arrive on (re)connects"""
+        self.clients[self.kinds[0]].connect_callback = callback
+
+    def _event(self, event):
+        """sw_interface_event, from the first connection"""
+        for kind in self.kinds[1:]:
+            self.clients[kind].invalidate()
+        if self._callback:
+            self._callback(event)
+
+    def disconnect(self):
+        # Let the requests in flight finish with their connection first
+        futures = list(self._pending.values()) + list(self._connecting.values())
+        if self._ping is not None:
+            futures.append(self._ping)
+        for future in futures:
+            future.cancel()
+        wait(futures, timeout=self.deadline)
+        self._pending = {}
+        self._connecting = {}
+        self._ping = None
+        for client in self.clients.values():
+            client.disconnect()
+        self._pinger.disconnect()
+        self.results = {kind: {} for kind in self.kinds}
+        return True
+
+    def ping(self, deadline=None):
+        """
+        Send a control_ping on the ping connection, or wait for the one still
+        in flight. Returns True if VPP answered within deadline seconds.
+        """
+        if deadline is None:
+            deadline = self.deadline
+        if self._ping is None or self._ping.done():
+            self._ping = self._executor.submit(self._pinger.ping)
+        done, _ = wait([self._ping], timeout=deadline)
+        return self._ping in done and self._ping.result()
+
+    def fetch(self, deadline=None):
+        """
+        Issue every request kind concurrently and wait up to deadline seconds.
+
+        Kinds still in flight from an earlier fetch are not issued again. Returns
+        a dict of kind to result; kinds that missed the deadline hold their last
+        known result, and a missed ping is reported as False.
+        """
+        if deadline is None:
+            deadline = self.deadline
+
+        for kind in self.kinds:
+            connecting = self._connecting.get(kind)
+            if connecting is not None and connecting.done():
+                del self._connecting[kind]
+                connecting = None
+            if kind not in self._pending and connecting is None:
+                self._pending[kind] = self._executor.submit(self._timed, kind)
+
+        done, _ = wait(self._pending.values(), timeout=deadline)
+        ret = dict(self.results)
+        self.durations = {}
+        self.late = list(self._connecting)
+        for kind in self.late:
+            logger.warning(f"VPP API {kind} connection is still connecting")
+            if kind == "ping":
+                ret[kind] = False
+        for kind, future in list(self._pending.items()):
+            if future not in done:
+                logger.warning(f"VPP API {kind} request missed {deadline}s deadline")
+                self.late.append(kind)
+                if kind == "ping":
+                    ret[kind] = False
+                continue
+            del self._pending[kind]
+            try:
+                self.results[kind], self.durations[kind] = future.result()
+            except Exception as e:
+                logger.error(f"VPP API {kind} request failed: {e}")
+            ret[kind] = self.results[kind]
+        return ret
+
+    def _timed(self, kind):
+        """Run a request kind, returning (result, seconds it took)"""
+        start = time.monotonic()
+        result = self.REQUESTS[kind](self.clients[kind])
+        return result, time.monotonic() - start
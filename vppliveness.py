@@ -0,0 +1,84 @@
+"""
+VPPLiveness detects a dead or restarted VPP without a round trip on every
+update. It watches the stats segment heartbeat and the stats socket, and only
+falls back to an active control_ping after a period of silence.
+
+Usage:
+    liveness = VPPLiveness(stats, api, silence=30)
+    if not liveness.check():
+        # stats and api are disconnected and reconnect on next use
+        ...
+"""
+
+import time
+import logging
+
+
+class NullHandler(logging.Handler):
+    def emit(self, record):
+        pass
+
+
+logger = logging.getLogger("agentx.vppliveness")
+logger.addHandler(NullHandler())
+
+
+class VPPLiveness:
+    def __init__(self, stats, api, silence=30.0):
+        """
+        Args:
+            stats: VPPStats instance
+            api: VPPApi or VPPMetadataFetcher instance, anything with ping()
+            silence: Seconds without a heartbeat before pinging VPP. VPP bumps
+                     /sys/heartbeat once per stats collector run (10s default)
+        """
+        self.stats = stats
+        self.api = api
+        self.silence = silence
+        self._heartbeat = None
+        self._last_seen = 0
+
+    def _reconnect(self, reason):
+        logger.warning(f"{reason}, reconnecting to VPP")
+        try:
+            self.stats.disconnect()
+        except Exception:
+            pass
+        try:
+            self.api.disconnect()
+        except Exception:
+            pass
+        self._heartbeat = None
+        return False
+
+    def check(self):
+        """Return True if VPP looks alive, otherwise disconnect and return False"""
+        now = time.monotonic()
+        if not self.stats.connected:
+            self.stats.connect()
+            self._heartbeat = self.stats.heartbeat
+            self._last_seen = now
+            return True
+
+        if self.stats.restarted():
+            return self._reconnect("Stats socket was replaced, VPP restarted")
+
+        heartbeat = self.stats.heartbeat
+        if heartbeat is not None and heartbeat != self._heartbeat:
+            self._heartbeat = heartbeat
+            self._last_seen = now
+            return True
+
+        if now - self._last_seen < self.silence:
+            return True
+
+        logger.debug(f"No heartbeat for {now - self._last_seen:.1f}s, pinging VPP")
+        if not self.api.ping():
+            return self._reconnect("VPP API did not answer control_ping")
+        if heartbeat is not None:
+            # VPP answers but the heartbeat we see is frozen: our mmap of the
+            # stats segment is stale
+            return self._reconnect("Stats heartbeat is frozen")
+
+        self._last_seen = now
+        return True
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Interface snapshot shared by the agent with debugging tools
+
+The data collector writes the interface counters of every collection into a
+memory-mapped, versioned file. Tools read that file instead of opening their
+own connection to the VPP stats segment, so they start instantly and add no
+load to VPP.
+"""
+
+import os
+import time
+import struct
+import logging
+from array import array
+
+from agentx.shm import RegionReader, RegionWriter
+
+DEFAULT_PATH = "/run/vpp-snmp-agent/interfaces.snapshot"
+
+# Body layout, after the agentx.shm region header (whose count is the number
+# of interfaces):
+#
+#   header   stats epoch, number of columns, length of the three blocks below
+#   counters one uint64 per interface for each column, column by column
+#   columns  NUL-separated column names, "path" or "path:packets|octets"
+#   names    NUL-separated interface names, in stats segment order
+#   paths    NUL-separated stats segment directory
+MAGIC = b"VIFS"
+VERSION = 1
+BODY = struct.Struct("=QIIII")
+
+# Collector iface_stats keys by stats path and combined counter field
+COLUMNS = (
+    ("/if/rx", "packets", "rx_packets"),
+    ("/if/rx", "octets", "rx_octets"),
+    ("/if/rx-error", None, "rx_errors"),
+    ("/if/rx-no-buf", None, "rx_no_buf"),
+    ("/if/rx-multicast", "packets", "rx_multicast"),
+    ("/if/rx-broadcast", "packets", "rx_broadcast"),
+    ("/if/tx", "packets", "tx_packets"),
+    ("/if/tx", "octets", "tx_octets"),
+    ("/if/tx-error", None, "tx_errors"),
+    ("/if/tx-multicast", "packets", "tx_multicast"),
+    ("/if/tx-broadcast", "packets", "tx_broadcast"),
+    ("/if/drops", None, "drops"),
+    ("/if/punts", None, "punts"),
+)
+
+
+class NullHandler(logging.Handler):
+    def emit(self, record):
+        pass
+
+
+logger = logging.getLogger("vppsnapshot")
+logger.addHandler(NullHandler())
+
+
+def _block(strings):
+    return "\0".join(strings).encode("utf-8")
+
+
+def _unblock(buf):
+    if not buf:
+        return []
+    return buf.decode("utf-8", "replace").split("\0")
+
+
+class InterfaceSnapshotWriter(RegionWriter):
+    """Publish collector interface counters for InterfaceSnapshotReader"""
+
+    def __init__(self, path=DEFAULT_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        super().__init__(path, magic=MAGIC, version=VERSION, size=1 << 16)
+        self._layout = None
+
+    def publish(self, names, iface_stats, paths=(), epoch=0):
+        """
+        Write iface_stats, a dict of interface name => {iface_stats key: value}
+        as built by VPPDataCollector, for the interfaces in names
+        """
+        stats = [iface_stats.get(name, {}) for name in names]
+        present = {key for s in stats for key in s}
+        columns = [c for c in COLUMNS if c[2] in present]
+
+        counters = array("Q")
+        for path, field, key in columns:
+            counters.extend(int(s.get(key, 0)) for s in stats)
+
+        column_block = _block(
+            f"{path}:{field}" if field else path for path, field, _ in columns
+        )
+        name_block = _block(name or "" for name in names)
+        path_block = _block(sorted(paths))
+        layout = (column_block, name_block, path_block)
+        if layout != self._layout:
+            self.generation += 1
+            self._layout = layout
+
+        body = (
+            BODY.pack(
+                epoch, len(columns), len(column_block), len(name_block), len(path_block)
+            )
+            + counters.tobytes()
+            + column_block
+            + name_block
+            + path_block
+        )
+        self.write(body, len(names))
+
+
+class InterfaceSnapshot:
+    """Interface counters as collected by the agent"""
+
+    def __init__(self, body, count, generation, timestamp):
+        self.generation = generation
+        self.timestamp = timestamp
+        epoch, n_columns, columns_len, names_len, paths_len = BODY.unpack_from(body, 0)
+        self.epoch = epoch
+
+        pos = BODY.size
+        counters = array("Q")
+        counters.frombytes(body[pos : pos + 8 * n_columns * count])
+        pos += 8 * n_columns * count
+        column_names = _unblock(body[pos : pos + columns_len])
+        pos += columns_len
+        self.names = _unblock(body[pos : pos + names_len])
+        pos += names_len
+        self.paths = _unblock(body[pos : pos + paths_len])
+
+        # "path" or "path:field" => one value per interface
+        self.columns = {}
+        for i, column in enumerate(column_names):
+            self.columns[column] = counters[i * count : (i + 1) * count]
+
+    @property
+    def age(self):
+        return time.time() - self.timestamp
+
+    def counter(self, path, index, field=None):
+        """Return a counter for an interface index, KeyError if not collected"""
+        column = f"{path}:{field}" if field else path
+        return self.columns[column][index]
+
+
+class InterfaceSnapshotReader(RegionReader):
+    """Read the agent's interface snapshot file"""
+
+    def __init__(self, path=DEFAULT_PATH):
+        super().__init__(path, magic=MAGIC, version=VERSION)
+        self.snapshot = None
+
+    def read(self):
+        """Return the latest InterfaceSnapshot, None if there is none"""
+        region = super().read()
+        if region is not None:
+            self.snapshot = InterfaceSnapshot(*region)
+        return self.snapshot
+
+
+class _SnapshotCounter:
+    def __init__(self, snapshot, path, index):
+        self._snapshot = snapshot
+        self._path = path
+        self._index = index
+
+    def sum(self):
+        return self._snapshot.counter(self._path, self._index)
+
+    def sum_packets(self):
+        return self._snapshot.counter(self._path, self._index, "packets")
+
+    def sum_octets(self):
+        return self._snapshot.counter(self._path, self._index, "octets")
+
+
+class _SnapshotPath:
+    def __init__(self, snapshot, path):
+        self._snapshot = snapshot
+        self._path = path
+
+    def __getitem__(self, item):
+        # Only the stats[path][:, index] form used by the tools
+        _, index = item
+        return _SnapshotCounter(self._snapshot, self._path, index)
+
+
+class SnapshotStats:
+    """
+    Read-only stand-in for a connected VPPStats, serving an InterfaceSnapshot
+    to tools written against VPPStats
+    """
+
+    version = VERSION
+
+    def __init__(self, snapshot, path=DEFAULT_PATH):
+        self.snapshot = snapshot
+        self.path = path
+        self.epoch = snapshot.epoch
+        self.directory = dict.fromkeys(snapshot.paths)
+        self._collected = {column.split(":")[0] for column in snapshot.columns}
+
+    def connect(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def __getitem__(self, item):
+        if item == "/if/names":
+            return list(self.snapshot.names)
+        if item not in self._collected:
+            raise KeyError(item)
+        return _SnapshotPath(self.snapshot, item)
+
+
+def open_stats(path=DEFAULT_PATH, live=False, timeout=5):
+    """
+    Return a SnapshotStats for the agent's interface snapshot, or a connected
+    VPPStats when live is set or there is no snapshot to read
+    """
+    if not live:
+        reader = InterfaceSnapshotReader(path)
+        try:
+            snapshot = reader.read()
+        finally:
+            reader.close()
+        if snapshot is not None:
+            return SnapshotStats(snapshot, path)
+        logger.info(f"No interface snapshot in {path}, connecting to VPP")
+
+    from vppstats import VPPStats
+
+    stats = VPPStats(socketname="/run/vpp/stats.sock", timeout=timeout)
+    stats.connect()
+    return stats
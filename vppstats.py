@@ -120,6 +120,9 @@ class VPPStats:
         self.size = 0
         self.last_epoch = 0
         self.statseg = 0
+        self.socket_id = None
+        self.heartbeat_idx = None
+        self.retries = 0  # Reads started over because VPP updated the segment
 
     def connect(self):
         """Connect to stats segment"""
@@ -127,6 +130,7 @@ class VPPStats:
             return
         sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
         sock.connect(self.socketname)
+        self.socket_id = self._socket_id()
 
         mfd = recv_fd(sock)
         sock.close()
@@ -150,6 +154,38 @@ class VPPStats:
             self.statseg.close()
             self.connected = False
 
+    def _socket_id(self):
+        """Identify the stats socket by device and inode"""
+        try:
+            st = os.stat(self.socketname)
+        except OSError:
+            return None
+        return (st.st_dev, st.st_ino)
+
+    def restarted(self):
+        """True if the stats socket was replaced since connect (VPP restarted)"""
+        return self.connected and self._socket_id() != self.socket_id
+
+    @property
+    def heartbeat(self):
+        """Get /sys/heartbeat from the stats segment, or None if not exported"""
+        if not self.connected:
+            self.connect()
+        if self.last_epoch != self.epoch:
+            self.refresh()
+        if self.heartbeat_idx is None:
+            return None
+        # Scalars live in the directory entry itself, so re-read it from the
+        # segment instead of returning the value cached at refresh time
+        while True:
+            try:
+                with self.lock:
+                    return StatsVector(self, self.directory_vector, self.elementfmt)[
+                        self.heartbeat_idx
+                    ][1]
+            except IOError:
+                self.retries += 1
+
     @property
     def version(self):
         """Get version of stats segment"""
@@ -181,6 +217,7 @@ class VPPStats:
         """Refresh directory vector cache (epoch changed)"""
         directory = {}
         directory_by_idx = {}
+        heartbeat_idx = None
         while True:
             try:
                 with self.lock:
@@ -192,10 +229,14 @@ class VPPStats:
                         path = direntry[2][:path_raw].decode("ascii")
                         directory[path] = StatsEntry(direntry[0], direntry[1])
                         directory_by_idx[i] = path
+                        if path == "/sys/heartbeat":
+                            heartbeat_idx = i
                     self.directory = directory
                     self.directory_by_idx = directory_by_idx
+                    self.heartbeat_idx = heartbeat_idx
                     return
             except IOError:
+                self.retries += 1
                 if not blocking:
                     raise
 
@@ -209,6 +250,7 @@ class VPPStats:
                 with self.lock:
                     return self.directory[item].get_counter(self)
             except IOError:
+                self.retries += 1
                 if not blocking:
                     raise
 
@@ -274,6 +316,70 @@ class VPPStats:
         return result
 
 
+class StatsCache:
+    """
+    Micro-cache of per-interface counter columns, so one read of a stats path
+    serves every varbind of a walk for ttl seconds.
+
+    Usage:
+        cache = StatsCache(stat, ttl=1)
+        rx_octets = cache.provider("/if/rx", "octets")
+        rx_octets()[1] - returns rx octets of interface 1, summed over threads
+    """
+
+    def __init__(self, stats, ttl=1.0):
+        self.stats = stats
+        self.ttl = ttl
+        self._paths = {}
+        self._columns = {}
+
+    def _read(self, path, now):
+        hit = self._paths.get(path)
+        if hit and now - hit[0] < self.ttl:
+            return hit[1]
+        counter = self.stats[path]
+        self._paths[path] = (now, counter)
+        return counter
+
+    def column(self, path, field=None, modulo=None):
+        """Return sums over all threads for every interface of a stats path.
+        field is 'packets' or 'octets' for combined counters, None for simple
+        counters. Values are taken modulo 'modulo' if given."""
+        now = time.monotonic()
+        key = (path, field, modulo)
+        hit = self._columns.get(key)
+        if hit and now - hit[0] < self.ttl:
+            return hit[1]
+        counter = self._read(path, now)
+        if field == "octets":
+            values = counter.sum_octets_by_index()
+        elif field == "packets":
+            values = counter.sum_packets_by_index()
+        else:
+            values = counter.sum_by_index()
+        if modulo:
+            values = [v % modulo for v in values]
+        self._columns[key] = (now, values)
+        return values
+
+    def provider(self, path, field=None, modulo=None):
+        """Return a callable reading column(path, field, modulo). If the stats
+        segment can't be read, it returns the last known values instead."""
+
+        def read():
+            try:
+                return self.column(path, field, modulo)
+            except Exception:
+                hit = self._columns.get((path, field, modulo))
+                return hit[1] if hit else []
+
+        return read
+
+    def clear(self):
+        self._paths = {}
+        self._columns = {}
+
+
 class StatsLock:
     """Stat segment optimistic locking"""
 
@@ -320,6 +426,14 @@ class StatsCombinedList(list):
             return list.__getitem__(self, item)
         return CombinedList([row[item[1]] for row in self])
 
+    def sum_packets_by_index(self):
+        """Return sum of packets over all threads for every index"""
+        return [sum(pair[0] for pair in column) for column in zip(*self)]
+
+    def sum_octets_by_index(self):
+        """Return sum of octets over all threads for every index"""
+        return [sum(pair[1] for pair in column) for column in zip(*self)]
+
 
 class CombinedList(list):
     """Combined Counters 2-dimensional by thread by index of packets/octets"""
@@ -368,6 +482,10 @@ class StatsSimpleList(list):
             return list.__getitem__(self, item)
         return SimpleList([row[item[1]] for row in self])
 
+    def sum_by_index(self):
+        """Return sum over all threads for every index"""
+        return [sum(column) for column in zip(*self)]
+
 
 class SimpleList(list):
     """Simple counter"""